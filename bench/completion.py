@@ -0,0 +1,180 @@
+"""
+Check that shell completion answers within its latency budget.
+
+    python bench/completion.py [--projects N] [--apps N] [--deployments N]
+                               [--repeat N] [--budget MS] [--json FILE]
+
+The completion index is built from a local mock SlipStream server, which
+is then stopped: completing must not need the network. The script exits
+with 1 if the 95th percentile of a case is over the budget twice in a
+row.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import collections
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+from mockserver import MockServer, MockSlipStream
+from run import ENTRY_POINT, make_home
+from slipstream.cli import complete as completion, conf, output
+
+Result = collections.namedtuple('Result', ['case', 'candidates', 'median_ms',
+                                           'p95_ms', 'max_ms'])
+
+
+def index_file(home):
+    return os.path.join(home, '.slipstream',
+                        conf.COMPLETION_FILE_NAME_FORMAT.format(
+                            profile=conf.DEFAULT_PROFILE))
+
+
+def complete(words, env):
+    """
+    Complete the last of `words` like bash does and return the wall time
+    in seconds and the candidates.
+    """
+    env = dict(env, COMP_WORDS=' '.join(words), COMP_CWORD=str(len(words) - 1),
+               _SLIPSTREAM_COMPLETE='complete')
+    start = time.time()
+    out = subprocess.check_output([sys.executable, '-c', ENTRY_POINT],
+                                  env=env)
+    return time.time() - start, out.decode('utf8').split()
+
+
+def running(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            # Exited but not reaped yet
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (IOError, OSError, IndexError):
+        pass
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def stop_refresh(filename, timeout=5):
+    """
+    Stop the refresh started by the last completion, if any, and return
+    whether there was one: with the server stopped, it would only retry
+    until it gives up.
+    """
+    try:
+        with open(filename + '.lock') as f:
+            pid = int(f.read())
+    except (IOError, OSError, ValueError):
+        return False
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        return False
+    deadline = time.time() + timeout
+    while running(pid) and time.time() < deadline:
+        time.sleep(0.01)
+    return True
+
+
+def make_stale(home):
+    """Make the index outdated so that completing starts a refresh."""
+    filename = index_file(home)
+    index = completion.load(filename)
+    index['time'] = 0
+    completion.save(filename, index)
+    if os.path.exists(filename + '.lock'):
+        os.remove(filename + '.lock')
+
+
+def measure(case, words, setup, home, env, repeat):
+    """Complete `words` `repeat` times and return the `Result`."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup(home)
+        elapsed, candidates = complete(words, env)
+        times.append(elapsed * 1000)
+        if setup is not None and not stop_refresh(index_file(home)):
+            sys.exit("%s: no refresh was started" % case)
+    times.sort()
+    return Result(case, len(candidates), round(times[len(times) // 2], 1),
+                  round(times[min(int(len(times) * 0.95), len(times) - 1)],
+                        1),
+                  round(times[-1], 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--apps', type=int, default=50,
+                        help="The number of modules per project.")
+    parser.add_argument('--deployments', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help="Runs per case.")
+    parser.add_argument('--budget', type=float,
+                        default=conf.COMPLETION_BUDGET_MS,
+                        help="The accepted 95th percentile in ms "
+                             "(default: %(default)s).")
+    parser.add_argument('--json', metavar='FILE',
+                        help="Also write the results to FILE.")
+    args = parser.parse_args()
+
+    mock = MockSlipStream(args.projects, args.apps, args.deployments, 0, 3)
+    server = MockServer(mock).start()
+    home = make_home(server.endpoint)
+    env = dict((k, v) for k, v in os.environ.items()
+               if not k.startswith('SLIPSTREAM_'))
+    env['HOME'] = home
+    try:
+        start = time.time()
+        subprocess.check_call([sys.executable, '-m', 'slipstream.cli.complete',
+                               conf.DEFAULT_PROFILE], env=env)
+        print("Index built in %d ms." % ((time.time() - start) * 1000))
+    finally:
+        server.shutdown()
+
+    uuid = str(next(iter(mock.deployments)))
+    cases = collections.OrderedDict([
+        ('command', (['slipstream', 'de'], None)),
+        ('project', (['slipstream', 'show', 'proj'], None)),
+        ('module', (['slipstream', 'deploy', 'project-1/app-1'], None)),
+        ('uuid', (['slipstream', 'terminate', uuid[:1]], None)),
+        ('stale index', (['slipstream', 'delete', 'project-2/'], make_stale)),
+    ])
+    results = []
+    try:
+        for case, (words, setup) in cases.items():
+            result = measure(case, words, setup, home, env, args.repeat)
+            if result.p95_ms > args.budget:
+                # Confirm it isn't the noise of another process on the
+                # machine before failing
+                result = min(result, measure(case, words, setup, home, env,
+                                             args.repeat),
+                             key=lambda r: r.p95_ms)
+            results.append(result)
+    finally:
+        stop_refresh(index_file(home))
+        shutil.rmtree(home, ignore_errors=True)
+
+    output.write_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict((r.case, r._asdict()) for r in results), f,
+                      indent=2, sort_keys=True)
+    over = [r for r in results if r.p95_ms > args.budget]
+    for result in over:
+        print("%s: %.1f ms over the %d ms budget"
+              % (result.case, result.p95_ms, args.budget), file=sys.stderr)
+    if over or any(r.candidates == 0 for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+A stand-in for the SlipStream server implementing the resources used by
+the CLI commands, with generated data and an optional latency.
+
+    python bench/mockserver.py [--port PORT] [--latency SECONDS]
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import random
+import re
+import threading
+import time
+import uuid
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import quoteattr
+
+def _attrs(**attrs):
+    return ' '.join('%s=%s' % (k, quoteattr(str(v)))
+                    for k, v in sorted(attrs.items()))
+
+
+class MockSlipStream(object):
+    """
+    In-memory stand-in for the SlipStream resources used by the CLI.
+    """
+
+    def __init__(self, projects=5, apps=20, deployments=100, vms=500,
+                 clouds=3, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        # Fraction of the requests answered with 503 Service Unavailable
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.clouds = ['cloud-%d' % i for i in range(clouds)]
+        self.modules = {'': ('project', [])}
+        for p in range(projects):
+            project = 'project-%d' % p
+            self.modules[project] = ('project', [])
+            self.modules[''][1].append(project)
+            for a in range(apps):
+                path = '%s/app-%d' % (project, a)
+                kind = 'application' if a % 2 else 'component'
+                self.modules[path] = (kind, [])
+                self.modules[project][1].append(path)
+        self.published = set(p for p, m in self.modules.items()
+                             if m[0] == 'application')
+        self.deployments = collections.OrderedDict()
+        for d in range(deployments):
+            self._new_deployment('project-0/app-1', self.clouds[d % clouds])
+        self.vms = []
+        ids = list(self.deployments)
+        for v in range(vms):
+            run = self.deployments[ids[v % len(ids)]] if ids else None
+            self.vms.append(dict(
+                instanceId='vm-%d' % v, cloud=self.clouds[v % clouds],
+                state='Running', runUuid=run['uuid'] if run else '',
+                runOwner='test', nodeName='node', nodeInstanceId='node.%d' % v,
+                ip='10.0.%d.%d' % (v // 250, v % 250), cpu=1, ram=1024, disk=10,
+                instanceType='small', isUsable='true'))
+
+    def _new_deployment(self, module, cloud):
+        run_id = str(uuid.uuid4())
+        self.deployments[run_id] = dict(
+            uuid=run_id, moduleResourceUri='module/%s/1' % module,
+            status='Ready', startTime='2016-01-01 00:00:00.0 UTC',
+            lastStateChangeTime='2016-01-01 00:00:00.0 UTC',
+            cloudServiceNames=cloud, username='test', mutable='true',
+            nodes={'node': [1]})
+        return run_id
+
+    def module_xml(self, path):
+        kind, children = self.modules[path]
+        category = {'application': 'Deployment',
+                    'component': 'Image'}.get(kind, 'Project')
+        parent, _, name = path.rpartition('/')
+        items = ''.join(
+            '<item %s/>' % _attrs(name=c.rpartition('/')[2],
+                                  category={'application': 'Deployment',
+                                            'component': 'Image'}.get(
+                                      self.modules[c][0], 'Project'),
+                                  version=1,
+                                  resourceUri='module/%s/1' % c)
+            for c in children)
+        return '<module %s><children>%s</children></module>' % (
+            _attrs(shortName=name or 'module', category=category, version=1,
+                   parentUri='module/%s' % parent, creation='', lastModified='',
+                   description=''), items)
+
+    def handle(self, method, url, body):
+        """Return (status, headers, body) for a request."""
+        parsed = urlparse(url)
+        path = parsed.path.rstrip('/')
+        query = dict((k, v[0]) for k, v in parse_qs(parsed.query).items())
+        with self.lock:
+            self.requests['%s %s' % (method, re.sub(r'/[^/]+$', '/*', path)
+                                     if path.count('/') > 1 else path)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.requests['503'] += 1
+            return 503, {'Retry-After': '0'}, ''
+
+        if path == '/api/session' and method == 'POST':
+            return 201, {'Set-Cookie': 'com.sixsq.slipstream.cookie=token; Path=/'}, ''
+        if path == '/appstore':
+            items = ''.join('<item %s/>' % _attrs(
+                name=p.rpartition('/')[2] + '-' + p.partition('/')[0],
+                category='Deployment', version=1, resourceUri='module/%s/1' % p)
+                for p in sorted(self.published))
+            return 200, {}, '<list>%s</list>' % items
+        if path == '/dashboard':
+            usage = ''.join('<cloudUsage %s/>' % _attrs(
+                cloud=c, vmQuota=20, userRunUsage=1, userVmUsage=2,
+                userInactiveVmUsage=0, othersVmUsage=0, pendingVmUsage=0,
+                unknownVmUsage=0) for c in self.clouds)
+            return 200, {}, '<dashboard>%s</dashboard>' % usage
+        if path == '/vms':
+            vms = [vm for vm in self.vms
+                   if (not query.get('runUuid') or vm['runUuid'] == query['runUuid'])
+                   and (not query.get('cloud') or vm['cloud'] == query['cloud'])]
+            return 200, {}, '<vms>%s</vms>' % self._page(
+                ('<vm %s/>' % _attrs(**vm) for vm in vms), query)
+        if path == '/run' and method == 'GET':
+            runs = [r for r in self.deployments.values()
+                    if not query.get('cloud') or r['cloudServiceNames'] == query['cloud']]
+            return 200, {}, '<runs>%s</runs>' % self._page(
+                ('<item %s/>' % self._run_attrs(r) for r in runs), query)
+        if path == '/run' and method == 'POST':
+            module = parse_qs(body).get('refqname', ['module/project-0/app-1'])[0]
+            with self.lock:
+                run_id = self._new_deployment(module.partition('/')[2],
+                                              self.clouds[0])
+            return 201, {'Location': '/run/%s' % run_id}, ''
+        match = re.match(r'^/run/([^/]+)(?:/([^/]+))?$', path)
+        if match:
+            run = self.deployments.get(match.group(1))
+            if run is None:
+                return 404, {}, ''
+            node = match.group(2)
+            if node is None and method == 'GET':
+                return 200, {}, '<run %s/>' % _attrs(
+                    state=run['status'], user=run['username'],
+                    **dict((k, v) for k, v in run.items()
+                           if k not in ('status', 'username', 'nodes')))
+            if node is None and method == 'DELETE':
+                run['status'] = 'Done'
+                return 204, {}, ''
+            if node == 'ss:state':
+                return 200, {'Content-Type': 'text/plain'}, run['status']
+            if node.endswith(':ids'):
+                return 200, {'Content-Type': 'text/plain'}, ','.join(
+                    str(i) for i in run['nodes'].get(node[:-len(':ids')], []))
+            if method == 'POST':
+                n = int(parse_qs(body).get('n', ['1'])[0])
+                with self.lock:
+                    ids = run['nodes'].setdefault(node, [])
+                    first = max(ids or [0]) + 1
+                    ids.extend(range(first, first + n))
+                return 201, {'Content-Type': 'text/plain'}, ','.join(
+                    '%s.%d' % (node, i) for i in range(first, first + n))
+            if method == 'DELETE':
+                ids = parse_qs(body).get('ids', [''])[0].split(',')
+                with self.lock:
+                    run['nodes'][node] = [i for i in run['nodes'].get(node, [])
+                                          if str(i) not in ids]
+                return 204, {}, ''
+        if path.startswith('/module'):
+            module = path[len('/module'):].strip('/')
+            if module.endswith('/publish'):
+                return 200, {}, ''
+            module = re.sub(r'/\d+$', '', module)
+            if module not in self.modules:
+                return 404, {}, ''
+            if method == 'DELETE':
+                return 200, {}, ''
+            return 200, {}, self.module_xml(module)
+        return 404, {}, ''
+
+    @staticmethod
+    def _page(items, query):
+        items = list(items)
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', 20))
+        return ''.join(items[offset:offset + limit])
+
+    @staticmethod
+    def _run_attrs(run):
+        return _attrs(**dict((k, v) for k, v in run.items() if k != 'nodes'))
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf8') if length else ''
+        status, headers, text = self.server.mock.handle(self.command,
+                                                        self.path, body)
+        payload = text.encode('utf8')
+        self.send_response(status)
+        headers.setdefault('Content-Type', 'application/xml')
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class MockServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, mock, address=('127.0.0.1', 0)):
+        BaseHTTPServer.HTTPServer.__init__(self, address, _Handler)
+        self.mock = mock
+
+    @property
+    def endpoint(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Serve a mock SlipStream until interrupted.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Seconds added to every response.")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of requests failing with 503.")
+    args = parser.parse_args()
+    server = MockServer(MockSlipStream(latency=args.latency,
+                                       error_rate=args.error_rate),
+                        ('127.0.0.1', args.port))
+    print(server.endpoint)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Run slipstream commands against a local mock SlipStream server. For each
+command, report the median wall time, the number of HTTP requests made,
+and the peak RSS of the process.
+
+    python bench/run.py [--vms N] [--latency SECONDS] [--json FILE]
+                        [--compare FILE [--tolerance RATIO]]
+
+With --compare, the results are checked against a file previously
+written with --json. The script exits with 1 if a command got slower by
+more than the tolerance or made more requests.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import collections
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mockserver import MockServer, MockSlipStream
+from slipstream.cli import conf, output
+
+ENTRY_POINT = 'from slipstream.cli import main; main()'
+
+# {ids} is replaced by the UUIDs of the first 10 deployments
+COMMANDS = collections.OrderedDict([
+    ('startup', ['--version']),
+    ('help', ['--help']),
+    ('list', ['list', '--recurse']),
+    ('deployments', ['deployments']),
+    ('virtualmachines', ['virtualmachines']),
+    ('usage', ['usage']),
+    ('deploy', ['deploy', 'project-0/app-1']),
+    ('terminate', ['terminate', '{ids}']),
+])
+
+Result = collections.namedtuple('Result', ['command', 'wall_ms', 'requests',
+                                           'peak_rss_mb'])
+
+
+def make_home(endpoint):
+    """Return a HOME directory with a profile logged in to `endpoint`."""
+    home = tempfile.mkdtemp(prefix='slipstream-bench-')
+    directory = os.path.join(home, '.slipstream')
+    os.mkdir(directory)
+    with open(os.path.join(directory, 'config'), 'w') as f:
+        f.write('[%s]\nendpoint = %s\n' % (conf.DEFAULT_PROFILE, endpoint))
+    cookie_file = conf.COOKIE_FILE_NAME_FORMAT.format(
+        profile=conf.DEFAULT_PROFILE)
+    with open(os.path.join(directory, cookie_file), 'w') as f:
+        f.write('# Netscape HTTP Cookie File\n')
+    return home
+
+
+def run(argv, env):
+    """
+    Run the CLI with `argv` and return its wall time in seconds and its
+    peak RSS in MiB.
+    """
+    # Every run starts with a cold module cache
+    for path in glob.glob(os.path.join(env['HOME'], '.slipstream', 'cache-*')):
+        os.remove(path)
+    with open(os.devnull, 'w') as stdout, tempfile.TemporaryFile() as stderr:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, '-c', ENTRY_POINT] + argv,
+                                   env=env, stdout=stdout, stderr=stderr)
+        _, status, rusage = os.wait4(process.pid, 0)
+        elapsed = time.time() - start
+        process.returncode = os.WEXITSTATUS(status)
+        if process.returncode != 0:
+            stderr.seek(0)
+            sys.exit("'slipstream %s' failed:\n%s"
+                     % (' '.join(argv), stderr.read().decode('utf8')))
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = rusage.ru_maxrss / (1024.0 * 1024 if sys.platform == 'darwin'
+                              else 1024.0)
+    return elapsed, rss
+
+
+def benchmark(mock, env, names, repeat):
+    ids = [str(i) for i in list(mock.deployments)[:10]]
+    for name in names:
+        argv = []
+        for arg in COMMANDS[name]:
+            argv.extend(ids if arg == '{ids}' else [arg])
+        before = sum(mock.requests.values())
+        runs = [run(argv, env) for _ in range(repeat)]
+        requests = (sum(mock.requests.values()) - before) // repeat
+        wall = sorted(r[0] for r in runs)[repeat // 2]
+        rss = max(r[1] for r in runs)
+        yield Result(name, int(wall * 1000), requests, round(rss, 1))
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of `results` from the `baseline` dict."""
+    regressions = []
+    for result in results:
+        base = baseline.get(result.command)
+        if base is None:
+            continue
+        if result.wall_ms > base['wall_ms'] * (1 + tolerance):
+            regressions.append('%s: %d ms instead of %d ms'
+                               % (result.command, result.wall_ms,
+                                  base['wall_ms']))
+        if result.requests > base['requests']:
+            regressions.append('%s: %d requests instead of %d'
+                               % (result.command, result.requests,
+                                  base['requests']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('commands', nargs='*', metavar='COMMAND',
+                        help="The commands to run among: %s (default: all)."
+                             % ', '.join(COMMANDS))
+    parser.add_argument('--projects', type=int, default=5)
+    parser.add_argument('--apps', type=int, default=20,
+                        help="The number of modules per project.")
+    parser.add_argument('--deployments', type=int, default=100)
+    parser.add_argument('--vms', type=int, default=500)
+    parser.add_argument('--clouds', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help="Seconds added to every response.")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of requests failing with 503.")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per command, the median is reported.")
+    parser.add_argument('--json', metavar='FILE',
+                        help="Also write the results to FILE.")
+    parser.add_argument('--compare', metavar='FILE',
+                        help="Check the results against a --json FILE.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="The accepted slowdown ratio with --compare.")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.commands if name not in COMMANDS]
+    if unknown:
+        parser.error("unknown command '%s'" % unknown[0])
+
+    mock = MockSlipStream(args.projects, args.apps, args.deployments,
+                          args.vms, args.clouds, args.latency,
+                          args.error_rate)
+    server = MockServer(mock).start()
+    home = make_home(server.endpoint)
+    env = dict((k, v) for k, v in os.environ.items()
+               if not k.startswith('SLIPSTREAM_'))
+    env['HOME'] = home
+    try:
+        results = list(benchmark(mock, env, args.commands or list(COMMANDS),
+                                 args.repeat))
+    finally:
+        server.shutdown()
+        shutil.rmtree(home)
+
+    output.write_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict((r.command, r._asdict()) for r in results), f,
+                      indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare the table renderer of slipstream.cli with PrettyTable, which it
+replaced, on synthetic virtual machine rows.
+
+    python bench/table.py [ROWS]
+
+PrettyTable has to be installed (pip install prettytable).
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import io
+import sys
+import time
+
+from slipstream.cli import output
+
+Row = collections.namedtuple('Row', ['id', 'cloud', 'status', 'deployment_id',
+                                     'ip', 'cpu', 'ram', 'instance_type'])
+
+
+def make_rows(count):
+    return [Row('vm-%d' % i, 'cloud-%d' % (i % 3), 'running',
+                '%08d-76ab-4eda-bf81-54b80b2735ac' % (i // 5),
+                '10.%d.%d.%d' % (i // 65536, i // 256 % 256, i % 256),
+                1 + i % 8, 1024 * (1 + i % 4), 'small')
+            for i in range(count)]
+
+
+def prettytable(rows, stream):
+    from prettytable import PrettyTable
+    table = PrettyTable(rows[0]._fields)
+    table.align = 'l'
+    for row in rows:
+        table.add_row(row)
+    stream.write(table.get_string())
+
+
+def builtin(rows, stream):
+    output.write_table(rows, stream, sample=None)
+
+
+def builtin_sampled(rows, stream):
+    output.write_table(rows, stream)
+
+
+def measure(render, rows):
+    stream = io.BytesIO() if sys.version_info[0] == 2 else io.StringIO()
+    start = time.time()
+    render(rows, stream)
+    return time.time() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+    results = [(name, measure(render, rows))
+               for name, render in [('prettytable', prettytable),
+                                    ('write_table', builtin),
+                                    ('write_table (sampled)', builtin_sampled)]]
+    reference = results[0][1]
+    for name, duration in results:
+        print('%-22s %8.3f s  x%.1f' % (name, duration, reference / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,9 +13,8 @@ with open('src/slipstream/cli/__init__.py', 'rb') as f:
 
 install_requires = [
     'click>=6.6',
-    'prettytable',
     'six>=1.10.0',
-    'slipstream-api>=3.37'
+    'slipstream-api>=3.46'
 ]
 
 if sys.version_info < (3, 2):
@@ -36,6 +35,9 @@ setup(
     license='Apache License, Version 2.0',
     include_package_data=True,
     install_requires=install_requires,
+    extras_require={
+        'yaml': ['PyYAML'],
+    },
     entry_points={
         'console_scripts': [
             'slipstream=slipstream.cli:main',
@@ -3,6 +3,18 @@ __version__ = "0.8.2"
 
 
 def main():
+    import os
+    import sys
+    if os.environ.get('_SLIPSTREAM_COMPLETE') == 'complete':
+        from .complete import main as complete
+        if complete():
+            return
+
+    from .daemon import forward
+    status = forward(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
     from .commands import cli
     cli(auto_envvar_prefix='SLIPSTREAM')
 
@@ -2,8 +2,12 @@ from __future__ import absolute_import, unicode_literals
 
 import codecs
 import configparser
+import contextlib
+import io
+import json
 import os
 import stat
+import tempfile
 import threading
 import weakref
 
@@ -29,24 +33,36 @@ class PersistentSingleton(type):
             return cls._instances[cls]
 
 
+DEFAULT_ALIASES = {
+    'ls': 'list',
+    'alias': 'aliases',
+    'app-store': 'appstore',
+    'execute': 'deploy',
+    'launch': 'deploy',
+    'run': 'deploy',
+    'del': 'delete',
+    'display': 'show',
+    'runs': 'deployments',
+    'vms': 'virtualmachines',
+    'virtual-machines': 'virtualmachines'
+}
+
+
+def _signature(filename):
+    """Return what identifies a version of the file, or None if missing."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size, st.st_ino]
+
+
 class Config(object):
 
     __metaclass__ = PersistentSingleton
 
     def __init__(self, filename=None, profile=None, batch_mode=False):
-        self.aliases = {
-            'ls': 'list',
-            'alias': 'aliases',
-            'app-store': 'appstore',
-            'execute': 'deploy',
-            'launch': 'deploy',
-            'run': 'deploy',
-            'del': 'delete',
-            'display': 'show',
-            'runs': 'deployments',
-            'vms': 'virtualmachines',
-            'virtual-machines': 'virtualmachines'
-        }
+        self.aliases = dict(DEFAULT_ALIASES)
 
         self.settings = {
             'endpoint': conf.DEFAULT_ENDPOINT,
@@ -74,6 +90,30 @@ class Config(object):
                            conf.COOKIE_FILE_NAME_FORMAT.format(profile=self.profile)
         self.settings['cookie_file'] = os.path.expanduser(cookie_file_path)
 
+    @property
+    def cache_file(self):
+        return os.path.join(os.path.dirname(self.settings['cookie_file']),
+                            conf.CACHE_FILE_NAME_FORMAT.format(profile=self.profile))
+
+    @property
+    def index_file(self):
+        return os.path.join(os.path.dirname(self.settings['cookie_file']),
+                            conf.INDEX_FILE_NAME_FORMAT.format(profile=self.profile))
+
+    @property
+    def usage_file(self):
+        return os.path.join(os.path.dirname(self.settings['cookie_file']),
+                            conf.USAGE_LOG_NAME_FORMAT.format(profile=self.profile))
+
+    @property
+    def cache_ttls(self):
+        ttls = {}
+        for kind in conf.CACHE_TTL:
+            value = self.settings.get('cache_ttl_%s' % kind)
+            if value is not None:
+                ttls[kind] = int(value)
+        return ttls
+
     @staticmethod
     def parse_option(value):
         if value is not None:
@@ -83,13 +123,88 @@ class Config(object):
                 return False
         return value
 
+    def profiles(self):
+        """
+        Return the names of the profiles defined in the config file.
+        """
+        return [section for section in self.parser.sections()
+                if section != 'alias']
+
+    def profile_settings(self, profile):
+        """
+        Return the settings of another profile of the config file, as
+        `read_config` would set them: the default profile may have no
+        section.
+        """
+        cookie_file_path = conf.COOKIE_FILE_PATH + \
+                           conf.COOKIE_FILE_NAME_FORMAT.format(profile=profile)
+        settings = {
+            'endpoint': conf.DEFAULT_ENDPOINT,
+            'insecure': False,
+            'cookie_file': os.path.expanduser(cookie_file_path)
+        }
+        try:
+            items = self.parser.items(profile)
+        except configparser.NoSectionError:
+            if profile != conf.DEFAULT_PROFILE:
+                raise
+            items = []
+        for key, value in items:
+            settings[key] = self.parse_option(value)
+        return settings
+
     def reset_config(self):
         self.__init__()
 
+    @property
+    def compiled_file(self):
+        directory, name = os.path.split(self.filename)
+        return os.path.join(directory, conf.COMPILED_CONFIG_NAME_FORMAT.format(
+            name=name))
+
+    def _load_compiled(self, signature):
+        """
+        Return the sections saved by `_save_compiled` if the config file
+        hasn't changed since, else None.
+        """
+        try:
+            with open(self.compiled_file) as fp:
+                compiled = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+        if compiled.get('signature') != signature:
+            return None
+        return compiled.get('sections')
+
+    def _save_compiled(self, signature):
+        """
+        Save the sections of the parser for the version `signature` of the
+        config file, so that `read_config` doesn't have to parse it again.
+        """
+        sections = dict((section, dict(self.parser.items(section, raw=True)))
+                        for section in self.parser.sections())
+        sections[configparser.DEFAULTSECT] = dict(self.parser.defaults())
+        try:
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(self.filename),
+                                        prefix='.config-')
+            with os.fdopen(fd, 'w') as fp:
+                json.dump({'signature': signature, 'sections': sections}, fp)
+            getattr(os, 'replace', os.rename)(temp, self.compiled_file)
+        except (IOError, OSError):
+            # The config directory may not be writable, the file will
+            # simply be parsed again next time
+            pass
+
     def read_config(self):
-        if os.path.isfile(self.filename):
-            with codecs.open(self.filename, encoding='utf8') as fp:
-                self.parser.read_file(fp)
+        signature = _signature(self.filename)
+        if signature is not None:
+            sections = self._load_compiled(signature)
+            if sections is not None:
+                self.parser.read_dict(sections)
+            else:
+                with codecs.open(self.filename, encoding='utf8') as fp:
+                    self.parser.read_file(fp)
+                self._save_compiled(signature)
         try:
             self.aliases.update(self.parser.items('alias'))
         except configparser.NoSectionError:
@@ -101,25 +216,71 @@ class Config(object):
             if self.profile != conf.DEFAULT_PROFILE:
                 raise
 
-    def write_config(self):
-        if not self.parser.has_section('alias'):
-            self.parser.add_section('alias')
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Hold an exclusive lock on the config file while writing it.
+        Readers don't need it since the file is replaced atomically.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        with open(self.filename + '.lock', 'a') as fp:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+    def _update(self, parser):
+        """Set the aliases and the profile settings into `parser`."""
+        if not parser.has_section('alias'):
+            parser.add_section('alias')
         for alias in six.iteritems(self.aliases):
-            self.parser.set('alias', *alias)
+            parser.set('alias', *alias)
 
-        if not self.parser.has_section(self.profile):
-            self.parser.add_section(self.profile)
+        if not parser.has_section(self.profile):
+            parser.add_section(self.profile)
+        for option in parser.options(self.profile):
+            if option not in self.settings:
+                parser.remove_option(self.profile, option)
         for option, value in six.iteritems(self.settings):
-            self.parser.set(self.profile, option, str(value))
+            parser.set(self.profile, option, str(value))
 
+    def write_config(self):
         # Create the $HOME/.slipstream dir if it doesn't exist
         config_dir = os.path.dirname(self.filename)
         if not os.path.isdir(config_dir):
             os.mkdir(config_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
-        # Save configuration into file
-        with codecs.open(self.filename, 'wb', 'utf8') as fp:
-            self.parser.write(fp)
-        os.chmod(self.filename, stat.S_IRUSR | stat.S_IWUSR)
+
+        with self._lock():
+            # Start from the file as it is now, so that the profiles saved
+            # by other processes since it was read are kept
+            parser = configparser.ConfigParser(interpolation=None)
+            current = None
+            if os.path.isfile(self.filename):
+                with codecs.open(self.filename, encoding='utf8') as fp:
+                    current = fp.read()
+                parser.read_string(current)
+            self._update(parser)
+            text = six.StringIO()
+            parser.write(text)
+            text = text.getvalue()
+
+            if text != current:
+                # Save configuration into a temporary file replacing the
+                # config file at once, readable by the user only
+                fd, temp = tempfile.mkstemp(dir=config_dir, prefix='.config-')
+                with io.open(fd, 'w', encoding='utf8') as fp:
+                    fp.write(six.text_type(text))
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                getattr(os, 'replace', os.rename)(temp, self.filename)
+            self.parser = parser
+            self._save_compiled(_signature(self.filename))
 
     def clear_setting(self, setting):
         self.settings.pop(setting, None)
@@ -0,0 +1,197 @@
+from __future__ import absolute_import, unicode_literals
+
+import codecs
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+
+from . import conf
+
+_version_re = re.compile(r'/\d+$')
+
+
+class Cache(object):
+    """
+    A small JSON file store of API responses with a time to live per kind
+    of resource. Entries are dropped when the endpoint changes.
+    """
+
+    def __init__(self, filename, endpoint, ttls=None):
+        self.filename = filename
+        self.endpoint = endpoint
+        self.ttls = dict(conf.CACHE_TTL)
+        self.ttls.update(ttls or {})
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    @property
+    def entries(self):
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            return self._entries
+
+    def _load(self):
+        try:
+            with codecs.open(self.filename, encoding='utf8') as fp:
+                data = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {}
+        if data.get('endpoint') != self.endpoint:
+            return {}
+        return data.get('entries', {})
+
+    def get(self, key, kind):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['time'] > self.ttls.get(kind, 0):
+                del self.entries[key]
+                self._dirty = True
+                return None
+            return entry['value']
+
+    def set(self, key, value):
+        with self._lock:
+            self.entries[key] = {'time': time.time(), 'value': value}
+            self._dirty = True
+
+    def invalidate(self, key):
+        """
+        Drop the entry `key` and those below it, whose key starts with
+        `key` followed by '/'.
+        """
+        with self._lock:
+            for k in [k for k in self.entries
+                      if k == key or k.startswith(key + '/')]:
+                del self.entries[k]
+                self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._dirty = False
+            if os.path.isfile(self.filename):
+                os.remove(self.filename)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            cache_dir = os.path.dirname(self.filename)
+            if not os.path.isdir(cache_dir):
+                os.mkdir(cache_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix='.cache-')
+            with codecs.getwriter('utf8')(os.fdopen(fd, 'wb')) as fp:
+                json.dump({'endpoint': self.endpoint,
+                           'entries': self._entries}, fp)
+            os.rename(tmp, self.filename)
+            self._dirty = False
+
+
+class CachedApi(object):
+    """
+    Wrap an `Api` to serve module metadata from a `Cache` and to invalidate
+    the affected entries when modules are modified.
+    """
+
+    def __init__(self, api, cache):
+        self._api = api
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    @staticmethod
+    def _element_key(path):
+        return 'element:%s' % path.strip('/')
+
+    def _invalidate(self, path):
+        # The element, its versions and, for a project, its content
+        self.cache.invalidate(self._element_key(_version_re.sub('', path)))
+        self.cache.invalidate('appstore')
+        self.cache.invalidate('appstore-index')
+
+    def get_element(self, path, cached=True):
+        """
+        Return the element at `path`, from the cache unless `cached` is
+        False, in which case the server is asked and the cache updated.
+        """
+        key = self._element_key(path)
+        data = self.cache.get(key, 'element') if cached else None
+        if data is not None:
+            from slipstream.api import models
+            return models.Module(**data)
+        element = self._api.get_element(path)
+        self.cache.set(key, element._asdict())
+        return element
+
+    @staticmethod
+    def _missing_key(name):
+        return 'appstore/missing/%s' % name
+
+    def _refresh_appstore(self):
+        data = [app._asdict() for app in self._api.list_applications()]
+        # Along with the names found missing from the previous app store
+        self.cache.invalidate('appstore')
+        self.cache.set('appstore', data)
+        self.cache.set('appstore-index',
+                       dict((app['name'], app) for app in data))
+        return data
+
+    def list_applications(self):
+        from slipstream.api import models
+        data = self.cache.get('appstore', 'appstore')
+        if data is None:
+            data = self._refresh_appstore()
+        return (models.App(**app) for app in data)
+
+    def application_names(self):
+        """
+        Return the names of the applications in the cached app store index.
+        """
+        return sorted(self.cache.get('appstore-index', 'appstore') or [])
+
+    def find_application(self, name, refresh=True):
+        """
+        Return the app store application called `name` or None.
+
+        The name is looked up in the local index, which is refreshed from
+        the server when it has expired or doesn't know the name yet, unless
+        `refresh` is False. A name still missing from the refreshed index
+        is remembered until the app store expires, so that looking it up
+        again doesn't fetch the app store.
+        """
+        index = self.cache.get('appstore-index', 'appstore')
+        if refresh and (index is None or name not in index and self.cache.get(
+                self._missing_key(name), 'appstore') is None):
+            self._refresh_appstore()
+            index = self.cache.get('appstore-index', 'appstore')
+            if name not in index:
+                self.cache.set(self._missing_key(name), True)
+        from slipstream.api import models
+        app = (index or {}).get(name)
+        return models.App(**app) if app is not None else None
+
+    # The cache is invalidated once the server has been modified, so that
+    # a concurrent lookup can't cache the element as it was before
+    def delete_element(self, path):
+        result = self._api.delete_element(path)
+        self._invalidate(path)
+        return result
+
+    def publish(self, path):
+        result = self._api.publish(path)
+        self._invalidate(path)
+        return result
+
+    def unpublish(self, path):
+        result = self._api.unpublish(path)
+        self._invalidate(path)
+        return result
@@ -3,41 +3,56 @@ from __future__ import absolute_import, unicode_literals
 import configparser
 import os
 import sys
-import traceback
 import collections
+import fnmatch
+import itertools
+import uuid
 
 import six
-from requests.exceptions import HTTPError
 
 import click
-from prettytable import PrettyTable
 
-from . import __version__, types, conf
+from . import __version__, types, conf, output, parallel
 from .base import AliasedGroup, Config, pass_config
+from .cache import Cache, CachedApi
 from .log import logger
-from slipstream.api import Api
 
-try:
-    from defusedxml import cElementTree as etree
-except ImportError:
-    from defusedxml import ElementTree as etree
+# Modules like requests or slipstream.api are slow to import,
+# so they are only imported by the functions needing them. This keeps
+# --help, --version and shell completion fast.
 
+PAGE_SIZE = 100
 
-def _excepthook(exctype, value, tb):
-    if exctype == HTTPError:
+# Api objects reused between commands; only enabled by the daemon
+SESSIONS = None
+
+
+def _error_message(value):
+    from requests.exceptions import HTTPError
+    if isinstance(value, HTTPError):
         if value.response.status_code == 401:
-            logger.fatal("Authentication cookie expired. "
-                        "Log in with `slipstream login`.")
+            return ("Authentication cookie expired. "
+                    "Log in with `slipstream login`.")
         elif value.response.status_code == 403:
-            logger.fatal("Invalid credentials provided. "
-                        "Log in with `slipstream login`.")
-        elif 'xml' in value.response.headers['content-type']:
-            root = etree.fromstring(value.response.text)
-            logger.fatal(root.text)
-        else:
-            logger.fatal(str(value))
-    else:
-        logger.fatal(str(value))
+            return ("Invalid credentials provided. "
+                    "Log in with `slipstream login`.")
+        elif 'xml' in value.response.headers.get('content-type', ''):
+            try:
+                from defusedxml import cElementTree as etree
+            except ImportError:
+                from defusedxml import ElementTree as etree
+            try:
+                root = etree.fromstring(value.response.text)
+            except etree.ParseError:
+                # e.g. the empty body of a 503 from an overloaded server
+                return str(value)
+            return root.text or str(value)
+    return str(value)
+
+
+def _excepthook(exctype, value, tb):
+    import traceback
+    logger.fatal(_error_message(value))
 
     out = six.StringIO()
     traceback.print_exception(exctype, value, tb, file=out)
@@ -47,22 +62,152 @@ sys.excepthook = _excepthook
 
 
 def printtable(items):
-    table = PrettyTable(items[0]._fields)
-    table.align = 'l'
-    for item in items:
-        table.add_row(item)
-    click.echo(table)
+    return output.write_table(items, width=output.terminal_width())
+
+
+def output_settings(fmt=None):
+    """
+    Return the output format and columns to use, the global --format
+    option applying when the command has no --format of its own.
+    """
+    meta = click.get_current_context().meta
+    return fmt or meta.get('format') or 'table', meta.get('columns')
+
+
+def row_writer(fmt, flush=False):
+    fmt, columns = output_settings(fmt)
+    return output.RowWriter(fmt, flush=flush, columns=columns)
+
+
+def printrows(rows, fmt=None, flush=False):
+    """
+    Print the namedtuple `rows` in the output format and columns selected
+    with --format and --columns, and return how many rows were printed.
+    Rows are written as they come, tables once their first rows are sized.
+    """
+    fmt, columns = output_settings(fmt)
+    try:
+        if fmt in output.STREAMING_FORMATS:
+            return output.write_rows(rows, fmt, flush=flush, columns=columns)
+        return printtable(output.project(rows, columns))
+    except output.UnknownColumnError as e:
+        raise click.BadParameter(str(e), param_hint="'--columns'")
+
+
+format_option = click.option(
+    '--format', 'fmt', type=click.Choice(output.FORMATS),
+    help="The output format, overriding the global --format option.")
+
+
+def iter_pages(fetch, page_size=PAGE_SIZE, offset=0, **kwargs):
+    """
+    Iterate over a paginated `Api` listing, starting at `offset` and
+    fetching `page_size` items at a time until the server returns an
+    incomplete page.
+    """
+    while True:
+        count = 0
+        for item in fetch(offset=offset, limit=page_size, **kwargs):
+            count += 1
+            yield item
+        if count < page_size:
+            return
+        offset += page_size
+
+
+def profiles_options(func):
+    func = click.option('--profiles', metavar='PROFILE,...',
+                        help="Run against each of the given profiles and "
+                             "add a profile column.")(func)
+    func = click.option('--all-profiles', is_flag=True, default=False,
+                        help="Run against every profile of the config "
+                             "file and add a profile column.")(func)
+    return func
+
+
+def selected_profiles(cfg, profiles, all_profiles):
+    """
+    Return the profile names selected by the `profiles_options`, or None.
+    """
+    if all_profiles:
+        return cfg.profiles() or [cfg.profile]
+    if not profiles:
+        return None
+    names = [name.strip() for name in profiles.split(',') if name.strip()]
+    for name in names:
+        if name not in cfg.profiles() and name != conf.DEFAULT_PROFILE:
+            raise click.BadParameter("Profile '%s' does not exists." % name,
+                                     param_hint="'--profiles'")
+    return names
+
+
+def fanout(cfg, profiles, fetch, errors):
+    """
+    Call `fetch(api)` concurrently for every profile, each with its own Api
+    and cookie jar, and yield the returned rows prefixed with a `profile`
+    column as each profile completes.
+
+    Profiles which failed are logged and appended to `errors`.
+    """
+    from six.moves.urllib.parse import urlparse
+
+    settings = dict((profile, cfg.profile_settings(profile))
+                    for profile in profiles)
+
+    def run(profile):
+        if not os.path.isfile(settings[profile]['cookie_file']):
+            raise click.ClickException(
+                "Not logged in. Log in with `slipstream -P %s login`."
+                % profile)
+        return list(fetch(make_api(settings[profile])))
+
+    row_types = {}
+    for outcome in parallel.imap(
+            run, profiles, len(profiles),
+            key=lambda profile: urlparse(settings[profile]['endpoint']).netloc):
+        if outcome.error is not None:
+            message = getattr(outcome.error, 'message', None) \
+                if isinstance(outcome.error, click.ClickException) else None
+            logger.error("Profile '%s': %s" % (
+                outcome.item, message or _error_message(outcome.error)))
+            errors.append(outcome.item)
+            continue
+        for row in outcome.result:
+            row_type = row_types.get(type(row))
+            if row_type is None:
+                row_type = collections.namedtuple(type(row).__name__,
+                                                  ('profile',) + row._fields)
+                row_types[type(row)] = row_type
+            yield row_type(outcome.item, *row)
+
+
+def printfanout(ctx, profiles, fetch, fmt):
+    """
+    Print the rows returned by `fetch(api)` for every profile and return
+    how many rows were printed.
+    """
+    errors = []
+    count = printrows(fanout(ctx.meta['config'], profiles, fetch, errors), fmt)
+    if errors:
+        raise click.ClickException("%d of %d profiles failed."
+                                   % (len(errors), len(profiles)))
+    return count
+
+
+def _config(ctx):
+    # Once the Api is attached to the context, the Config is in its meta
+    return ctx.meta.get('config') or ctx.ensure_object(Config)
 
 
 def use_profile(ctx, param, value):
-    cfg = ctx.ensure_object(Config)
+    cfg = _config(ctx)
     if value is not None:
         cfg.profile = value
     return value
 
 
 def read_config(ctx, param, value):
-    cfg = ctx.ensure_object(Config)
+    cfg = _config(ctx)
     if value is not None:
         cfg.filename = value
     try:
@@ -74,11 +219,19 @@ def read_config(ctx, param, value):
 
 
 def config_set(ctx, param, value):
-    cfg = ctx.ensure_object(Config)
+    cfg = _config(ctx)
     if value is not None:
         cfg.settings[param.name] = value
     return value
 
+def set_output(ctx, param, value):
+    if param.name == 'columns' and value is not None:
+        value = [column.strip() for column in value.split(',')
+                 if column.strip()]
+    ctx.meta[param.name] = value
+    return value
+
+
 click.disable_unicode_literals_warning = True
 
 @click.command(cls=AliasedGroup)
@@ -108,10 +261,26 @@ click.disable_unicode_literals_warning = True
               help="Give less output. Can be used up to 3 times.")
 @click.option('-v', '--verbose', 'verbose', count=True,
               help="Give more output. Can be used up to 4 times.")
+@click.option('--no-cache', 'no_cache', is_flag=True, default=False,
+              help="Do not use the local cache of module metadata.")
+@click.option('--format', type=click.Choice(output.FORMATS),
+              callback=set_output, expose_value=False, default='table',
+              help="The output format of listing commands (default: table).")
+@click.option('--columns', metavar='COLUMN,...',
+              callback=set_output, expose_value=False,
+              help="Only output the given columns, in this order.")
+@click.option('--trace', is_flag=True, default=False,
+              help="Print the timings of the HTTP requests made, grouped "
+                   "by method and path.")
+@click.option('--trace-file', type=click.Path(dir_okay=False, writable=True),
+              metavar='FILE',
+              help="Write the timings of every HTTP request to FILE in the "
+                   "Chrome trace format (chrome://tracing). Implies --trace.")
 @click.version_option(__version__, '-V', '--version')
 @click.help_option('-h', '--help')
 @click.pass_context
-def cli(ctx, password, batch_mode, quiet, verbose):
+def cli(ctx, password, batch_mode, quiet, verbose, no_cache, trace,
+        trace_file):
     """
     SlipStream command line tool.
     """
@@ -123,26 +292,133 @@ def cli(ctx, password, batch_mode, quiet, verbose):
     if level < 0:
         logger.enable_http_logging()
 
+    if trace or trace_file:
+        start_trace(ctx, trace_file)
+
     # Attach Config object to context for subsequent use
     cfg = ctx.obj
+    ctx.meta['config'] = cfg
+    ctx.meta['no_cache'] = no_cache
 
     cfg.batch_mode = batch_mode
 
     args = (ctx.args + ctx.protected_args + [ctx.invoked_subcommand])
 
-    if 'aliases' in args:
+    if 'aliases' in args or ctx.invoked_subcommand in ('cache', 'daemon'):
         return
 
-    # Ask for credentials to the user when (s)he hasn't provided some
+    # Attach Api object to context for subsequent use
+    ctx.obj = connect(ctx, cfg, no_cache)
+
+    # Ask for credentials to the user when (s)he hasn't provided some,
+    # logging in with the session used by the command
     if password or (not os.path.isfile(cfg.settings['cookie_file'])
                     and 'logout' not in args
                     and 'login' not in args):
+        run_locally()
         ctx.invoke(login, password=password)
 
-    # Attach Api object to context for subsequent use
-    ctx.obj = Api(cfg.settings['endpoint'], 
-                  cfg.settings['cookie_file'], 
-                  cfg.settings['insecure'])
+
+def run_locally():
+    """
+    Have the client run the current command when it was forwarded to the
+    daemon, which runs one command at a time: the caller runs until
+    interrupted or needs the terminal.
+    """
+    if SESSIONS is not None:
+        from .daemon import RunLocally
+        raise RunLocally()
+
+
+def start_trace(ctx, trace_file):
+    """
+    Record the HTTP requests made by the command and report them once it
+    is done.
+    """
+    from .trace import Tracer
+    tracer = Tracer()
+    tracer.start()
+
+    def report():
+        tracer.stop()
+        summary = tracer.summary()
+        if summary:
+            output.write_table(summary, sys.stderr)
+        click.echo("%d HTTP requests, %.1f ms in total."
+                   % (len(tracer.calls), sum(row.total_ms for row in summary)),
+                   err=True)
+        if trace_file:
+            tracer.write(trace_file)
+    ctx.call_on_close(report)
+
+
+def _is_transient(error):
+    from requests.exceptions import ConnectionError, HTTPError, Timeout
+    from .transport import RETRY_STATUSES
+    if isinstance(error, HTTPError):
+        return error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (ConnectionError, Timeout))
+
+
+def circuit_breaker(cfg):
+    """
+    Return the `parallel.CircuitBreaker` protecting the endpoint from bulk
+    operations, configured by the `breaker_threshold` and
+    `breaker_cooldown` settings.
+    """
+    try:
+        threshold = int(cfg.settings.get('breaker_threshold',
+                                         conf.DEFAULT_BREAKER_THRESHOLD))
+        cooldown = float(cfg.settings.get('breaker_cooldown',
+                                          conf.DEFAULT_BREAKER_COOLDOWN))
+    except ValueError as e:
+        raise click.ClickException("Invalid circuit breaker setting: %s" % e)
+    return parallel.CircuitBreaker(max(threshold, 1), cooldown, _is_transient)
+
+
+def make_api(settings):
+    """
+    Return an Api for the profile `settings`, its HTTP session configured
+    with the `pool_size`, `connect_timeout` and `read_timeout` settings.
+    """
+    from slipstream.api import Api
+    from .transport import tune
+    api = Api(settings['endpoint'], settings['cookie_file'],
+              settings['insecure'])
+    try:
+        tune(api.session, settings)
+    except ValueError as e:
+        raise click.ClickException("Invalid connection setting: %s" % e)
+    return api
+
+
+def connect(ctx, cfg, no_cache=False):
+    """
+    Return the Api object to use for the commands of the context `ctx`.
+
+    When `SESSIONS` is a dict, as in the daemon, Api objects are kept in it
+    and reused as long as the cookie file isn't modified.
+    """
+    from .transport import SETTINGS
+    cookie_file = cfg.settings['cookie_file']
+    key = (cfg.settings['endpoint'], cookie_file, cfg.settings['insecure'],
+           no_cache, os.path.getmtime(cookie_file)
+           if os.path.isfile(cookie_file) else None) + \
+        tuple(cfg.settings.get(setting) for setting in SETTINGS)
+    api = SESSIONS.get(key) if SESSIONS is not None else None
+
+    if api is None:
+        api = make_api(cfg.settings)
+        if not no_cache:
+            api = CachedApi(api, Cache(cfg.cache_file, cfg.settings['endpoint'],
+                                       cfg.cache_ttls))
+        if SESSIONS is not None:
+            SESSIONS.clear()
+            SESSIONS[key] = api
+
+    if isinstance(api, CachedApi):
+        ctx.call_on_close(api.cache.save)
+    return api
 
 
 @cli.command()
@@ -160,7 +436,101 @@ def aliases(cfg):
     aliases_table = [Alias(cmd, ', '.join(cmd_als))
                      for cmd, cmd_als in six.iteritems(aliases)]
 
-    printtable(sorted(aliases_table, key=lambda x: x.command))
+    printrows(sorted(aliases_table, key=lambda x: x.command))
+
+
+@cli.command()
+@click.pass_context
+def shell(ctx):
+    """
+    Run commands interactively in a single session.
+
+    The authentication and the connections to the endpoint are kept between
+    commands. Type 'help' to list commands and 'exit' or Ctrl-D to leave.
+    """
+    from .shell import Shell
+    root = ctx.parent
+    cfg = ctx.meta['config']
+    Shell(cli, cfg, ctx.obj,
+          lambda: connect(root, cfg, ctx.meta['no_cache']),
+          _error_message, ctx.meta).run()
+
+
+@cli.group('daemon')
+def daemon_group():
+    """
+    Manage the background agent running commands for scripts.
+
+    While the daemon runs, `slipstream` commands are sent to it through a
+    local socket and reuse its sessions instead of starting from scratch.
+    Commands running until interrupted, like `wait` or `deployments
+    --watch`, and those needing credentials still run in-process.
+    """
+
+
+@daemon_group.command('start')
+@click.option('--foreground', is_flag=True, default=False,
+              help="Do not detach from the terminal.")
+def daemon_start(foreground):
+    """
+    Start the daemon.
+    """
+    from . import daemon
+    if daemon.send_command('status'):
+        raise click.ClickException("The daemon is already running.")
+    server = daemon.DaemonServer()
+    logger.notify("Daemon listening on %s." % server.socket_file)
+    if not foreground:
+        daemon.daemonize()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@daemon_group.command('stop')
+def daemon_stop():
+    """
+    Stop the daemon.
+    """
+    from . import daemon
+    if not daemon.send_command('stop'):
+        raise click.ClickException("The daemon is not running.")
+    logger.notify("Daemon stopped.")
+
+
+@daemon_group.command('status')
+def daemon_status():
+    """
+    Tell whether the daemon is running.
+    """
+    from . import daemon
+    if daemon.send_command('status'):
+        click.echo("running")
+    else:
+        click.echo("stopped")
+        sys.exit(1)
+
+
+@cli.group('cache')
+def cache_group():
+    """
+    Manage the local cache of module metadata.
+    """
+
+
+@cache_group.command('clear')
+@pass_config
+def cache_clear(cfg):
+    """
+    Remove all cached entries and the index of the current profile.
+    """
+    from .index import Index
+    Cache(cfg.cache_file, cfg.settings['endpoint']).clear()
+    Index(cfg.index_file, cfg.settings['endpoint']).clear()
+    logger.notify("Cache cleared.")
 
 
 @cli.command()
@@ -172,15 +542,19 @@ def aliases(cfg):
 @click.option('-e', '--endpoint', type=types.URL(), metavar='URL',
               callback=config_set, expose_value=False,
               help='The SlipStream endpoint to use')
-@pass_config
-def login(cfg, password):
+@click.pass_context
+def login(ctx, password):
     """
     Log in with your slipstream credentials.
     """
+    from requests.exceptions import HTTPError
+
+    cfg = ctx.meta['config']
     should_prompt = True if not cfg.batch_mode else False
-    api = Api(cfg.settings['endpoint'],
-              cfg.settings['cookie_file'], 
-              cfg.settings['insecure'])
+    # Reuse the session of the command unless another endpoint was given
+    api = ctx.obj
+    if getattr(api, 'endpoint', None) != cfg.settings['endpoint']:
+        api = make_api(cfg.settings)
     username = cfg.settings.get('username')
 
     if (username and password) or cfg.batch_mode:
@@ -231,10 +605,7 @@ def logout(api):
 @click.pass_obj
 def appstore(api):
     """List available applications in the app store."""
-    apps = [app for app in api.list_applications()]
-    if apps:
-        printtable(apps)
-    else:
+    if not printrows(api.list_applications()):
         logger.warning("No applications found in the appstore.")
 
 
@@ -245,28 +616,43 @@ def appstore(api):
               help="List only elements of the specified type.")
 @click.option('-r', '--recurse', 'recurse', is_flag=True, default=False,
               help="List projects recursively.")
+@click.option('--max-depth', metavar='N', type=click.IntRange(1),
+              help="Recurse at most N levels of projects. Implies --recurse.")
+@click.option('-w', '--workers', type=click.IntRange(1),
+              default=parallel.DEFAULT_WORKERS, show_default=True,
+              help="The number of projects listed concurrently with --recurse.")
+@format_option
 @click.argument('path', required=False)
-def list_project_content(api, type, recurse, path):
+def list_project_content(api, type, recurse, max_depth, workers, fmt, path):
     """
     List project content.
 
-    If path is not given, starts from the root project.
+    If path is not given, starts from the root project. When listing
+    recursively, subprojects are listed concurrently and their content is
+    printed as soon as it is received.
     """
+    from requests.exceptions import HTTPError
     def filter_func(module):
         if type is not None and module.type != type:
             return False
         return True
 
+    if recurse or max_depth is not None:
+        modules = parallel.walk(
+            api.list_project_content, path,
+            lambda module: module.path if module.type == 'project' else None,
+            workers, max_depth)
+    else:
+        modules = api.list_project_content(path)
+
     try:
-        modules = [module for module in api.list_project_content(path, recurse)
-                   if filter_func(module)]
+        count = printrows((module for module in modules if filter_func(module)),
+                          fmt)
     except HTTPError as e:
         if e.response.status_code == 404:
             raise click.ClickException("Module '{0}' doesn't exists.".format(path))
         raise
-    if modules:
-        printtable(modules)
-    else:
+    if not count:
         logger.warning("No element found matching your criteria.")
 
 
@@ -279,7 +665,7 @@ def deployment(api, deployment_id):
     """
     deployment = api.get_deployment(deployment_id)
     if deployment:
-        printtable([deployment])
+        printrows([deployment])
     else:
         logger.warning("Deployment not found.")
 
@@ -287,16 +673,149 @@ def deployment(api, deployment_id):
 @cli.command()
 @click.option('-i', '--inactive', 'inactive', is_flag=True, default=False,
               help="Include inactive runs.")
-@click.pass_obj
-def deployments(api, inactive):
+@click.option('-w', '--watch', is_flag=True, default=False,
+              help="Keep polling and print deployment state changes.")
+@click.option('--interval', metavar='SECONDS', type=float,
+              default=5, show_default=True,
+              help="The initial delay between two polls with --watch.")
+@click.option('--max-interval', metavar='SECONDS', type=float,
+              default=60, show_default=True,
+              help="The delay between polls grows up to SECONDS while "
+                   "nothing changes.")
+@profiles_options
+@format_option
+@click.pass_context
+def deployments(ctx, inactive, watch, interval, max_interval, all_profiles,
+                profiles, fmt):
     """
     List deployments
+
+    With --watch, print an event each time a deployment changes state
+    until interrupted.
     """
-    deployments = [deployment for deployment in api.list_deployments(inactive)]
-    if deployments:
-        printtable(deployments)
+    if watch:
+        run_locally()
+    api = ctx.obj
+    profiles = selected_profiles(ctx.meta['config'], profiles, all_profiles)
+    if profiles is not None:
+        if watch:
+            raise click.UsageError("--watch cannot be used with several "
+                                   "profiles.")
+        count = printfanout(ctx, profiles,
+                            lambda api: api.list_deployments(inactive), fmt)
+        if not count:
+            logger.warning("No deployment found.")
+        return
+
+    if not watch:
+        if not printrows(api.list_deployments(inactive), fmt):
+            logger.warning("No deployment found.")
+        return
+
+    from . import watch as watcher
+
+    def poll():
+        return collections.OrderedDict(
+            (d.id, d) for d in iter_pages(api.list_deployments,
+                                          inactive=inactive))
+
+    events = watcher.watch(poll, watcher.Backoff(interval, max_interval))
+    try:
+        printevents(events, fmt)
+    except KeyboardInterrupt:
+        pass
+
+
+def format_event(event):
+    if event.previous is None:
+        return '%s %s %s: %s' % (event.time, event.deployment_id,
+                                 event.module, event.status)
+    return '%s %s %s: %s -> %s' % (event.time, event.deployment_id,
+                                   event.module, event.previous, event.status)
+
+
+def printevents(events, fmt):
+    """
+    Print deployment state change events as they happen.
+    """
+    if output_settings(fmt)[0] in output.STREAMING_FORMATS:
+        printrows(events, fmt, flush=True)
+    else:
+        for event in events:
+            click.echo(format_event(event))
+
+
+@cli.command()
+@click.option('-s', '--state', metavar='STATE', default='ready',
+              show_default=True,
+              help="The state the deployments have to reach.")
+@click.option('-t', '--timeout', metavar='SECONDS', type=float,
+              help="Give up after SECONDS.")
+@click.option('--interval', metavar='SECONDS', type=float,
+              default=5, show_default=True,
+              help="The initial delay between two polls.")
+@click.option('--max-interval', metavar='SECONDS', type=float,
+              default=60, show_default=True,
+              help="The delay between polls grows up to SECONDS while "
+                   "nothing changes.")
+@click.option('-w', '--workers', type=click.IntRange(1),
+              default=parallel.DEFAULT_WORKERS, show_default=True,
+              help="The number of deployments polled concurrently.")
+@format_option
+@click.argument('deployment_ids', metavar='[UUID]...', nargs=-1)
+@click.pass_context
+def wait(ctx, state, timeout, interval, max_interval, workers, fmt,
+         deployment_ids):
+    """
+    Wait for deployments to reach a state.
+
+    State changes are printed as they happen. Deployments can be given as
+    UUID arguments or read from stdin with '-'. Exits with 1 if a
+    deployment ended in another final state or couldn't be polled, and
+    with 124 on timeout.
+    """
+    from . import watch as watcher
+
+    run_locally()
+    api = ctx.obj
+    deployment_ids = read_uuids(deployment_ids, ctx.command.params[-1])
+    if not deployment_ids:
+        raise click.UsageError("No deployment given.")
+
+    writer = None
+    if output_settings(fmt)[0] in output.STREAMING_FORMATS:
+        writer = row_writer(fmt, flush=True)
+        on_event = writer.write
     else:
-        logger.warning("No deployment found.")
+        on_event = lambda event: click.echo(format_event(event))
+
+    def on_error(deployment_id, error):
+        logger.warning("Failed to get deployment %s: %s"
+                       % (deployment_id, _error_message(error)))
+
+    try:
+        result = watcher.wait(api.get_deployment, deployment_ids,
+                              state.lower(), timeout,
+                              watcher.Backoff(interval, max_interval),
+                              workers, on_event, on_error)
+    except output.UnknownColumnError as e:
+        raise click.BadParameter(str(e), param_hint="'--columns'")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    for deployment_id in result.failed:
+        logger.error("Deployment %s won't reach the state '%s'."
+                     % (deployment_id, state))
+    for deployment_id, error in result.errors.items():
+        logger.error("Gave up waiting for deployment %s: %s"
+                     % (deployment_id, _error_message(error)))
+    for deployment_id in result.pending:
+        logger.error("Timeout waiting for deployment %s." % deployment_id)
+    if result.failed or result.errors:
+        ctx.exit(1)
+    if result.pending:
+        ctx.exit(124)
 
 
 @cli.command()
@@ -306,27 +825,131 @@ def deployments(api, inactive):
               help="The cloud service name to filter with.")
 @click.option('--status', metavar='STATUS', type=click.STRING,
               help="The status to filter with.")
-@click.pass_obj
-def virtualmachines(api, deployment_id, cloud, status):
+@click.option('--first', metavar='N', type=click.IntRange(1), default=1,
+              help="Start listing from the N-th virtual machine.")
+@click.option('--limit', metavar='N', type=click.IntRange(1),
+              help="List at most N virtual machines.")
+@click.option('--page-size', metavar='N', type=click.IntRange(1),
+              default=PAGE_SIZE, show_default=True,
+              help="The number of virtual machines fetched per request.")
+@profiles_options
+@format_option
+@click.pass_context
+def virtualmachines(ctx, deployment_id, cloud, status, first, limit, page_size,
+                    all_profiles, profiles, fmt):
     """
     List virtual machines filtered according to given options.
-    """
-    def filter_func(vm):
-        if deployment_id and vm.deployment_id != deployment_id:
-            return False
-        if cloud and vm.cloud != cloud:
-            return False
-        if status and vm.status != status:
-            return False
-        return True
 
-    vms = [vm for vm in api.list_virtualmachines() if filter_func(vm)]
-    if vms:
-        printtable(vms)
+    The deployment and cloud filters are applied by the server, and pages
+    are only fetched until --limit virtual machines have been listed.
+    """
+    # Without filtering on the client, no more than --limit VMs are needed
+    size = min(page_size, limit) if limit is not None and not status \
+        else page_size
+
+    def list_vms(api):
+        vms = iter_pages(api.list_virtualmachines, size, first - 1,
+                         deployment_id=deployment_id, cloud=cloud)
+        if status:
+            vms = (vm for vm in vms if vm.status == status.lower())
+        if limit is not None:
+            vms = itertools.islice(vms, limit)
+        return vms
+
+    profiles = selected_profiles(ctx.meta['config'], profiles, all_profiles)
+    if profiles is not None:
+        count = printfanout(ctx, profiles, list_vms, fmt)
     else:
+        count = printrows(list_vms(ctx.obj), fmt)
+    if not count:
         logger.warning("No virtual machines found matching your criteria.")
 
 
+def split_columns(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+@cli.command()
+@click.argument('table', metavar='deployments|virtualmachines',
+                type=click.Choice(['deployments', 'virtualmachines']))
+@click.argument('filters', metavar='[FILTER]...', nargs=-1)
+@click.option('-s', '--sort', metavar='COLUMN,...',
+              help="Sort by the columns, in descending order for those "
+                   "prefixed with '-'.")
+@click.option('-g', '--group-by', 'group', metavar='COLUMN,...',
+              help="Count the rows for each value of the columns.")
+@click.option('--limit', metavar='N', type=click.IntRange(1),
+              help="Print at most N rows.")
+@click.option('--max-age', metavar='SECONDS', type=float,
+              default=conf.INDEX_MAX_AGE, show_default=True,
+              help="Refresh the index from the server when it is older.")
+@click.option('--refresh', is_flag=True, default=False,
+              help="Refresh the index from the server first.")
+@click.option('--offline', is_flag=True, default=False,
+              help="Never refresh the index from the server.")
+@click.option('--page-size', metavar='N', type=click.IntRange(1),
+              default=PAGE_SIZE, show_default=True,
+              help="The number of items fetched per request on refresh.")
+@format_option
+@click.pass_context
+def query(ctx, table, filters, sort, group, limit, max_age, refresh, offline,
+          page_size, fmt):
+    """
+    Query the local index of deployments or virtual machines.
+
+    FILTERs look like 'status=running', 'cloud~exo*' or 'started_at<3d',
+    with the operators =, !=, <, <=, >, >= and ~ (glob). In time columns,
+    durations like 30m, 12h or 3d stand for that long ago. Virtual machines
+    can also be queried on the columns of their deployment, prefixed with
+    'deployment_', like 'deployment_started_at<3d'.
+
+    The index includes inactive deployments. It is refreshed from the
+    server when older than --max-age, only the changes being written.
+    """
+    from .index import Index, parse_filter
+
+    if refresh and offline:
+        raise click.UsageError("--refresh and --offline are exclusive.")
+    try:
+        filters = [parse_filter(f) for f in filters]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="FILTER")
+    sort = split_columns(sort)
+    group = split_columns(group)
+    columns = output_settings(fmt)[1] if not group else None
+
+    cfg = ctx.meta['config']
+    index = Index(cfg.index_file, cfg.settings['endpoint'])
+    api = ctx.obj
+    listings = {
+        'deployments': lambda: iter_pages(api.list_deployments, page_size,
+                                          inactive=True),
+        'virtualmachines': lambda: iter_pages(api.list_virtualmachines,
+                                              page_size),
+    }
+    names = [f.column for f in filters] + [s.lstrip('-') for s in sort] + \
+        group + list(columns or [])
+    try:
+        for name in index.tables(table, names):
+            age = index.age(name)
+            if offline:
+                if age is None:
+                    logger.warning("The %s haven't been indexed yet." % name)
+                continue
+            if refresh or age is None or age > max_age:
+                added, updated, removed = index.refresh(name, listings[name]())
+                logger.info("Indexed %s: %d added, %d updated, %d removed."
+                            % (name, added, updated, removed))
+        rows = index.query(table, filters, sort, group, limit, columns)
+        count = printrows(rows, fmt)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        index.close()
+    if not count:
+        logger.warning("No %s found matching your criteria." % table)
+
+
 @cli.command()
 @click.option('--cloud', help="The cloud service to run the image with.")
 @click.option('--open', 'should_open', is_flag=True, default=False,
@@ -344,6 +967,104 @@ def build(ctx, cloud, should_open, path):
         ctx.invoke(open_cmd, run_id=deployment_id)
 
 
+def memoize(func):
+    cache = []
+
+    def wrapper():
+        if not cache:
+            cache.append(func())
+        return cache[0]
+    return wrapper
+
+
+def application_finder(api):
+    """
+    Return a function looking app store applications up by name.
+
+    The local app store index is used when the cache is enabled, otherwise
+    the app store is fetched once on the first lookup.
+    """
+    if isinstance(api, CachedApi):
+        return api.find_application
+
+    @memoize
+    def get_appstore():
+        return {app.name: app for app in api.list_applications()}
+    return lambda name: get_appstore().get(name)
+
+
+def resolve_deployable(api, path, find_application):
+    """
+    Return the path and the type of the element to deploy.
+
+    When `path` isn't a module path, it's looked up by name with
+    `find_application`. Names already in the local app store index are
+    resolved without contacting the server.
+    """
+    from requests.exceptions import HTTPError
+    if isinstance(api, CachedApi) and '/' not in path:
+        app = api.find_application(path, refresh=False)
+        if app is not None:
+            return app.path, app.type
+    try:
+        return path, api.get_element(path).type
+    except HTTPError as e:
+        if e.response.status_code != 404:
+            return path, 'Unknown'
+        app = find_application(path)
+        if app is None:
+            raise
+        return app.path, app.type
+
+
+def deploy_manifest(api, manifest, workers, rate, breaker=None):
+    """
+    Deploy every entry of `manifest` concurrently and echo the deployment
+    IDs as they are returned.
+    """
+    from .manifest import ManifestError, read_manifest
+    try:
+        rows = read_manifest(manifest)
+    except (ManifestError, ValueError) as e:
+        raise click.ClickException("Invalid manifest: %s" % e)
+
+    find_application = application_finder(api)
+    resolved = {}
+    for path in collections.OrderedDict.fromkeys(row.path for row in rows):
+        resolved[path] = resolve_deployable(api, path, find_application)
+        if resolved[path][1] not in ['application', 'component']:
+            raise click.ClickException(
+                "Cannot run '{0}', a '{1}'.".format(path, resolved[path][1]))
+
+    deployments = []
+    for row in rows:
+        params = dict()
+        try:
+            for value in row.clouds:
+                params.update([types.NodeKeyValue.to_raw_param(value, True)])
+            for value in row.params:
+                params.update([types.NodeKeyValue.to_raw_param(value)])
+        except ValueError:
+            raise click.ClickException(
+                "Entry #%d has an invalid cloud or parameter." % row.line)
+        deployments.append((row, resolved[row.path][0], params))
+
+    failed = 0
+    for outcome in parallel.imap(lambda d: api.deploy(d[1], raw_params=d[2]),
+                                 deployments, workers, rate,
+                                 breaker=breaker):
+        if outcome.error is None:
+            click.echo(outcome.result)
+        else:
+            failed += 1
+            logger.error("Entry #%d (%s): %s" % (outcome.item[0].line,
+                                                 outcome.item[0].path,
+                                                 _error_message(outcome.error)))
+    if failed:
+        raise click.ClickException(
+            "%d of %d deployments failed." % (failed, len(deployments)))
+
+
 @cli.command()
 @click.option('--cloud', '-c', type=types.NodeKeyValue(), multiple=True, metavar='<node>:<cloud> or <cloud>',
               help='Specify cloud service to be used.')
@@ -352,24 +1073,44 @@ def build(ctx, cloud, should_open, path):
               help='Set application or component parameters.')
 @click.option('--open', 'should_open', is_flag=True, default=False,
               help="Open the created run in a web browser")
-@click.argument('path', metavar='PATH', nargs=1, required=True)
+@click.option('-f', '--from-file', 'manifest', type=click.File('r'),
+              metavar='FILE',
+              help="Deploy every entry of a YAML, JSON or CSV manifest.")
+@click.option('-w', '--workers', type=click.IntRange(1),
+              default=parallel.DEFAULT_WORKERS, show_default=True,
+              help="The number of deployments to submit concurrently "
+                   "with --from-file.")
+@click.option('--rate', type=float, metavar='N',
+              help="Submit at most N deployments per second "
+                   "with --from-file.")
+@click.argument('path', metavar='[PATH]', nargs=1, required=False)
 @click.pass_context
-def deploy(ctx, cloud, param, should_open, path):
+def deploy(ctx, cloud, param, should_open, manifest, workers, rate, path):
     """
     Deploy a component or an application
+
+    With --from-file, deploy every entry of the manifest FILE instead of
+    PATH. Each entry gives a `path` and optionally its `cloud` and `param`
+    values, using the same notation as the --cloud and --param options.
     """
     api = ctx.obj
-    type = 'Unknown'
 
-    try:
-        type = api.get_element(path).type
-    except HTTPError as e:
-        if e.response.status_code == 404:
-            app = {app.name: app for app in api.list_applications()}.get(path)
-            if app is None:
-                raise
-            path = app.path
-            type = app.type
+    if manifest is not None:
+        if path is not None or cloud or param or should_open:
+            raise click.UsageError(
+                "--from-file cannot be used with PATH, --cloud, --param "
+                "or --open.")
+        if rate is not None and rate <= 0:
+            raise click.BadParameter("must be positive.",
+                                     param_hint="'--rate'")
+        deploy_manifest(api, manifest, workers, rate,
+                        circuit_breaker(ctx.meta['config']))
+        return
+
+    if path is None:
+        raise click.UsageError("Missing argument \"PATH\".")
+
+    path, type = resolve_deployable(api, path, application_finder(api))
 
     if type not in ['application', 'component']:
         raise click.ClickException("Cannot run a '{}'.".format(type))
@@ -389,11 +1130,22 @@ def deploy(ctx, cloud, param, should_open, path):
 def show(api, path):
     """
     Show project, component or application details
+
+    PATH can also be the name of an application of the app store.
     """
-    element = api.get_element(path)
+    from requests.exceptions import HTTPError
+    try:
+        element = api.get_element(path)
+    except HTTPError as e:
+        if e.response.status_code != 404:
+            raise
+        app = application_finder(api)(path)
+        if app is None:
+            raise
+        element = api.get_element(app.path)
 
     if element:
-        printtable([element])
+        printrows([element])
     else:
         logger.warning("Element not found.")
 
@@ -408,41 +1160,577 @@ def open_cmd(api, deployment_id):
     click.launch("{0}/run/{1}".format(api.endpoint, deployment_id))
 
 
+def read_uuids(values, param):
+    """
+    Convert the given values to UUIDs, replacing '-' by the whitespace
+    separated UUIDs read from stdin.
+    """
+    uuids = []
+    for value in values:
+        if value == '-':
+            tokens = click.get_text_stream('stdin').read().split()
+        else:
+            tokens = [value]
+        for token in tokens:
+            try:
+                uuids.append(uuid.UUID(token))
+            except ValueError:
+                raise click.BadParameter("'%s' is not a valid UUID." % token,
+                                         param=param)
+    return uuids
+
+
 @cli.command()
+@click.option('--module', metavar='PATTERN',
+              help="Select deployments of modules matching the glob PATTERN.")
+@click.option('--cloud', metavar='CLOUD', type=click.STRING,
+              help="Select deployments running on the cloud service CLOUD.")
+@click.option('--status', metavar='STATUS', type=click.STRING,
+              help="Select deployments in the state STATUS.")
+@click.option('-w', '--workers', type=click.IntRange(1),
+              default=parallel.DEFAULT_WORKERS, show_default=True,
+              help="The number of deployments to terminate concurrently.")
+@click.option('-y', '--yes', is_flag=True, default=False,
+              help="Don't ask for confirmation before terminating the "
+                   "deployments selected by filters.")
+@click.option('--dry-run', is_flag=True, default=False,
+              help="Only print the deployments which would be terminated.")
+@click.argument('deployment_ids', metavar='[UUID]...', nargs=-1)
+@click.pass_context
+def terminate(ctx, module, cloud, status, workers, yes, dry_run,
+              deployment_ids):
+    """
+    Terminate the given deployments.
+
+    Deployments can be given as UUID arguments, read from stdin with '-'
+    or selected with the --module, --cloud and --status filters, in which
+    case a confirmation is asked unless --yes or --batch_mode is given.
+    """
+    api = ctx.obj
+    deployment_ids = read_uuids(deployment_ids, ctx.command.params[-1])
+
+    if module or cloud or status:
+        for deployment in iter_pages(api.list_deployments, cloud=cloud):
+            if module and not fnmatch.fnmatchcase(deployment.module, module):
+                continue
+            if status and deployment.status != status.lower():
+                continue
+            deployment_ids.append(deployment.id)
+
+    # Keep the order of the given UUIDs but terminate each deployment once
+    deployment_ids = list(collections.OrderedDict.fromkeys(deployment_ids))
+
+    if not deployment_ids:
+        if module or cloud or status:
+            logger.warning("No deployment found matching your criteria.")
+            return
+        raise click.UsageError("No deployment given.")
+
+    Termination = collections.namedtuple('Termination',
+                                         ['deployment_id', 'result'])
+    if dry_run:
+        printrows(Termination(deployment_id, 'would be terminated')
+                  for deployment_id in deployment_ids)
+        return
+
+    if (module or cloud or status) and not yes and \
+            not ctx.meta['config'].batch_mode:
+        run_locally()
+        click.confirm("Terminate %d deployment(s)? (see them with --dry-run)"
+                      % len(deployment_ids), abort=True)
+
+    if len(deployment_ids) == 1:
+        api.terminate(deployment_ids[0])
+        logger.info("Deployment successfully terminated.")
+        return
+
+    results = []
+    for outcome in parallel.imap(api.terminate, deployment_ids, workers,
+                                 breaker=circuit_breaker(ctx.meta['config'])):
+        if outcome.error is None:
+            results.append(Termination(outcome.item, 'terminated'))
+        else:
+            results.append(Termination(outcome.item,
+                                       _error_message(outcome.error)))
+    results.sort(key=lambda r: deployment_ids.index(r.deployment_id))
+    printrows(results)
+
+    failed = len([r for r in results if r.result != 'terminated'])
+    if failed:
+        raise click.ClickException(
+            "%d of %d deployments could not be terminated."
+            % (failed, len(results)))
+
+
+def node_sizes(api, deployment_id, nodes, workers):
+    """
+    Return the instance ids of each of the `nodes` of a deployment, read
+    concurrently.
+    """
+    from requests.exceptions import HTTPError
+
+    def ids(node):
+        value = api.get_deployment_parameter(deployment_id, '%s:ids' % node,
+                                             ignore_abort=True) or ''
+        if isinstance(value, bytes):
+            value = value.decode('utf8')
+        return [i.strip() for i in value.split(',') if i.strip()]
+
+    sizes = {}
+    for outcome in parallel.imap(ids, nodes, workers):
+        if isinstance(outcome.error, HTTPError) and \
+                outcome.error.response.status_code == 404:
+            raise click.ClickException("Node '%s' not found in deployment %s."
+                                       % (outcome.item, deployment_id))
+        if outcome.error is not None:
+            raise outcome.error
+        sizes[outcome.item] = outcome.result
+    return sizes
+
+
+def scale_batches(node, ids, size, batch_size):
+    """
+    Return the (node, quantity, ids) batches of instances to add to or
+    remove from `node` to go from the instance `ids` to `size` instances,
+    the last instances being removed first.
+    """
+    if size > len(ids):
+        missing = size - len(ids)
+        return [(node, min(batch_size, missing - n), None)
+                for n in range(0, missing, batch_size)]
+    extra = sorted(ids, key=lambda i: (len(i), i))[size:][::-1]
+    return [(node, len(extra[n:n + batch_size]), extra[n:n + batch_size])
+            for n in range(0, len(extra), batch_size)]
+
+
+@cli.command()
+@click.option('--batch-size', metavar='N', type=click.IntRange(1),
+              default=conf.DEFAULT_SCALE_BATCH_SIZE, show_default=True,
+              help="The number of instances added or removed per request.")
+@click.option('-w', '--workers', type=click.IntRange(1),
+              default=parallel.DEFAULT_WORKERS, show_default=True,
+              help="The number of requests sent concurrently.")
+@click.option('--no-wait', is_flag=True, default=False,
+              help="Don't wait for the nodes to reach their new size.")
+@click.option('-t', '--timeout', metavar='SECONDS', type=float,
+              help="Give up waiting after SECONDS.")
+@click.option('--interval', metavar='SECONDS', type=float,
+              default=5, show_default=True,
+              help="The initial delay between two polls.")
+@click.option('--max-interval', metavar='SECONDS', type=float,
+              default=60, show_default=True,
+              help="The delay between polls grows up to SECONDS while "
+                   "nothing changes.")
 @click.argument('deployment_id', metavar='UUID', type=click.UUID)
-@click.pass_obj
-def terminate(api, deployment_id):
+@click.argument('sizes', metavar='<node>=<count>...', nargs=-1,
+                required=True, type=types.NodeCount())
+@click.pass_context
+def scale(ctx, batch_size, workers, no_wait, timeout, interval, max_interval,
+          deployment_id, sizes):
+    """
+    Add or remove instances of the nodes of a deployment.
+
+    Each node is given its new number of instances, like 'web=10', or the
+    number of instances to add or remove, like 'web=+5' or 'web=-2'. The
+    requests are sent concurrently by batches, then the progress is printed
+    until the deployment is ready with the new sizes. Exits with 1 if the
+    deployment failed and with 124 on timeout.
+    """
+    from requests.exceptions import HTTPError
+    from . import watch as watcher
+
+    run_locally()
+    api = ctx.obj
+    try:
+        deployment = api.get_deployment(deployment_id)
+    except HTTPError as e:
+        if e.response.status_code == 404:
+            raise click.ClickException("Deployment %s not found."
+                                       % deployment_id)
+        raise
+    if str(deployment.scalable).lower() != 'true':
+        raise click.ClickException("Deployment %s isn't scalable."
+                                   % deployment_id)
+
+    nodes = collections.OrderedDict()
+    for node, count, relative in sizes:
+        nodes[node] = (count, relative)
+    current = node_sizes(api, deployment_id, list(nodes), workers)
+    targets = collections.OrderedDict()
+    batches = []
+    for node, (count, relative) in nodes.items():
+        targets[node] = len(current[node]) + count if relative else count
+        if targets[node] < 0:
+            raise click.BadParameter(
+                "Node '%s' only has %d instances." % (node,
+                                                      len(current[node])),
+                param=ctx.command.params[-1])
+        batches.extend(scale_batches(node, current[node], targets[node],
+                                     batch_size))
+
+    for node, size in targets.items():
+        logger.notify("Node '%s': %d -> %d instances."
+                      % (node, len(current[node]), size))
+    if not batches:
+        return
+
+    def send(batch):
+        node, quantity, ids = batch
+        if ids is None:
+            return api.add_node_instances(deployment_id, node, quantity)
+        return api.remove_node_instances(deployment_id, node, ids)
+
+    failed = 0
+    for outcome in parallel.imap(send, batches, workers,
+                                 breaker=circuit_breaker(ctx.meta['config'])):
+        if outcome.error is not None:
+            node, quantity, ids = outcome.item
+            logger.error("Could not %s %d instances of '%s': %s" % (
+                'add' if ids is None else 'remove', quantity, node,
+                _error_message(outcome.error)))
+            failed += 1
+    if failed:
+        raise click.ClickException("%d of %d requests failed."
+                                   % (failed, len(batches)))
+    if no_wait:
+        return
+
+    def poll():
+        deployment = api.get_deployment(deployment_id)
+        sizes = node_sizes(api, deployment_id, list(targets), workers)
+        return deployment.status, deployment.abort, dict(
+            (node, len(ids)) for node, ids in sizes.items())
+
+    def on_progress(state, sizes):
+        click.echo('%s %s: %s' % (watcher._now(), state, ', '.join(
+            '%s %d/%d' % (node, sizes[node], size)
+            for node, size in targets.items())))
+
+    result = watcher.wait_size(poll, targets, timeout,
+                               watcher.Backoff(interval, max_interval),
+                               on_progress)
+    if result == 'failed':
+        logger.error("Deployment %s failed while scaling." % deployment_id)
+        ctx.exit(1)
+    if result == 'timeout':
+        logger.error("Timeout waiting for deployment %s to scale."
+                     % deployment_id)
+        ctx.exit(124)
+
+
+def parse_time(value, now=None):
+    """
+    Convert a UTC date like '2017-01-25' or '2017-01-25 12:00', or a
+    duration like '3d' standing for that long ago, to seconds since the
+    epoch.
+    """
+    import calendar
+    import time
+    now = time.time() if now is None else now
+    try:
+        return now - types.Duration.parse(value)
+    except ValueError:
+        pass
+    for pattern in ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S',
+                    '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return calendar.timegm(time.strptime(value, pattern))
+        except ValueError:
+            pass
+    raise ValueError("Invalid time '%s'. Use a date like '2017-01-25 12:00' "
+                     "or a duration like '3d'." % value)
+
+
+def collect_usage(api, log, interval, count):
     """
-    Terminate the given deployment.
+    Append the usage to `log` every `interval` seconds, `count` times or
+    until interrupted. Failed samples are logged and skipped.
     """
-    api.terminate(deployment_id)
-    logger.info("Deployment successfully terminated.")
+    import time
+    start = time.time()
+    sampled = 0
+    while count is None or sampled < count:
+        now = time.time()
+        try:
+            usages = list(api.usage())
+        except Exception as e:
+            logger.error("Usage not sampled: %s" % _error_message(e))
+        else:
+            log.append(now, usages)
+            logger.info("Sampled the usage of %d clouds." % len(usages))
+        sampled += 1
+        if count is not None and sampled >= count:
+            break
+        # Samples stay aligned on the interval whatever the request time
+        time.sleep(interval - (time.time() - start) % interval)
 
 
 @cli.command()
-@click.pass_obj
-def usage(api):
+@click.option('--collect', is_flag=True, default=False,
+              help="Keep sampling the usage into the usage log of the "
+                   "profile until interrupted.")
+@click.option('--interval', metavar='DURATION', type=types.Duration(),
+              default='60s', show_default=True,
+              help="The delay between two samples with --collect.")
+@click.option('--count', metavar='N', type=click.IntRange(1),
+              help="Stop collecting after N samples.")
+@click.option('--history', is_flag=True, default=False,
+              help="Print the samples of the usage log instead.")
+@click.option('--since', metavar='TIME',
+              help="Only print the samples from TIME, a UTC date like "
+                   "'2017-01-25 12:00' or a duration like '3d' meaning "
+                   "that long ago.")
+@click.option('--until', metavar='TIME',
+              help="Only print the samples before TIME.")
+@click.option('--every', metavar='DURATION', type=types.Duration(),
+              help="Print one sample per cloud for every DURATION, "
+                   "aggregating the samples of each period.")
+@click.option('--aggregate', type=click.Choice(['max', 'min', 'mean',
+                                                 'last']),
+              default='max', show_default=True,
+              help="How the samples of a period are aggregated with "
+                   "--every.")
+@click.option('--cloud', 'clouds', metavar='CLOUD', multiple=True,
+              help="Only print the samples of CLOUD with --history.")
+@profiles_options
+@format_option
+@click.pass_context
+def usage(ctx, collect, interval, count, history, since, until, every,
+          aggregate, clouds, all_profiles, profiles, fmt):
     """
     List current usage and quota by cloud service.
+
+    With --collect, the usage is sampled every --interval into a compact
+    log of the profile, and --history prints it back, downsampled to one
+    sample per cloud for every --every period.
+    """
+    from .timeseries import UsageLog, downsample
+
+    if collect:
+        run_locally()
+    cfg = ctx.meta['config']
+    profiles = selected_profiles(cfg, profiles, all_profiles)
+    if collect and history:
+        raise click.UsageError("--collect and --history are exclusive.")
+    if (collect or history) and profiles is not None:
+        raise click.UsageError("--collect and --history only apply to the "
+                               "current profile.")
+    if interval <= 0:
+        raise click.BadParameter("The interval must be positive.",
+                                 param_hint="'--interval'")
+
+    if collect:
+        try:
+            collect_usage(ctx.obj, UsageLog(cfg.usage_file), interval, count)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if history:
+        bounds = []
+        for name, value in (('since', since), ('until', until)):
+            try:
+                bounds.append(parse_time(value) if value else None)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint="'--%s'" % name)
+        start, end = bounds
+        records = UsageLog(cfg.usage_file).read(start, end)
+        if clouds:
+            records = (r for r in records if r.cloud in clouds)
+        try:
+            count = printrows(downsample(records, max(int(every or 1), 1),
+                                         aggregate), fmt)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if not count:
+            logger.warning("No usage sample found.")
+        return
+
+    if profiles is not None:
+        printfanout(ctx, profiles, lambda api: api.usage(), fmt)
+    else:
+        printrows(ctx.obj.usage(), fmt)
+
+
+def is_glob(path):
+    return any(c in path for c in '*?[')
+
+
+def find_modules(api, pattern, workers):
+    """
+    Return the modules whose path matches the glob `pattern`, matching
+    each path segment separately, in a single concurrent walk of the
+    projects from the longest literal prefix of the pattern.
+    """
+    segments = pattern.strip('/').split('/')
+    prefix = list(itertools.takewhile(lambda s: not is_glob(s), segments))
+
+    def matches(path, full):
+        parts = path.strip('/').split('/')
+        if len(parts) > len(segments) or (full and len(parts) < len(segments)):
+            return False
+        return all(fnmatch.fnmatchcase(part, segment)
+                   for part, segment in zip(parts, segments))
+
+    modules = parallel.walk(
+        api.list_project_content, '/'.join(prefix) or None,
+        lambda module: module.path if module.type == 'project' and
+        matches(module.path, False) else None,
+        workers, len(segments) - len(prefix) - 1)
+    return [module for module in modules if matches(module.path, True)]
+
+
+Target = collections.namedtuple('Target', ['path', 'version', 'ranged'])
+
+Operation = collections.namedtuple('Operation', ['path', 'version', 'result'])
+
+
+def latest_version(api, path):
     """
-    items = [item for item in api.usage()]
-    printtable(items)
+    Return the latest version of the element at `path`, read from the
+    server rather than the cache, where a newer version saved by another
+    client may be missing.
+    """
+    if isinstance(api, CachedApi):
+        return api.get_element(path, cached=False).version
+    return api.get_element(path).version
+
+
+def bulk_targets(api, path, versions, workers, version=None,
+                 versionless=False):
+    """
+    Return the `Target`s of a bulk operation on the modules matching the
+    glob `path`: the given `version`, each version in the `versions`
+    ranges up to the latest one, or else the latest version (no version if
+    `versionless`).
+    """
+    from requests.exceptions import HTTPError
+    try:
+        if is_glob(path):
+            modules = [(m.path, m.version)
+                       for m in find_modules(api, path, workers)]
+        elif versions or (version is None and not versionless):
+            modules = [(path, latest_version(api, path))]
+        else:
+            modules = [(path, None)]
+    except HTTPError as e:
+        if e.response.status_code == 404:
+            raise click.ClickException("Module '{0}' doesn't exists."
+                                       .format(path))
+        raise
+
+    targets = []
+    for module_path, latest in sorted(modules):
+        if versions:
+            targets.extend(Target(module_path, v, True) for v in
+                           types.VersionRange.expand(versions, latest))
+        elif version is not None:
+            targets.append(Target(module_path, version, False))
+        else:
+            targets.append(Target(module_path,
+                                  None if versionless else latest, False))
+    return targets
+
+
+def run_bulk(ctx, targets, func, done, errors, workers, dry_run,
+             confirm=None):
+    """
+    Call `func(path)` concurrently for every target and print a report.
+
+    `errors` maps HTTP status codes to (result, failed) to report for the
+    targets failing with them. Missing versions of a range are skipped.
+    If `confirm` is given, the targets are listed and the question, with
+    the number of targets, is asked first unless in batch mode.
+    """
+    def target_path(target):
+        if target.version is None:
+            return target.path
+        return '%s/%s' % (target.path, target.version)
+
+    if not targets:
+        logger.warning("No element found matching your criteria.")
+        return
+    if dry_run:
+        printrows(Operation(t.path, t.version, 'would be %s' % done)
+                  for t in targets)
+        return
+
+    if confirm and not ctx.meta['config'].batch_mode:
+        run_locally()
+        printrows(Operation(t.path, t.version, 'will be %s' % done)
+                  for t in targets)
+        click.confirm(confirm % len(targets), abort=True)
+
+    results = {}
+    failed = 0
+    for outcome in parallel.imap(lambda t: func(target_path(t)), targets,
+                                 workers,
+                                 breaker=circuit_breaker(ctx.meta['config'])):
+        target = outcome.item
+        if outcome.error is None:
+            results[target] = done
+            continue
+        status = getattr(getattr(outcome.error, 'response', None),
+                         'status_code', None)
+        if status == 404 and target.ranged:
+            results[target] = 'skipped, no such version'
+        elif status in errors:
+            results[target], error = errors[status]
+            failed += error
+        else:
+            results[target] = _error_message(outcome.error)
+            failed += 1
+    printrows(Operation(t.path, t.version, results[t]) for t in targets)
+    if failed:
+        raise click.ClickException("%d of %d operations failed."
+                                   % (failed, len(targets)))
+
+
+def bulk_options(func):
+    func = click.option('--versions', type=types.VersionRange(),
+                        metavar='RANGES',
+                        help="Act on each version in the ranges, e.g. "
+                             "'..120' or '3,10..12'. Missing versions are "
+                             "skipped.")(func)
+    func = click.option('-w', '--workers', type=click.IntRange(1),
+                        default=parallel.DEFAULT_WORKERS, show_default=True,
+                        help="The number of elements processed "
+                             "concurrently.")(func)
+    func = click.option('--dry-run', is_flag=True, default=False,
+                        help="Only print the elements which would be "
+                             "processed.")(func)
+    return func
 
 
 @cli.command()
-@click.pass_obj
 @click.argument('path', metavar='PATH', nargs=1, required=True)
 @click.argument('version', metavar='VERSION', type=int, required=False)
-def publish(api, path, version):
+@bulk_options
+@click.pass_context
+def publish(ctx, path, version, versions, workers, dry_run):
     """
     Publish PATH and VERSION to the AppStore.
 
-    If VERSION is not given, assumes the latest one.
+    If VERSION is not given, assumes the latest one. PATH can be a glob,
+    like 'project/*/app', to publish every matching element.
 
     WARNING: you need to be a superuser to publish module.
     """
+    from requests.exceptions import HTTPError
+    api = ctx.obj
+    if version is not None and versions:
+        raise click.UsageError("VERSION and --versions are exclusive.")
+    if is_glob(path) or versions or dry_run:
+        targets = bulk_targets(api, path, versions, workers, version)
+        run_bulk(ctx, targets, api.publish, 'published',
+                 {403: ('only a superuser is allowed to publish', True),
+                  404: ("doesn't exist", True),
+                  409: ('already published', False)},
+                 workers, dry_run)
+        return
+
     if version is None:
-        version = api.get_element(path).version
+        version = latest_version(api, path)
     try:
         api.publish('%s/%s' % (path, version))
     except HTTPError as e:
@@ -461,19 +1749,39 @@ def publish(api, path, version):
 
 
 @cli.command()
-@click.pass_obj
 @click.argument('path', metavar='PATH', nargs=1, required=True)
 @click.argument('version', metavar='VERSION', type=int, required=False)
-def unpublish(api, path, version):
+@bulk_options
+@click.option('-y', '--yes', is_flag=True, default=False,
+              help="Don't ask for confirmation before unpublishing several "
+                   "elements.")
+@click.pass_context
+def unpublish(ctx, path, version, versions, workers, yes, dry_run):
     """
     Unpublish PATH and VERSION to the AppStore.
 
-    If VERSION is not given, assumes the latest one.
+    If VERSION is not given, assumes the latest one. PATH can be a glob,
+    like 'project/*/app', to unpublish every matching element, in which
+    case, as with --versions, a confirmation is asked unless --yes or
+    --batch_mode is given.
 
     WARNING: you need to be a superuser to publish module.
     """
+    from requests.exceptions import HTTPError
+    api = ctx.obj
+    if version is not None and versions:
+        raise click.UsageError("VERSION and --versions are exclusive.")
+    if is_glob(path) or versions or dry_run:
+        targets = bulk_targets(api, path, versions, workers, version)
+        run_bulk(ctx, targets, api.unpublish, 'unpublished',
+                 {403: ('only a superuser is allowed to unpublish', True),
+                  404: ("doesn't exist", True)},
+                 workers, dry_run,
+                 confirm=None if yes else "Unpublish %d element(s)?")
+        return
+
     if version is None:
-        version = api.get_element(path).version
+        version = latest_version(api, path)
     try:
         api.unpublish('%s/%s' % (path, version))
     except HTTPError as e:
@@ -489,14 +1797,35 @@ def unpublish(api, path, version):
 
 
 @cli.command()
-@click.pass_obj
 @click.argument('path', metavar='PATH', nargs=1, required=True)
 @click.argument('version', metavar='VERSION', type=int, required=False)
-def delete(api, path, version):
+@bulk_options
+@click.option('-y', '--yes', is_flag=True, default=False,
+              help="Don't ask for confirmation before deleting several "
+                   "elements.")
+@click.pass_context
+def delete(ctx, path, version, versions, workers, yes, dry_run):
     """
     Delete an element (project/component/application).
+
+    PATH can be a glob, like 'project/*/app', to delete every matching
+    element, in which case, as with --versions, a confirmation is asked
+    unless --yes or --batch_mode is given.
     """
+    from requests.exceptions import HTTPError
+    api = ctx.obj
     logger.debug(path)
+    if version is not None and versions:
+        raise click.UsageError("VERSION and --versions are exclusive.")
+    if is_glob(path) or versions or dry_run:
+        targets = bulk_targets(api, path, versions, workers, version,
+                               versionless=True)
+        run_bulk(ctx, targets, api.delete_element, 'deleted',
+                 {403: ('not allowed', True), 404: ("doesn't exist", True)},
+                 workers, dry_run,
+                 confirm=None if yes else "Delete %d element(s)?")
+        return
+
     if version is not None:
         path = '%s/%s' % (path, version)
 
@@ -508,5 +1837,3 @@ def delete(api, path, version):
         raise
 
     logger.notify('Deleted %s' % path)
-
-
@@ -0,0 +1,297 @@
+from __future__ import absolute_import, unicode_literals
+
+# Shell completion of command names, module paths and deployment UUIDs
+# without importing click or the commands, from a small index of the
+# profile. The index is serialized with marshal, which is built in and
+# faster to load than json. It is written by a process started in the
+# background when it's missing or older than `conf.COMPLETION_TTL`, so
+# completing never waits for the server. This module must only import
+# fast modules.
+
+import io
+import marshal
+import os
+import sys
+import time
+
+from . import conf
+
+# A refresh is started again if the previous one didn't finish in time
+REFRESH_TIMEOUT = 120
+
+
+def index_file(profile):
+    return os.path.expanduser(conf.COOKIE_FILE_PATH +
+                              conf.COMPLETION_FILE_NAME_FORMAT.format(
+                                  profile=profile))
+
+
+def _profile(words):
+    for i, word in enumerate(words):
+        if word in ('-P', '--profile') and i + 1 < len(words):
+            return words[i + 1]
+        if word.startswith('--profile='):
+            return word.split('=', 1)[1]
+    return os.environ.get('SLIPSTREAM_PROFILE') or conf.DEFAULT_PROFILE
+
+
+def load(filename):
+    try:
+        with io.open(filename, 'rb') as fp:
+            index = marshal.load(fp)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def save(filename, index):
+    import tempfile
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename),
+                               prefix='.completion-')
+    with io.open(fd, 'wb') as fp:
+        marshal.dump(index, fp)
+    os.rename(tmp, filename)
+
+
+def spawn_refresh(profile, filename):
+    """
+    Start a detached process refreshing the index of `profile`, unless one
+    is already running.
+    """
+    marker = filename + '.lock'
+    try:
+        if time.time() - os.path.getmtime(marker) < REFRESH_TIMEOUT:
+            return
+    except OSError:
+        pass
+    args = [sys.executable, '-m', 'slipstream.cli.complete', profile]
+    try:
+        with open(marker, 'w') as fp:
+            fp.write('%d\n' % _spawn_detached(args))
+    except (IOError, OSError):
+        pass
+
+
+def _spawn_detached(args):
+    """
+    Start `args` in a new session, without the standard streams of the
+    shell, and return its pid.
+    """
+    if hasattr(os, 'posix_spawn'):
+        # Unlike fork(), doesn't make the exiting completion copy its
+        # memory pages, and doesn't import subprocess
+        streams = [(os.POSIX_SPAWN_OPEN, fd, os.devnull, os.O_RDWR, 0)
+                   for fd in range(3)]
+        pid = os.posix_spawn(args[0], args, os.environ,
+                             file_actions=streams, setsid=True)
+        # Before it competes with the completion for the CPU
+        lower_priority(pid)
+        return pid
+    if hasattr(os, 'fork'):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.setsid()
+                devnull = os.open(os.devnull, os.O_RDWR)
+                for fd in range(3):
+                    os.dup2(devnull, fd)
+                os.execv(args[0], args)
+            finally:
+                os._exit(1)
+        return pid
+    import subprocess
+    with open(os.devnull, 'r+b') as devnull:
+        return subprocess.Popen(args, stdin=devnull, stdout=devnull,
+                                stderr=devnull).pid
+
+
+def _split(words, index):
+    """
+    Return the command of the parsed `words` and the kind of value
+    expected at the end, according to the option and argument
+    descriptions of the `index`.
+    """
+    command = None
+    arguments = []
+    position = 0
+    options = index['options']
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word.startswith('-'):
+            if word in options and '=' not in word:
+                i += 1
+        elif command is None:
+            name = index['aliases'].get(word, word)
+            command = index['commands'].get(name)
+            if command is None:
+                return None, None
+            options = command['options']
+            arguments = command['arguments']
+        else:
+            position += 1
+        i += 1
+    if command is None:
+        return None, 'command'
+    if not arguments:
+        return command, None
+    if position >= len(arguments):
+        # A last argument taking any number of values
+        return command, arguments[-1] if command.get('variadic') else None
+    return command, arguments[position]
+
+
+def candidates(index, kind, incomplete):
+    if kind == 'command':
+        return sorted(n for n in list(index['commands']) +
+                      list(index['aliases']) if n.startswith(incomplete))
+    if kind == 'uuids':
+        return [u for u in index['uuids'] if u.startswith(incomplete)]
+    if kind == 'paths':
+        # One level at a time, projects keeping their trailing '/'
+        matches = set()
+        for path in index['paths']:
+            if path.startswith(incomplete) and path != incomplete:
+                end = path.find('/', len(incomplete))
+                matches.add(path[:end + 1] if end >= 0 else path)
+        return sorted(matches)
+    return []
+
+
+def complete(cwords, cword):
+    """
+    Return the completions of the word at position `cword` of the command
+    line `cwords`, or None if only click can complete it.
+    """
+    words = cwords.split()
+    incomplete = words[cword] if cword < len(words) else ''
+    if incomplete.startswith('-'):
+        return None
+    profile = _profile(words[1:cword])
+    filename = index_file(profile)
+    index = load(filename)
+    if index is None or index.get('version') != conf.COMPLETION_VERSION or \
+            time.time() - index.get('time', 0) > conf.COMPLETION_TTL:
+        spawn_refresh(profile, filename)
+    if index is None or index.get('version') != conf.COMPLETION_VERSION:
+        return None
+    command, kind = _split(words[1:cword], index)
+    return candidates(index, kind, incomplete)
+
+
+def main():
+    """
+    Print the completions to the shell and return True, or return False
+    to let click complete the command line.
+    """
+    try:
+        result = complete(os.environ.get('COMP_WORDS', ''),
+                          int(os.environ.get('COMP_CWORD', 0)))
+    except (KeyError, ValueError, TypeError):
+        result = None
+    if result is None:
+        return False
+    if result:
+        sys.stdout.write('\n'.join(result) + '\n')
+    return True
+
+
+def describe(cli, cfg):
+    """
+    Return the options taking a value and the kind of the arguments of
+    the commands of `cli`.
+    """
+    import click
+
+    def value_options(command):
+        return [opt for param in command.params
+                if isinstance(param, click.Option) and not param.is_flag
+                and not param.count for opt in param.opts]
+
+    def argument_kinds(command):
+        kinds = []
+        for param in command.params:
+            if not isinstance(param, click.Argument):
+                continue
+            if isinstance(param.type, click.types.UUIDParameterType) or \
+                    'UUID' in (param.metavar or ''):
+                kinds.append('uuids')
+            elif param.name == 'path':
+                kinds.append('paths')
+            else:
+                kinds.append(None)
+        return kinds
+
+    ctx = click.Context(cli, info_name='slipstream', obj=cfg)
+    commands = {}
+    for name in cli.list_commands(ctx):
+        command = cli.get_command(ctx, name)
+        arguments = [p for p in command.params
+                     if isinstance(p, click.Argument)]
+        commands[name] = {
+            'options': value_options(command),
+            'arguments': argument_kinds(command),
+            'variadic': bool(arguments) and arguments[-1].nargs == -1,
+        }
+    aliases = dict((alias, target) for alias, target in cfg.aliases.items()
+                   if target in commands)
+    return value_options(cli), commands, aliases
+
+
+def refresh(profile):
+    """
+    Write the completion index of `profile`, listing the module paths and
+    the active deployments if logged in.
+    """
+    from . import parallel
+    from .base import Config
+    from .commands import cli, iter_pages, make_api
+
+    filename = index_file(profile)
+    cfg = Config(profile=profile)
+    cfg.read_config()
+    options, commands, aliases = describe(cli, cfg)
+    index = {'version': conf.COMPLETION_VERSION, 'time': time.time(),
+             'endpoint': cfg.settings['endpoint'], 'options': options,
+             'commands': commands, 'aliases': aliases, 'paths': [],
+             'uuids': []}
+
+    if os.path.isfile(cfg.settings['cookie_file']):
+        api = make_api(cfg.settings)
+        paths = set()
+        for module in parallel.walk(
+                api.list_project_content, None,
+                lambda m: m.path if m.type == 'project' else None,
+                max_depth=conf.COMPLETION_MAX_DEPTH):
+            paths.add(module.path + '/' if module.type == 'project'
+                      else module.path)
+        paths.update(app.name for app in api.list_applications())
+        index['paths'] = sorted(paths)
+        index['uuids'] = [str(d.id) for d in
+                          iter_pages(api.list_deployments)]
+
+    save(filename, index)
+
+
+def lower_priority(pid=0):
+    """
+    Leave the CPU of process `pid`, by default the current one, to the
+    shell waiting for the completions.
+    """
+    try:
+        if hasattr(os, 'SCHED_IDLE'):
+            os.sched_setscheduler(pid, os.SCHED_IDLE, os.sched_param(0))
+        elif pid == 0 and hasattr(os, 'nice'):
+            os.nice(19)
+    except OSError:
+        pass
+
+
+if __name__ == '__main__':
+    lower_priority()
+    refresh(sys.argv[1])
+    # After a failure, the lock left behind delays the next refresh
+    try:
+        os.remove(index_file(sys.argv[1]) + '.lock')
+    except OSError:
+        pass
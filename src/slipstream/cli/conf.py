@@ -6,3 +6,42 @@ COOKIE_FILE_PATH = '~/.slipstream/'
 COOKIE_FILE_NAME_FORMAT = 'cookies-{profile}.txt'
 DEFAULT_CONFIG_FILE = os.path.expanduser('~/.slipstream/config')
 DEFAULT_COOKIE_FILE = os.path.expanduser(COOKIE_FILE_PATH + COOKIE_FILE_NAME_FORMAT.format(profile=DEFAULT_PROFILE))
+CACHE_FILE_NAME_FORMAT = 'cache-{profile}.json'
+INDEX_FILE_NAME_FORMAT = 'index-{profile}.sqlite'
+# The local index of deployments and virtual machines is refreshed from the
+# server by queries when older than this many seconds
+INDEX_MAX_AGE = 60
+USAGE_LOG_NAME_FORMAT = 'usage-{profile}.log'
+CACHE_TTL = {
+    'element': 600,
+    'appstore': 3600,
+}
+# HTTP connections kept open per endpoint, and request timeouts in seconds
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+# Retries of idempotent requests failing with a transient error, and the
+# base of their exponential backoff in seconds
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+MAX_RETRY_WAIT = 30
+# Bulk operations stop sending requests after this many transient errors
+# in a row, and try again after the cooldown in seconds
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30
+# Polls of a deployment failing in a row, once retried by the transport,
+# before `wait` gives up on it
+DEFAULT_WAIT_MAX_ERRORS = 5
+# Node instances added or removed per request by `scale`
+DEFAULT_SCALE_BATCH_SIZE = 50
+# Shell completion is served from an index of the profile, refreshed in
+# the background when older than the TTL in seconds, and has to answer
+# within the budget in milliseconds. Module paths are indexed down to
+# MAX_DEPTH levels of projects below the root one.
+COMPLETION_FILE_NAME_FORMAT = 'completion-{profile}.idx'
+COMPLETION_VERSION = 1
+COMPLETION_TTL = 300
+COMPLETION_MAX_DEPTH = 2
+COMPLETION_BUDGET_MS = 50
+# The parsed config file, saved next to it
+COMPILED_CONFIG_NAME_FORMAT = '.{name}.cache'
@@ -0,0 +1,258 @@
+from __future__ import absolute_import, unicode_literals
+
+import io
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+
+import six
+from six.moves import socketserver
+
+from . import conf
+
+SOCKET_FILE = os.path.expanduser(conf.COOKIE_FILE_PATH + 'daemon.sock')
+
+# Commands needing the terminal of the caller, or running until
+# interrupted, are always run in-process. The daemon also sends back the
+# others it can't run, see `RunLocally`.
+LOCAL_COMMANDS = ('daemon', 'login', 'shell', 'wait', 'scale')
+
+_FRAME_HEADER = struct.Struct(str('!cI'))
+STDOUT = b'O'
+STDERR = b'E'
+EXIT = b'X'
+LOCAL = b'L'
+
+
+class RunLocally(Exception):
+    """
+    Raised before a command forwarded to the daemon starts when it must
+    run in the process of the client instead.
+    """
+
+
+def _send_frame(sock, kind, payload=b''):
+    sock.sendall(_FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def _should_forward(argv):
+    if '_SLIPSTREAM_COMPLETE' in os.environ or '-' in argv:
+        return False
+    return not any(arg in LOCAL_COMMANDS for arg in argv)
+
+
+def _environment():
+    return dict((k, v) for k, v in os.environ.items()
+                if k.startswith('SLIPSTREAM_'))
+
+
+def forward(argv, socket_file=SOCKET_FILE):
+    """
+    Run the command `argv` in the daemon, copying its output to the
+    standard streams, and return its exit code.
+
+    Return None when the command must be run in-process, for instance when
+    no daemon is running.
+    """
+    if not _should_forward(argv) or not os.path.exists(socket_file):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_file)
+    except socket.error:
+        sock.close()
+        return None
+
+    request = {'argv': argv, 'cwd': os.getcwd(), 'env': _environment()}
+    try:
+        sock.sendall(json.dumps(request).encode('utf8') + b'\n')
+        while True:
+            kind, size = _FRAME_HEADER.unpack(
+                _recv_exactly(sock, _FRAME_HEADER.size))
+            payload = _recv_exactly(sock, size)
+            if kind == EXIT:
+                return int(payload)
+            if kind == LOCAL:
+                return None
+            stream = sys.stdout if kind == STDOUT else sys.stderr
+            getattr(stream, 'buffer', stream).write(payload)
+            stream.flush()
+    except (EOFError, socket.error):
+        sys.stderr.write("Lost connection to the SlipStream daemon.\n")
+        return 1
+    finally:
+        sock.close()
+
+
+def send_command(command, socket_file=SOCKET_FILE):
+    """
+    Send a control `command` to the daemon and return True if it answered.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_file)
+        sock.sendall(json.dumps({'command': command}).encode('utf8') + b'\n')
+        kind, size = _FRAME_HEADER.unpack(
+            _recv_exactly(sock, _FRAME_HEADER.size))
+        _recv_exactly(sock, size)
+        return kind == EXIT
+    except (EOFError, socket.error):
+        return False
+    finally:
+        sock.close()
+
+
+class _FrameWriter(io.TextIOBase):
+    """A text stream sending everything written to it as frames."""
+
+    encoding = 'utf-8'
+    errors = 'strict'
+
+    def __init__(self, sock, kind):
+        super(_FrameWriter, self).__init__()
+        self.sock = sock
+        self.kind = kind
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            # Only Python 2 writes bytes to text streams; refusing them on
+            # Python 3 makes click treat this stream as a text one.
+            if not six.PY2:
+                raise TypeError("write() argument must be str, not bytes")
+        else:
+            data = data.encode(self.encoding)
+        if data:
+            _send_frame(self.sock, self.kind, data)
+        return len(data)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf8'))
+        command = request.get('command')
+        if command == 'stop':
+            _send_frame(self.request, EXIT, b'0')
+            threading.Thread(target=self.server.shutdown).start()
+        elif command == 'status':
+            _send_frame(self.request, EXIT, b'0')
+        else:
+            code = self.server.run(request)
+            if code is None:
+                _send_frame(self.request, LOCAL)
+            else:
+                _send_frame(self.request, EXIT, str(code).encode('ascii'))
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Run the commands sent by `forward` one at a time, keeping the Api
+    objects and their connections alive between commands.
+
+    Since a command blocks the next ones, those running until interrupted
+    or prompting for credentials are sent back to the client. A command is
+    aborted by the first output it writes once its client is gone.
+    """
+
+    def __init__(self, socket_file=SOCKET_FILE):
+        from . import commands
+        self.commands = commands
+        # Let the commands reuse Api objects between requests
+        commands.SESSIONS = {}
+
+        self.socket_file = socket_file
+        socket_dir = os.path.dirname(socket_file)
+        if not os.path.isdir(socket_dir):
+            os.mkdir(socket_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        if os.path.exists(socket_file):
+            os.remove(socket_file)
+        umask = os.umask(stat.S_IRWXG | stat.S_IRWXO)
+        try:
+            socketserver.UnixStreamServer.__init__(self, socket_file,
+                                                   _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def run(self, request):
+        """
+        Run the command of `request` and return its exit code, or None if
+        the client must run it.
+        """
+        saved_streams = sys.stdout, sys.stderr
+        saved_cwd = os.getcwd()
+        saved_env = _environment()
+        sys.stdout = _FrameWriter(self.request_socket, STDOUT)
+        sys.stderr = _FrameWriter(self.request_socket, STDERR)
+        try:
+            # The Config is a singleton on Python 2, forget previous options
+            self.commands.Config().reset_config()
+            os.chdir(request.get('cwd', saved_cwd))
+            for key in saved_env:
+                del os.environ[key]
+            os.environ.update(request.get('env', {}))
+            try:
+                self.commands.cli.main(args=request['argv'],
+                                       prog_name='slipstream',
+                                       auto_envvar_prefix='SLIPSTREAM')
+            except RunLocally:
+                return None
+            except SystemExit as e:
+                if e.code is None:
+                    return 0
+                if isinstance(e.code, int):
+                    return e.code
+                sys.stderr.write('%s\n' % e.code)
+                return 1
+            except Exception:
+                self.commands._excepthook(*sys.exc_info())
+                return 1
+            return 0
+        finally:
+            sys.stdout, sys.stderr = saved_streams
+            os.chdir(saved_cwd)
+            for key in _environment():
+                del os.environ[key]
+            os.environ.update(saved_env)
+
+    def finish_request(self, request, client_address):
+        self.request_socket = request
+        socketserver.UnixStreamServer.finish_request(self, request,
+                                                     client_address)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_file):
+            os.remove(self.socket_file)
+
+
+def daemonize():
+    """Detach the current process from its terminal (double fork)."""
+    if os.fork() > 0:
+        os._exit(0)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
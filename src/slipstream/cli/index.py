@@ -0,0 +1,348 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import os
+import re
+import sqlite3
+import stat
+import time
+import uuid
+
+import six
+
+from .types import Duration
+
+# Bumped when the tables change, the index is then rebuilt
+SCHEMA_VERSION = 1
+
+TABLES = collections.OrderedDict([
+    ('deployments', collections.OrderedDict([
+        ('id', 'TEXT PRIMARY KEY'),
+        ('module', 'TEXT'),
+        ('status', 'TEXT'),
+        ('started_at', 'TEXT'),
+        ('last_state_change', 'TEXT'),
+        ('clouds', 'TEXT'),
+        ('username', 'TEXT'),
+        ('abort', 'TEXT'),
+        ('service_url', 'TEXT'),
+        ('scalable', 'TEXT'),
+    ])),
+    ('virtualmachines', collections.OrderedDict([
+        ('id', 'TEXT'),
+        ('cloud', 'TEXT'),
+        ('status', 'TEXT'),
+        ('deployment_id', 'TEXT'),
+        ('deployment_owner', 'TEXT'),
+        ('node_name', 'TEXT'),
+        ('node_instance_id', 'TEXT'),
+        ('ip', 'TEXT'),
+        ('cpu', 'NUMERIC'),
+        ('ram', 'NUMERIC'),
+        ('disk', 'NUMERIC'),
+        ('instance_type', 'TEXT'),
+        ('is_usable', 'TEXT'),
+    ])),
+])
+
+KEYS = {
+    'deployments': ('id',),
+    'virtualmachines': ('cloud', 'id'),
+}
+
+INDEXES = {
+    'deployments': [('status',), ('started_at',), ('module',)],
+    'virtualmachines': [('deployment_id',), ('cloud', 'status'), ('status',)],
+}
+
+ROW_TYPES = {
+    'deployments': 'Deployment',
+    'virtualmachines': 'VirtualMachine',
+}
+
+# Virtual machines can be queried on the columns of their deployment,
+# prefixed with 'deployment_'
+JOIN_PREFIX = 'deployment_'
+
+TIME_COLUMNS = ('started_at', 'last_state_change')
+
+OPERATORS = collections.OrderedDict([
+    ('!=', '!='), ('<=', '<='), ('>=', '>='), ('=', '='), ('<', '<'),
+    ('>', '>'), ('~', 'GLOB'),
+])
+
+_filter_re = re.compile(r'^(\w+)\s*(%s)\s*(.*)$'
+                        % '|'.join(re.escape(op) for op in OPERATORS))
+_time_re = re.compile(r'^\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d')
+
+Filter = collections.namedtuple('Filter', ['column', 'operator', 'value'])
+
+
+def parse_filter(expression):
+    """
+    Convert 'COLUMN<OPERATOR>VALUE' to a `Filter`.
+
+    Raise ValueError if expression is badly formatted.
+    """
+    match = _filter_re.match(expression.strip())
+    if match is None:
+        raise ValueError("Invalid filter '%s'. Filters look like "
+                         "'status=running' or 'started_at<3d'." % expression)
+    return Filter(*match.groups())
+
+
+def _quote(name):
+    return '"%s"' % name
+
+
+def _to_db(column, value):
+    if value is None:
+        return None
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return ','.join(v for v in value if v)
+    if column in TIME_COLUMNS and _time_re.match(value):
+        # '2017-01-25 12:34:56.789 UTC' sorts as text once normalized
+        return value[:10] + ' ' + value[11:19]
+    return value
+
+
+def _to_value(column, value, now):
+    """
+    Convert a filter value to compare with `column`: durations like '3d'
+    stand for that long before `now` in time columns, and numbers are
+    compared as numbers.
+    """
+    if column.replace(JOIN_PREFIX, '', 1) in TIME_COLUMNS:
+        if value[-1:] in Duration.UNITS:
+            try:
+                return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(
+                    now - Duration.parse(value)))
+            except ValueError:
+                pass
+        return _to_db(column.replace(JOIN_PREFIX, '', 1),
+                      value.replace('T', ' ', 1))
+    for number in (int, float):
+        try:
+            return number(value)
+        except ValueError:
+            pass
+    return value
+
+
+class Index(object):
+    """
+    A SQLite copy of the deployments and virtual machines of an endpoint,
+    to answer queries without listing them from the server each time.
+
+    Each table is refreshed from a complete listing, only the new and
+    changed rows being written. The index is emptied when the endpoint
+    changes.
+    """
+
+    def __init__(self, filename, endpoint):
+        self.filename = filename
+        self.endpoint = endpoint
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = self._open()
+        return self._db
+
+    def _open(self):
+        index_dir = os.path.dirname(self.filename)
+        if not os.path.isdir(index_dir):
+            os.mkdir(index_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        if not os.path.exists(self.filename):
+            os.close(os.open(self.filename, os.O_CREAT | os.O_WRONLY,
+                             stat.S_IRUSR | stat.S_IWUSR))
+        db = sqlite3.connect(self.filename, timeout=30)
+        # Readers aren't blocked while another process refreshes the index
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        with db:
+            if db.execute('PRAGMA user_version').fetchone()[0] != \
+                    SCHEMA_VERSION:
+                for table in list(TABLES) + ['refreshes']:
+                    db.execute('DROP TABLE IF EXISTS %s' % table)
+                self._create(db)
+            endpoint = db.execute(
+                "SELECT value FROM meta WHERE key = 'endpoint'").fetchone()
+            if endpoint is None or endpoint[0] != self.endpoint:
+                for table in list(TABLES) + ['refreshes']:
+                    db.execute('DELETE FROM %s' % table)
+                db.execute("INSERT OR REPLACE INTO meta VALUES "
+                           "('endpoint', ?)", (self.endpoint,))
+        return db
+
+    @staticmethod
+    def _create(db):
+        db.execute('CREATE TABLE IF NOT EXISTS meta '
+                   '(key TEXT PRIMARY KEY, value TEXT)')
+        db.execute('CREATE TABLE refreshes (name TEXT PRIMARY KEY, '
+                   'time REAL)')
+        for table, columns in TABLES.items():
+            definitions = ['%s %s' % (_quote(c), t)
+                           for c, t in columns.items()]
+            if len(KEYS[table]) > 1:
+                definitions.append('PRIMARY KEY (%s)' % ', '.join(
+                    _quote(c) for c in KEYS[table]))
+            db.execute('CREATE TABLE %s (%s)' % (table,
+                                                 ', '.join(definitions)))
+            for index in INDEXES[table]:
+                db.execute('CREATE INDEX %s_%s ON %s (%s)' % (
+                    table, '_'.join(index), table,
+                    ', '.join(_quote(c) for c in index)))
+        db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def clear(self):
+        self.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.isfile(self.filename + suffix):
+                os.remove(self.filename + suffix)
+
+    def age(self, table):
+        """
+        Return the seconds since `table` was refreshed, or None if never.
+        """
+        row = self.db.execute('SELECT time FROM refreshes WHERE name = ?',
+                              (table,)).fetchone()
+        return time.time() - row[0] if row is not None else None
+
+    def refresh(self, table, items):
+        """
+        Synchronize `table` with `items`, every deployment or virtual
+        machine currently listed by the server. Only new and changed rows
+        are written and rows no longer listed are removed.
+
+        Return the number of (added, updated, removed) rows.
+        """
+        columns = list(TABLES[table])
+        key = [columns.index(c) for c in KEYS[table]]
+        db = self.db
+        existing = {}
+        for row in db.execute('SELECT %s FROM %s' % (
+                ', '.join(_quote(c) for c in columns), table)):
+            existing[tuple(row[i] for i in key)] = tuple(row)
+
+        changed = []
+        added = 0
+        seen = set()
+        for item in items:
+            values = tuple(_to_db(c, getattr(item, c)) for c in columns)
+            row_key = tuple(values[i] for i in key)
+            seen.add(row_key)
+            old = existing.get(row_key)
+            if old is None:
+                added += 1
+            # NUMERIC columns are read back as numbers
+            elif [six.text_type(v) if v is not None else None for v in old] \
+                    == [six.text_type(v) if v is not None else None
+                        for v in values]:
+                continue
+            changed.append(values)
+        removed = [k for k in existing if k not in seen]
+
+        with db:
+            db.executemany('INSERT OR REPLACE INTO %s VALUES (%s)' % (
+                table, ', '.join('?' * len(columns))), changed)
+            db.executemany('DELETE FROM %s WHERE %s' % (
+                table, ' AND '.join('%s = ?' % _quote(c)
+                                    for c in KEYS[table])), removed)
+            db.execute('INSERT OR REPLACE INTO refreshes VALUES (?, ?)',
+                       (table, time.time()))
+        return added, len(changed) - added, len(removed)
+
+    @staticmethod
+    def columns(table):
+        """
+        Return the names of the columns `table` can be queried on.
+        """
+        names = list(TABLES[table])
+        if table == 'virtualmachines':
+            names += [JOIN_PREFIX + c for c in TABLES['deployments']
+                      if JOIN_PREFIX + c not in names]
+        return names
+
+    def tables(self, table, names):
+        """
+        Return the tables read by a query of `table` on the columns `names`.
+        """
+        own = TABLES[table]
+        if any(n not in own and n in self.columns(table) for n in names):
+            return ['deployments', table]
+        return [table]
+
+    def _column(self, table, name):
+        if name not in self.columns(table):
+            raise ValueError("Unknown column '%s'. Available columns are: %s."
+                             % (name, ', '.join(self.columns(table))))
+        if name in TABLES[table]:
+            return 't.%s' % _quote(name)
+        return 'd.%s' % _quote(name[len(JOIN_PREFIX):])
+
+    def query(self, table, filters=(), sort=(), group=(), limit=None,
+              columns=None):
+        """
+        Yield the rows of `table` matching all the `filters` as namedtuples,
+        ordered by the `sort` columns, descending for those prefixed with
+        '-'.
+
+        With `group`, yield the distinct values of the `group` columns with
+        the number of matching rows instead. Rows only have the given
+        `columns`, by default those of `table` and the other columns used
+        by the query.
+        """
+        now = time.time()
+        names = [f.column for f in filters] + \
+            [s.lstrip('-') for s in sort] + list(group)
+        if group:
+            columns = list(group) + ['count']
+        elif not columns:
+            columns = list(TABLES[table]) + [
+                n for n in collections.OrderedDict.fromkeys(names)
+                if n not in TABLES[table]]
+
+        def expression(name):
+            if group and name == 'count':
+                return 'count'
+            return self._column(table, name)
+
+        select = ', '.join('%s AS %s' % (expression(c), _quote(c))
+                           for c in columns if c != 'count' or not group)
+        if group:
+            select += ', COUNT(*) AS count'
+        sql = 'SELECT %s FROM %s AS t' % (select, table)
+        if table == 'virtualmachines' and \
+                self.tables(table, names + list(columns)) != [table]:
+            sql += ' LEFT JOIN deployments AS d ON d.id = t.deployment_id'
+        params = []
+        if filters:
+            conditions = []
+            for f in filters:
+                conditions.append('%s %s ?' % (self._column(table, f.column),
+                                               OPERATORS[f.operator]))
+                params.append(_to_value(f.column, f.value, now))
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if group:
+            sql += ' GROUP BY ' + ', '.join(self._column(table, g)
+                                            for g in group)
+        if sort:
+            sql += ' ORDER BY ' + ', '.join(
+                expression(s.lstrip('-')) + (' DESC' if s.startswith('-')
+                                             else '') for s in sort)
+        if limit is not None:
+            sql += ' LIMIT %d' % limit
+
+        row_type = collections.namedtuple(
+            'Group' if group else ROW_TYPES[table], columns)
+        for row in self.db.execute(sql, params):
+            yield row_type._make(row)
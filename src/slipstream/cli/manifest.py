@@ -0,0 +1,99 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import csv
+import json
+import os
+
+import six
+
+Row = collections.namedtuple('Row', ['line', 'path', 'clouds', 'params'])
+
+
+class ManifestError(Exception):
+    pass
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [six.text_type(v) for v in value]
+    return six.text_type(value).split()
+
+
+def _as_params(value, line):
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return ['%s=%s' % (k, v) for k, v in sorted(six.iteritems(value))]
+    if isinstance(value, (list, tuple)):
+        return [six.text_type(v) for v in value]
+    # Values may contain spaces, so a string can't be split reliably
+    raise ManifestError("The param of entry #%d must be a mapping or a list."
+                        % line)
+
+
+def _read_records(fp, fmt):
+    if fmt == 'csv':
+        for record in csv.DictReader(fp):
+            params = ['%s=%s' % (k, v) for k, v in six.iteritems(record)
+                      if k not in ('path', 'cloud') and v]
+            yield dict(path=record.get('path'), cloud=record.get('cloud'),
+                       param=params)
+        return
+
+    if fmt == 'yaml':
+        try:
+            import yaml
+        except ImportError:
+            raise ManifestError("PyYAML is required to read YAML manifests. "
+                                "Install it with `pip install "
+                                "slipstream-cli[yaml]`.")
+        # An empty YAML document is None
+        records = yaml.safe_load(fp) or []
+    else:
+        records = json.load(fp)
+
+    if not isinstance(records, list):
+        raise ManifestError("The manifest must contain a list of deployments.")
+    for record in records:
+        if not isinstance(record, dict):
+            raise ManifestError("Invalid deployment entry: %r" % (record,))
+        yield record
+
+
+def guess_format(filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in ('.yml', '.yaml'):
+        return 'yaml'
+    if ext == '.csv':
+        return 'csv'
+    return 'json'
+
+
+def read_manifest(fp, fmt=None):
+    """
+    Read the deployments described in the manifest file `fp`.
+
+    The manifest is either a JSON/YAML list of objects with a `path`, a
+    `cloud` and a `param` key, the latter being a mapping or a list of
+    'key=value' strings, or a CSV file with `path` and `cloud` columns
+    where every other column is a parameter. Clouds and parameters use the
+    same `[<node>:]...` notation as the `deploy` options.
+    """
+    if fmt is None:
+        fmt = guess_format(getattr(fp, 'name', None))
+
+    rows = []
+    for line, record in enumerate(_read_records(fp, fmt), 1):
+        path = record.get('path')
+        if not path:
+            raise ManifestError("Entry #%d has no path." % line)
+        rows.append(Row(line=line,
+                        path=six.text_type(path),
+                        clouds=_as_list(record.get('cloud')),
+                        params=_as_params(record.get('param'), line)))
+    if not rows:
+        raise ManifestError("The manifest doesn't describe any deployment.")
+    return rows
@@ -0,0 +1,304 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import uuid
+
+import six
+
+FORMATS = ['table', 'json', 'jsonl', 'csv', 'tsv']
+STREAMING_FORMATS = ['json', 'jsonl', 'csv', 'tsv']
+
+# Encoded rows are written to the stream by chunks of about this size
+BUFFER_SIZE = 64 * 1024
+
+# Tables are sized from this many rows, the cells of the following rows
+# being truncated to fit
+TABLE_SAMPLE_SIZE = 1000
+MIN_COLUMN_WIDTH = 3
+ELLIPSIS = '...'
+
+
+class UnknownColumnError(ValueError):
+    pass
+
+
+def column_indexes(fields, columns):
+    """
+    Return the positions of `columns` in the row `fields`.
+    """
+    unknown = [c for c in columns if c not in fields]
+    if unknown:
+        raise UnknownColumnError(
+            "Unknown column '%s'. Available columns are: %s."
+            % (unknown[0], ', '.join(fields)))
+    return [fields.index(c) for c in columns]
+
+
+def project(rows, columns):
+    """
+    Yield the namedtuple `rows` with only the given `columns`.
+    """
+    if not columns:
+        for row in rows:
+            yield row
+        return
+    projections = {}
+    for row in rows:
+        projection = projections.get(type(row))
+        if projection is None:
+            projection = (collections.namedtuple(type(row).__name__, columns),
+                          column_indexes(row._fields, columns))
+            projections[type(row)] = projection
+        row_type, indexes = projection
+        yield row_type._make(row[i] for i in indexes)
+
+
+def _to_json(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ','.join(_to_text(v) for v in value)
+    return six.text_type(value)
+
+
+class _CsvWriter(object):
+
+    def __init__(self, stream, delimiter):
+        self.writer = csv.writer(stream, delimiter=str(delimiter),
+                                 lineterminator=str('\n'))
+
+    def writerow(self, row):
+        cells = [_to_text(v) for v in row]
+        if six.PY2:
+            cells = [c.encode('utf8') for c in cells]
+        self.writer.writerow(cells)
+
+
+class RowWriter(object):
+    """
+    Write namedtuple rows one at a time in one of the `STREAMING_FORMATS`.
+
+    Rows are encoded into a buffer written to the stream by chunks of
+    `BUFFER_SIZE`, or after every row with `flush`. Only the given
+    `columns` are encoded. `close` must be called once all rows are
+    written.
+    """
+
+    def __init__(self, fmt, stream=None, flush=False, columns=None):
+        if fmt not in STREAMING_FORMATS:
+            raise ValueError("Unsupported streaming format '%s'." % fmt)
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self.flush = flush
+        self.columns = columns or None
+        self.count = 0
+        self._fields = None
+        self._indexes = None
+        # csv and json produce bytes on Python 2 and text on Python 3
+        self._buffer = io.BytesIO() if six.PY2 else io.StringIO()
+        if fmt in ('csv', 'tsv'):
+            self._csv = _CsvWriter(self._buffer, ',' if fmt == 'csv' else '\t')
+
+    def _write(self, text):
+        if six.PY2 and isinstance(text, six.text_type):
+            text = text.encode('utf8')
+        self._buffer.write(text)
+
+    def _drain(self):
+        data = self._buffer.getvalue()
+        if data:
+            self.stream.write(data)
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        self.stream.flush()
+
+    def _encode_json(self, row):
+        if self._indexes is None:
+            values = row
+        else:
+            values = [row[i] for i in self._indexes]
+        data = collections.OrderedDict(
+            (k, _to_json(v)) for k, v in zip(self._fields, values))
+        return json.dumps(data, default=six.text_type)
+
+    def write(self, row):
+        if self._fields is None:
+            if self.columns is not None:
+                self._indexes = column_indexes(row._fields, self.columns)
+                self._fields = self.columns
+            else:
+                self._fields = row._fields
+            if self.fmt in ('csv', 'tsv'):
+                self._csv.writerow(self._fields)
+
+        if self.fmt == 'jsonl':
+            self._write(self._encode_json(row) + '\n')
+        elif self.fmt == 'json':
+            self._write(('[\n' if self.count == 0 else ',\n') +
+                        self._encode_json(row))
+        elif self._indexes is None:
+            self._csv.writerow(row)
+        else:
+            self._csv.writerow([row[i] for i in self._indexes])
+        self.count += 1
+
+        if self.flush or self._buffer.tell() >= BUFFER_SIZE:
+            self._drain()
+
+    def close(self):
+        if self.fmt == 'json':
+            self._write('\n]\n' if self.count else '[]\n')
+        self._drain()
+
+
+def write_rows(rows, fmt, stream=None, flush=False, columns=None):
+    """
+    Write the namedtuple `rows` in one of the `STREAMING_FORMATS` as they
+    are produced by the iterable, without keeping them in memory.
+
+    Return the number of rows written.
+    """
+    writer = RowWriter(fmt, stream, flush, columns)
+    try:
+        for row in rows:
+            writer.write(row)
+    except KeyboardInterrupt:
+        # The output of an interrupted command like `deployments --watch`
+        # is still complete
+        writer.close()
+        raise
+    except Exception:
+        writer._drain()
+        raise
+    writer.close()
+    return writer.count
+
+
+def terminal_width(stream=None):
+    """
+    Return the width of the terminal `stream` writes to, or None if it
+    isn't a terminal.
+    """
+    stream = stream or sys.stdout
+    if not getattr(stream, 'isatty', lambda: False)():
+        return None
+    try:
+        from shutil import get_terminal_size
+    except ImportError:
+        return int(os.environ.get('COLUMNS', 80))
+    return get_terminal_size().columns
+
+
+def fit_widths(widths, available):
+    """
+    Shrink the widest of the column `widths` until they fit in `available`
+    characters, sharing the space equally between the shrunk columns.
+    """
+    if sum(widths) <= available:
+        return list(widths)
+    fitted = list(widths)
+    remaining = available
+    order = sorted(range(len(widths)), key=lambda i: widths[i])
+    for n, i in enumerate(order):
+        share = remaining // (len(order) - n)
+        fitted[i] = max(min(widths[i], share), MIN_COLUMN_WIDTH)
+        remaining -= fitted[i]
+    return fitted
+
+
+def _cell(value):
+    if not isinstance(value, six.text_type):
+        value = _to_text(value)
+    if '\n' in value or '\t' in value:
+        value = ' '.join(value.split())
+    return value
+
+
+def _truncate(text, width):
+    if len(text) <= width:
+        return text
+    if width <= len(ELLIPSIS):
+        return text[:width]
+    return text[:width - len(ELLIPSIS)] + ELLIPSIS
+
+
+def write_table(rows, stream=None, width=None, sample=TABLE_SAMPLE_SIZE):
+    """
+    Write the namedtuple `rows` as a left aligned ASCII table.
+
+    Column widths are computed in one pass over the first `sample` rows
+    (all of them if `sample` is None), longer cells of later rows being
+    truncated. With `width`, the widest columns are truncated so that the
+    table fits in `width` characters. Lines are written to the stream by
+    chunks of `BUFFER_SIZE`.
+
+    Return the number of rows written.
+    """
+    stream = stream or sys.stdout
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return 0
+    head = [list(map(_cell, row))
+            for row in itertools.chain([first], itertools.islice(
+                rows, sample - 1 if sample is not None else None))]
+
+    widths = [max(len(field), max(map(len, column)))
+              for field, column in zip(first._fields, zip(*head))]
+    fitted = widths
+    if width is not None:
+        # Each column takes 3 more characters for the borders, plus 1
+        fitted = fit_widths(widths, width - 3 * len(widths) - 1)
+
+    border = '+' + '+'.join('-' * (w + 2) for w in fitted) + '+\n'
+    line = '| ' + ' | '.join('{%d:<%d}' % (i, w)
+                             for i, w in enumerate(fitted)) + ' |\n'
+
+    def format_row(cells):
+        for c, w in zip(cells, fitted):
+            if len(c) > w:
+                cells = [_truncate(c, w) for c, w in zip(cells, fitted)]
+                break
+        return line.format(*cells)
+
+    # The cells of the sample only need to be truncated to fit the width
+    format_head = format_row if fitted != widths else (
+        lambda cells: line.format(*cells))
+
+    def write(text):
+        if six.PY2:
+            text = text.encode('utf8')
+        stream.write(text)
+
+    chunk = [border, format_row(list(first._fields)), border]
+    size = 0
+    count = 0
+    for text in itertools.chain(map(format_head, head),
+                                (format_row(list(map(_cell, row)))
+                                 for row in rows)):
+        chunk.append(text)
+        size += len(text)
+        count += 1
+        if size >= BUFFER_SIZE:
+            write(''.join(chunk))
+            chunk = []
+            size = 0
+    chunk.append(border)
+    write(''.join(chunk))
+    stream.flush()
+    return count
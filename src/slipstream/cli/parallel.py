@@ -0,0 +1,181 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import threading
+import time
+
+from six.moves import queue
+
+DEFAULT_WORKERS = 10
+
+Outcome = collections.namedtuple('Outcome', ['item', 'result', 'error'])
+
+
+class RateLimiter(object):
+    """
+    Space out calls so that at most `rate` of them start every second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling a failing service: once `threshold` calls in a row failed
+    with an error for which `is_failure(error)` is true, further calls are
+    refused with `CircuitOpenError` for `cooldown` seconds. A single call
+    is then let through to probe the service, closing the circuit again
+    if it succeeds.
+    """
+
+    def __init__(self, threshold, cooldown, is_failure=lambda e: True):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.is_failure = is_failure
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.time() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def _record(self, error):
+        with self._lock:
+            self._probing = False
+            if error is None or not self.is_failure(error):
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self._opened_at = time.time()
+
+    def wrap(self, func):
+        """Return `func` guarded by this circuit breaker."""
+        def call(item):
+            if not self._allow():
+                raise CircuitOpenError(
+                    "Not sent, the last %d requests failed." % self.failures)
+            try:
+                result = func(item)
+            except Exception as e:
+                self._record(e)
+                raise
+            self._record(None)
+            return result
+        return call
+
+
+def imap(func, items, workers=DEFAULT_WORKERS, rate=None, key=None,
+         breaker=None):
+    """
+    Apply `func` to every item with a bounded pool of threads and yield an
+    `Outcome` for each of them, in completion order.
+
+    Exceptions raised by `func` are caught and reported in the outcome so
+    that one failing item doesn't abort the others. When `rate` is given,
+    at most `rate` calls are started per second. With a `CircuitBreaker`,
+    the remaining items fail fast with `CircuitOpenError` once it opens.
+
+    With `key`, the items are grouped by `key(item)` (e.g. the host of
+    their endpoint) and `workers` limits the concurrent calls of each
+    group, so that a slow group doesn't hold back the others.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    from multiprocessing.pool import ThreadPool
+    if breaker is not None:
+        func = breaker.wrap(func)
+    limiter = RateLimiter(rate) if rate else None
+
+    def call(item):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return Outcome(item, func(item), None)
+        except Exception as e:
+            return Outcome(item, None, e)
+
+    groups = collections.OrderedDict()
+    for item in items:
+        groups.setdefault(key(item) if key is not None else None,
+                          []).append(item)
+    results = queue.Queue()
+    pools = []
+    try:
+        for group in groups.values():
+            pool = ThreadPool(max(1, min(workers, len(group))))
+            pools.append(pool)
+            for item in group:
+                pool.apply_async(call, (item,), callback=results.put)
+        for _ in items:
+            yield results.get()
+    finally:
+        for pool in pools:
+            pool.terminate()
+
+
+def walk(list_children, root, get_branch, workers=DEFAULT_WORKERS,
+         max_depth=None):
+    """
+    Walk a tree breadth-first from `root` and yield its items as the
+    branches are listed by a bounded pool of threads.
+
+    `list_children(node)` returns the items of a branch and `get_branch(item)`
+    returns the node to list in turn for an item, or None for leaves. At
+    most `max_depth` levels of branches are listed below `root`, none if
+    it's 0. Items are yielded as soon as their branch has been listed, so
+    the order between branches isn't deterministic.
+    """
+    from multiprocessing.pool import ThreadPool
+    results = queue.Queue()
+    pool = ThreadPool(workers)
+
+    def call(node, depth):
+        try:
+            results.put((depth, list(list_children(node)), None))
+        except Exception as e:
+            results.put((depth, None, e))
+
+    pool.apply_async(call, (root, 0))
+    pending = 1
+    try:
+        while pending:
+            depth, items, error = results.get()
+            pending -= 1
+            if error is not None:
+                raise error
+            for item in items:
+                yield item
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                branch = get_branch(item)
+                if branch is not None:
+                    pool.apply_async(call, (branch, depth + 1))
+                    pending += 1
+    finally:
+        pool.terminate()
@@ -0,0 +1,144 @@
+from __future__ import absolute_import, unicode_literals
+
+import os
+import shlex
+import traceback
+
+import six
+from six.moves import input
+
+import click
+
+from . import conf
+from .log import logger
+
+try:
+    import readline
+except ImportError:
+    readline = None
+
+HISTORY_FILE = os.path.expanduser(conf.COOKIE_FILE_PATH + 'history')
+
+
+class Shell(object):
+    """
+    Read and run commands of the `group` in a loop, reusing the same `Api`
+    object (and thus the same HTTP connections) for every command.
+    """
+
+    prompt = 'slipstream> '
+    builtins = ['exit', 'help', 'quit']
+
+    def __init__(self, group, cfg, api, connect, format_error=str,
+                 meta=None):
+        self.group = group
+        self.cfg = cfg
+        self.api = api
+        self.connect = connect
+        self.format_error = format_error
+        self.meta = dict(meta or {})
+
+    def _context(self):
+        # The Config must be reachable by commands using `pass_config` and
+        # the Api by commands using `pass_obj`.
+        root = click.Context(self.group, info_name='slipstream', obj=self.cfg)
+        # Global options, like --format, given when starting the shell
+        root.meta.update(self.meta)
+        return click.Context(self.group, info_name='slipstream', parent=root,
+                             obj=self.api)
+
+    def command_names(self):
+        names = set(self.group.list_commands(self._context()))
+        names.update(self.cfg.aliases)
+        names.update(self.builtins)
+        names.discard('shell')
+        return sorted(names)
+
+    def complete(self, text, state):
+        words = shlex.split(readline.get_line_buffer()[:readline.get_begidx()])
+        if not words:
+            candidates = self.command_names()
+        else:
+            ctx = self._context()
+            cmd = self.group.get_command(ctx, words[0])
+            if cmd is None:
+                return None
+            if isinstance(cmd, click.MultiCommand) and len(words) == 1:
+                candidates = cmd.list_commands(ctx)
+            else:
+                candidates = [opt for param in cmd.params
+                              for opt in getattr(param, 'opts', [])
+                              if opt.startswith('-')]
+        matches = [c + ' ' for c in candidates if c.startswith(text)]
+        return matches[state] if state < len(matches) else None
+
+    def run_line(self, line):
+        args = shlex.split(line)
+        if not args:
+            return
+        if args[0] in ('exit', 'quit'):
+            raise EOFError
+        ctx = self._context()
+        if args[0] == 'help':
+            click.echo(self.group.get_help(ctx))
+            return
+        if args[0] == 'shell':
+            raise click.UsageError("Already in a shell.")
+
+        cmd_name, cmd, cmd_args = self.group.resolve_command(ctx, args)
+        with cmd.make_context(cmd_name, cmd_args, parent=ctx) as sub_ctx:
+            cmd.invoke(sub_ctx)
+
+        # Credentials changed on disk, start a new session with them
+        if cmd.name in ('login', 'logout'):
+            self.api = self.connect()
+
+    def _load_history(self):
+        if readline is None:
+            return
+        readline.set_completer(self.complete)
+        readline.set_completer_delims(' \t\n')
+        readline.parse_and_bind('tab: complete')
+        try:
+            readline.read_history_file(HISTORY_FILE)
+        except (IOError, OSError):
+            pass
+
+    def _save_history(self):
+        if readline is None:
+            return
+        try:
+            readline.write_history_file(HISTORY_FILE)
+        except (IOError, OSError):
+            pass
+
+    def run(self):
+        self._load_history()
+        try:
+            while True:
+                try:
+                    line = input(self.prompt)
+                except KeyboardInterrupt:
+                    click.echo()
+                    continue
+                try:
+                    self.run_line(line)
+                except EOFError:
+                    raise
+                except click.ClickException as e:
+                    e.show()
+                except click.Abort:
+                    logger.error("Aborted!")
+                except SystemExit:
+                    pass
+                except KeyboardInterrupt:
+                    click.echo()
+                except Exception as e:
+                    logger.error(self.format_error(e))
+                    out = six.StringIO()
+                    traceback.print_exc(file=out)
+                    logger.debug(out.getvalue())
+        except EOFError:
+            click.echo()
+        finally:
+            self._save_history()
@@ -0,0 +1,207 @@
+from __future__ import absolute_import, unicode_literals
+
+import codecs
+import collections
+import contextlib
+import io
+import os
+import stat
+import struct
+import time
+
+MAGIC = b'SSUSAGE1'
+
+# The usage counters of the `Usage` model, in the order they are stored
+FIELDS = ('quota', 'run_usage', 'vm_usage', 'inactive_vm_usage',
+          'others_vm_usage', 'pending_vm_usage', 'unknown_vm_usage')
+
+# A record is the sampling time in seconds since the epoch, the id of the
+# cloud and its usage counters
+RECORD = struct.Struct(str('<IH%di' % len(FIELDS)))
+
+# Records are read from the file by blocks of this many
+READ_BLOCK = 4096
+
+AGGREGATES = ('max', 'min', 'mean', 'last')
+
+Record = collections.namedtuple('Record', ('time', 'cloud') + FIELDS)
+
+Sample = collections.namedtuple('Sample', ('time', 'cloud') + FIELDS +
+                                ('samples',))
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp))
+
+
+class UsageLog(object):
+    """
+    An append-only file of usage samples, one fixed size binary `RECORD`
+    per cloud and sample.
+
+    Cloud names are kept in a text file next to it, a record refering to
+    the cloud on the line of its id. Since records are appended in time
+    order, the records of a time range are found by a binary search and
+    read in blocks, without loading the file in memory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.clouds_file = os.path.splitext(filename)[0] + '.clouds'
+        self._clouds = None
+
+    def _read_clouds(self):
+        try:
+            with codecs.open(self.clouds_file, encoding='utf8') as fp:
+                return [line.rstrip('\n') for line in fp]
+        except (IOError, OSError):
+            return []
+
+    @property
+    def clouds(self):
+        if self._clouds is None:
+            self._clouds = self._read_clouds()
+        return self._clouds
+
+    @contextlib.contextmanager
+    def _lock(self, fp):
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        if fcntl is not None:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+    def _cloud_id(self, name):
+        if name not in self._clouds:
+            with codecs.open(self.clouds_file, 'a', encoding='utf8') as fp:
+                fp.write(name + '\n')
+            self._clouds.append(name)
+        return self._clouds.index(name)
+
+    def append(self, timestamp, usages):
+        """
+        Append the `Usage` of each cloud sampled at `timestamp`.
+        """
+        log_dir = os.path.dirname(self.filename)
+        if not os.path.isdir(log_dir):
+            os.mkdir(log_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT,
+                     stat.S_IRUSR | stat.S_IWUSR)
+        with io.open(fd, 'r+b') as fp:
+            with self._lock(fp):
+                # Clouds may have been added by another collector
+                self._clouds = self._read_clouds()
+                data = b''.join(
+                    RECORD.pack(int(timestamp), self._cloud_id(usage.cloud),
+                                *[getattr(usage, f) for f in FIELDS])
+                    for usage in usages)
+                size = fp.seek(0, os.SEEK_END)
+                if size < len(MAGIC):
+                    fp.seek(0)
+                    fp.truncate()
+                    fp.write(MAGIC)
+                else:
+                    # Drop the partial record of an interrupted write
+                    extra = (size - len(MAGIC)) % RECORD.size
+                    if extra:
+                        fp.truncate(size - extra)
+                        fp.seek(size - extra)
+                fp.write(data)
+
+    def _count(self, fp):
+        fp.seek(0, os.SEEK_END)
+        return max(fp.tell() - len(MAGIC), 0) // RECORD.size
+
+    def _time_at(self, fp, position):
+        fp.seek(len(MAGIC) + position * RECORD.size)
+        return RECORD.unpack(fp.read(RECORD.size))[0]
+
+    def _first_after(self, fp, count, timestamp):
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._time_at(fp, middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read(self, start=None, end=None):
+        """
+        Yield the `Record`s sampled from `start` until before `end`.
+        """
+        try:
+            fp = io.open(self.filename, 'rb')
+        except (IOError, OSError):
+            return
+        with fp:
+            header = fp.read(len(MAGIC))
+            if not header:
+                return
+            if header != MAGIC:
+                raise ValueError("%s is not a usage log." % self.filename)
+            count = self._count(fp)
+            position = self._first_after(fp, count, start) \
+                if start is not None else 0
+            clouds = self.clouds
+            fp.seek(len(MAGIC) + position * RECORD.size)
+            while position < count:
+                block = fp.read(min(READ_BLOCK, count - position) *
+                                RECORD.size)
+                for offset in range(0, len(block), RECORD.size):
+                    values = RECORD.unpack_from(block, offset)
+                    if end is not None and values[0] >= end:
+                        return
+                    cloud = clouds[values[1]] if values[1] < len(clouds) \
+                        else '#%d' % values[1]
+                    yield Record(values[0], cloud, *values[2:])
+                position += len(block) // RECORD.size
+
+
+def downsample(records, period, aggregate='max'):
+    """
+    Yield a `Sample` per cloud for every `period` seconds of the time
+    ordered `records`, the counters of which are aggregated with one of
+    the `AGGREGATES`. Only the samples of the current period are kept in
+    memory.
+    """
+    buckets = collections.OrderedDict()
+    current = None
+
+    def flush():
+        for cloud, (values, samples) in buckets.items():
+            if aggregate == 'mean':
+                values = [round(float(v) / samples, 2) for v in values]
+            yield Sample(format_time(current), cloud,
+                         *(list(values) + [samples]))
+        buckets.clear()
+
+    for record in records:
+        bucket = record.time - record.time % period
+        if bucket != current:
+            for sample in flush():
+                yield sample
+            current = bucket
+        values = record[2:]
+        previous = buckets.get(record.cloud)
+        if previous is None:
+            buckets[record.cloud] = (list(values), 1)
+            continue
+        old, samples = previous
+        if aggregate == 'max':
+            merged = [max(a, b) for a, b in zip(old, values)]
+        elif aggregate == 'min':
+            merged = [min(a, b) for a, b in zip(old, values)]
+        elif aggregate == 'mean':
+            merged = [a + b for a, b in zip(old, values)]
+        else:
+            merged = list(values)
+        buckets[record.cloud] = (merged, samples + 1)
+    for sample in flush():
+        yield sample
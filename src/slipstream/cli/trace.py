@@ -0,0 +1,173 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import json
+import os
+import re
+import socket
+import threading
+import time
+
+Call = collections.namedtuple('Call', ['start', 'thread', 'method', 'url',
+                                       'status', 'bytes', 'dns_ms',
+                                       'connect_ms', 'tls_ms', 'ttfb_ms',
+                                       'total_ms', 'retries'])
+
+Summary = collections.namedtuple('Summary', ['method', 'path', 'calls',
+                                             'errors', 'bytes', 'total_ms',
+                                             'mean_ms', 'max_ms'])
+
+_UUID = re.compile(r'[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}', re.I)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class Tracer(object):
+    """
+    Record the timings of every HTTP request sent with requests while
+    started.
+
+    The request, connection and name resolution functions of requests,
+    urllib3 and socket are wrapped, so calls made from any `Api` object
+    and any thread are recorded.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.origin = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches = []
+
+    def _patch(self, owner, name, make_wrapper):
+        original = owner.__dict__[name] if isinstance(owner, type) \
+            else getattr(owner, name)
+        self._patches.append((owner, name, original))
+        setattr(owner, name, make_wrapper(original))
+
+    def _timer(self, counter):
+        local = self._local
+
+        def make_wrapper(func):
+            def wrapper(*args, **kwargs):
+                start = time.time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    timings = getattr(local, 'timings', None)
+                    if timings is not None:
+                        timings[counter] += time.time() - start
+            return wrapper
+        return make_wrapper
+
+    def start(self):
+        import requests
+        try:
+            from urllib3 import connection
+        except ImportError:
+            from requests.packages.urllib3 import connection
+
+        self.origin = time.time()
+        self._patch(requests.Session, 'send', self._wrap_send)
+        self._patch(socket, 'getaddrinfo', self._timer('dns'))
+        self._patch(connection.HTTPConnection, '_new_conn',
+                    self._timer('tcp'))
+        for cls in (connection.HTTPConnection, connection.HTTPSConnection):
+            if 'connect' in cls.__dict__:
+                self._patch(cls, 'connect', self._timer(cls.__name__))
+
+    def stop(self):
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+
+    def _wrap_send(self, send):
+        tracer = self
+
+        def wrapper(session, request, **kwargs):
+            timings = collections.defaultdict(float)
+            tracer._local.timings = timings
+            start = time.time()
+            response = None
+            try:
+                response = send(session, request, **kwargs)
+                return response
+            finally:
+                total = time.time() - start
+                tracer._local.timings = None
+                tracer._record(request, response, start, total, timings)
+        return wrapper
+
+    def _record(self, request, response, start, total, timings):
+        dns = timings['dns']
+        # _new_conn includes the name resolution, connect() the TCP
+        # connection and, for HTTPS, the TLS handshake
+        tcp = max(timings['tcp'] - dns, 0)
+        tls = max(timings['HTTPSConnection'] - timings['tcp'], 0)
+        if response is not None:
+            retries = getattr(getattr(response, 'raw', None), 'retries', None)
+            call = Call(start, threading.current_thread().name,
+                        request.method, request.url, response.status_code,
+                        len(response.content or b''), _ms(dns), _ms(tcp),
+                        _ms(tls), _ms(response.elapsed.total_seconds()),
+                        _ms(total),
+                        len(getattr(retries, 'history', None) or ()))
+        else:
+            call = Call(start, threading.current_thread().name,
+                        request.method, request.url, None, 0, _ms(dns),
+                        _ms(tcp), _ms(tls), None, _ms(total), 0)
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self):
+        """
+        Return a `Summary` of the calls for each method and path, UUIDs
+        being replaced by '*', the slowest first.
+        """
+        from six.moves.urllib.parse import urlparse
+        groups = collections.OrderedDict()
+        for call in self.calls:
+            key = (call.method, _UUID.sub('*', urlparse(call.url).path))
+            groups.setdefault(key, []).append(call)
+        rows = []
+        for (method, path), calls in groups.items():
+            total = sum(c.total_ms for c in calls)
+            rows.append(Summary(
+                method, path, len(calls),
+                len([c for c in calls if c.status is None or c.status >= 400]),
+                sum(c.bytes for c in calls), round(total, 1),
+                round(total / len(calls), 1), max(c.total_ms for c in calls)))
+        rows.sort(key=lambda r: r.total_ms, reverse=True)
+        return rows
+
+    def chrome_trace(self):
+        """
+        Return the calls in the Trace Event Format understood by
+        chrome://tracing and Perfetto.
+        """
+        threads = {}
+        events = []
+        for call in self.calls:
+            tid = threads.setdefault(call.thread, len(threads) + 1)
+            events.append({
+                'name': '%s %s' % (call.method, call.url),
+                'cat': 'http',
+                'ph': 'X',
+                'ts': int((call.start - self.origin) * 1e6),
+                'dur': int(call.total_ms * 1000),
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': dict((k, v) for k, v in call._asdict().items()
+                             if k not in ('start', 'thread')),
+            })
+        for name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M',
+                           'pid': os.getpid(), 'tid': tid,
+                           'args': {'name': name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,116 @@
+from __future__ import absolute_import, unicode_literals
+
+import random
+import socket
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib3.connection import HTTPConnection
+    from urllib3.util.retry import Retry as _Retry
+except ImportError:
+    from requests.packages.urllib3.connection import HTTPConnection
+    from requests.packages.urllib3.util.retry import Retry as _Retry
+
+from . import conf
+
+# Profile settings configuring the HTTP connections
+SETTINGS = ('pool_size', 'connect_timeout', 'read_timeout', 'retries',
+            'retry_backoff')
+
+# Responses of an overloaded server or proxy, worth retrying
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Detect connections silently dropped while idle in a long-lived process
+SOCKET_OPTIONS = (list(HTTPConnection.default_socket_options) +
+                  [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+
+
+class Retry(_Retry):
+    """
+    Retry idempotent requests on connection errors and `RETRY_STATUSES`,
+    waiting for the Retry-After delay given by the server or else for an
+    exponential backoff with jitter, at most `conf.MAX_RETRY_WAIT`.
+    """
+
+    def get_backoff_time(self):
+        backoff = super(Retry, self).get_backoff_time()
+        if backoff <= 0:
+            return 0
+        # Spread the retries of concurrent requests
+        return min(backoff / 2 + random.uniform(0, backoff / 2),
+                   conf.MAX_RETRY_WAIT)
+
+    def parse_retry_after(self, retry_after):
+        return min(super(Retry, self).parse_retry_after(retry_after),
+                   conf.MAX_RETRY_WAIT)
+
+
+def retry(retries, backoff):
+    # Only methods listed in Retry.DEFAULT_ALLOWED_METHODS (or
+    # DEFAULT_METHOD_WHITELIST) are retried once the request was sent
+    return Retry(total=retries, backoff_factor=backoff,
+                 status_forcelist=RETRY_STATUSES, raise_on_status=False,
+                 respect_retry_after_header=True)
+
+
+class Adapter(HTTPAdapter):
+    """
+    An `HTTPAdapter` keeping up to `pool_size` connections alive per host,
+    applying the (connect, read) `timeout` to every request and retrying
+    them according to `max_retries`.
+    """
+
+    def __init__(self, pool_size, timeout, max_retries=0):
+        self.timeout = timeout
+        super(Adapter, self).__init__(pool_maxsize=pool_size,
+                                      max_retries=max_retries)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = SOCKET_OPTIONS
+        super(Adapter, self).init_poolmanager(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        # The Api always gives its own default timeout
+        kwargs['timeout'] = self.timeout
+        return super(Adapter, self).send(request, **kwargs)
+
+
+def adapter(settings):
+    """
+    Return an `Adapter` configured from the profile `settings`.
+
+    Raise ValueError if a setting is invalid.
+    """
+    def number(name, convert, default, minimum=0):
+        value = settings.get(name, default)
+        if isinstance(value, bool):
+            # Config.parse_option reads '0' and '1' as booleans
+            value = int(value)
+        try:
+            number = convert(value)
+        except (TypeError, ValueError):
+            number = None
+        if number is None or number < minimum:
+            raise ValueError("%s must be a number of at least %s, not '%s'."
+                             % (name, minimum, value))
+        return number
+
+    return Adapter(number('pool_size', int, conf.DEFAULT_POOL_SIZE, 1),
+                   (number('connect_timeout', float,
+                           conf.DEFAULT_CONNECT_TIMEOUT, 0.001),
+                    number('read_timeout', float, conf.DEFAULT_READ_TIMEOUT,
+                           0.001)),
+                   retry(number('retries', int, conf.DEFAULT_RETRIES),
+                         number('retry_backoff', float,
+                                conf.DEFAULT_RETRY_BACKOFF)))
+
+
+def tune(session, settings):
+    """
+    Make `session` use an `Adapter` configured from the profile
+    `settings` for all its requests.
+    """
+    http_adapter = adapter(settings)
+    session.mount('https://', http_adapter)
+    session.mount('http://', http_adapter)
@@ -29,31 +29,150 @@ class NodeKeyValue(click.ParamType):
             v = temp[1]
         return k, v
 
+    @staticmethod
+    def to_raw_param(value, is_cloud=False):
+        """
+        Convert '[<node>:]<key>=<value>' (or '[<node>:]<cloud>' when
+        `is_cloud` is set) to a raw deployment parameter tuple.
+
+        Raise ValueError if value is badly formatted.
+        """
+        temp = value.split(':', 1)
+        n = 'default'
+        if len(temp) == 1:  # value or key=value
+            k, v = NodeKeyValue.get_key_val(temp[0])
+        else:  # node:value or node:key=value
+            n = temp[0]
+            k, v = NodeKeyValue.get_key_val(temp[1])
+
+        if is_cloud:
+            if k != '':
+                raise ValueError
+            k = 'cloudservice'
+
+        if n == 'default':
+            if is_cloud:
+                return 'parameter--cloudservice', v
+            if k == '':
+                raise ValueError
+            return 'parameter--{0}'.format(k), v
+        else:
+            if k == '':
+                raise ValueError
+            return 'parameter--node--{0}--{1}'.format(n, k), v
+
     def convert(self, value, param, ctx):
         try:
-            temp = value.split(':', 1)
-            n = 'default'
-            if len(temp) == 1:  # value or key=value
-                k, v = NodeKeyValue.get_key_val(temp[0])
-            else:  # node:value or node:key=value
-                n = temp[0]
-                k, v = NodeKeyValue.get_key_val(temp[1])
-
-            if param.name == 'cloud':
-                if k != '':
-                    raise ValueError
-                k = 'cloudservice'
-
-            if n == 'default':
-                if param.name == 'param':
-                    if k == '':
-                        raise ValueError
-                    return 'parameter--{0}'.format(k), v
-                elif param.name == 'cloud':
-                    return 'parameter--cloudservice', v
-            else:
-                if k == '':
-                    raise ValueError
-                return 'parameter--node--{0}--{1}'.format(n, k), v
+            return NodeKeyValue.to_raw_param(value, param.name == 'cloud')
         except ValueError:
             self.fail("%s is not a valid!\nAuthorized format: %s" % (value, param.metavar), param, ctx)
+
+
+class NodeCount(click.ParamType):
+    name = 'nodecount'
+
+    @staticmethod
+    def parse(value):
+        """
+        Convert '<node>=<count>', '<node>=+<count>' or '<node>=-<count>' to
+        a (node, count, relative) tuple.
+
+        Raise ValueError if value is badly formatted.
+        """
+        node, count = NodeKeyValue.get_key_val(value)
+        if node == '' or count == '':
+            raise ValueError
+        relative = count[0] in '+-'
+        count = int(count)
+        if count < 0 and not relative:
+            raise ValueError
+        return node, count, relative
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, tuple):
+            return value
+        try:
+            return NodeCount.parse(value)
+        except ValueError:
+            self.fail("%s is not a valid!\nAuthorized format: %s"
+                      % (value, param.metavar), param, ctx)
+
+
+class VersionRange(click.ParamType):
+    name = 'versionrange'
+
+    @staticmethod
+    def parse(value):
+        """
+        Convert 'N', 'FIRST..LAST', 'FIRST..' or '..LAST', or a comma
+        separated list of them, to a list of (first, last) tuples, None
+        meaning unbounded.
+
+        Raise ValueError if value is badly formatted.
+        """
+        ranges = []
+        for part in value.split(','):
+            part = part.strip()
+            if '..' in part:
+                first, last = part.split('..', 1)
+                first = int(first) if first.strip() else None
+                last = int(last) if last.strip() else None
+            else:
+                first = last = int(part)
+            if first is not None and first < 1:
+                raise ValueError
+            if first is not None and last is not None and first > last:
+                raise ValueError
+            ranges.append((first, last))
+        return ranges
+
+    @staticmethod
+    def expand(ranges, latest):
+        """
+        Return the sorted versions of `ranges` up to the `latest` one.
+        """
+        versions = set()
+        for first, last in ranges:
+            last = latest if last is None else min(last, latest)
+            versions.update(range(first or 1, last + 1))
+        return sorted(versions)
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, list):
+            return value
+        try:
+            return VersionRange.parse(value)
+        except ValueError:
+            self.fail("%s is not a valid version range!\nAuthorized format: "
+                      "N, FIRST..LAST, FIRST.., ..LAST or a comma separated "
+                      "list of them" % value, param, ctx)
+
+
+class Duration(click.ParamType):
+    name = 'duration'
+
+    UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+    @staticmethod
+    def parse(value):
+        """
+        Convert '90', '30s', '5m', '12h', '3d' or '2w' to seconds.
+
+        Raise ValueError if value is badly formatted.
+        """
+        value = value.strip()
+        unit = Duration.UNITS.get(value[-1:])
+        seconds = float(value[:-1] if unit else value) * (unit or 1)
+        if seconds < 0:
+            raise ValueError
+        return seconds
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return Duration.parse(value)
+        except ValueError:
+            self.fail("%s is not a valid duration!\nAuthorized format: a "
+                      "number of seconds or a number followed by s, m, h, d "
+                      "or w" % value, param, ctx)
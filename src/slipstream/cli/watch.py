@@ -0,0 +1,169 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import time
+
+from . import conf, parallel
+
+# States from which a deployment never moves to another one
+FINAL_STATES = ('done', 'aborted', 'cancelled')
+
+Event = collections.namedtuple('Event', ['time', 'deployment_id', 'module',
+                                         'previous', 'status'])
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class Backoff(object):
+    """
+    Polling delays growing geometrically from `initial` up to `maximum`
+    while nothing changes.
+    """
+
+    def __init__(self, initial, maximum, factor=2):
+        self.initial = initial
+        self.maximum = max(initial, maximum)
+        self.factor = factor
+        self.delay = initial
+
+    def reset(self):
+        self.delay = self.initial
+        return self.delay
+
+    def next(self):
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay
+
+
+def watch(poll, backoff, sleep=time.sleep):
+    """
+    Call `poll()`, returning a dict of deployments by id, in a loop and
+    yield an `Event` for every deployment whose state changed.
+
+    Deployments seen on the first poll are reported with no previous
+    state, and those no longer returned get the 'inactive' state.
+    """
+    previous = {}
+    while True:
+        current = poll()
+        changed = False
+        for deployment_id, deployment in current.items():
+            old = previous.get(deployment_id)
+            if old is None or old.status != deployment.status:
+                changed = True
+                yield Event(_now(), deployment_id, deployment.module,
+                            old.status if old is not None else None,
+                            deployment.status)
+        for deployment_id, old in previous.items():
+            if deployment_id not in current:
+                changed = True
+                yield Event(_now(), deployment_id, old.module, old.status,
+                            'inactive')
+        previous = current
+        sleep(backoff.reset() if changed else backoff.next())
+
+
+WaitResult = collections.namedtuple('WaitResult', ['reached', 'failed',
+                                                   'pending', 'errors'])
+
+# Errors after which a deployment is never polled again
+FATAL_STATUSES = (401, 403, 404)
+
+
+def wait(get_deployment, deployment_ids, state, timeout, backoff,
+         workers=parallel.DEFAULT_WORKERS, on_event=None, on_error=None,
+         max_errors=conf.DEFAULT_WAIT_MAX_ERRORS, sleep=time.sleep):
+    """
+    Poll the given deployments concurrently until they all reach `state`,
+    end up in a final state, or `timeout` seconds have passed.
+
+    `on_event` is called with an `Event` for every state change and
+    `on_error` with the deployment id and the error of every failed poll.
+    A deployment is given up when it isn't found, access to it is denied,
+    or its polls fail `max_errors` times in a row; the last error of those
+    is kept in the `errors` dict of the result.
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    pending = collections.OrderedDict((i, None) for i in deployment_ids)
+    reached, failed = [], []
+    errors = collections.OrderedDict()
+    failures = collections.defaultdict(int)
+
+    while pending:
+        changed = False
+        for outcome in parallel.imap(get_deployment, list(pending), workers):
+            if outcome.error is not None:
+                if on_error is not None:
+                    on_error(outcome.item, outcome.error)
+                failures[outcome.item] += 1
+                status = getattr(getattr(outcome.error, 'response', None),
+                                 'status_code', None)
+                if status in FATAL_STATUSES or \
+                        failures[outcome.item] >= max_errors:
+                    del pending[outcome.item]
+                    errors[outcome.item] = outcome.error
+                continue
+            failures.pop(outcome.item, None)
+            deployment = outcome.result
+            if deployment.status != pending[outcome.item]:
+                changed = True
+                if on_event is not None:
+                    on_event(Event(_now(), outcome.item, deployment.module,
+                                   pending[outcome.item], deployment.status))
+                pending[outcome.item] = deployment.status
+            if deployment.status == state:
+                del pending[outcome.item]
+                reached.append(outcome.item)
+            elif deployment.status in FINAL_STATES or deployment.abort:
+                del pending[outcome.item]
+                failed.append(outcome.item)
+
+        if not pending:
+            break
+        delay = backoff.reset() if changed else backoff.next()
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            delay = min(delay, remaining)
+        sleep(delay)
+
+    return WaitResult(reached, failed, list(pending), errors)
+
+
+def wait_size(poll, sizes, timeout, backoff, on_progress=None,
+              sleep=time.sleep):
+    """
+    Call `poll()`, returning the state of a deployment, whether it was
+    aborted and a dict of the number of instances of its nodes, until the
+    nodes have the given `sizes` and the deployment is ready again, it
+    ends up in a final state, or `timeout` seconds have passed.
+
+    `on_progress` is called with the state and the sizes when they change.
+    Return 'reached', 'failed' or 'timeout'.
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    previous = None
+    while True:
+        state, abort, current = poll()
+        if (state, current) != previous:
+            previous = (state, current)
+            if on_progress is not None:
+                on_progress(state, current)
+            delay = backoff.reset()
+        else:
+            delay = backoff.next()
+        if state in FINAL_STATES or abort:
+            return 'failed'
+        if state == 'ready' and all(current.get(node) == size
+                                    for node, size in sizes.items()):
+            return 'reached'
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return 'timeout'
+            delay = min(delay, remaining)
+        sleep(delay)
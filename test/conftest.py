@@ -0,0 +1,54 @@
+from __future__ import absolute_import, unicode_literals
+
+import mock
+import pytest
+from click.testing import CliRunner
+from requests.exceptions import HTTPError
+from requests.models import Response
+
+from slipstream.api import Api
+from slipstream.cli import base, commands, conf
+
+
+def http_error(status):
+    response = Response()
+    response.status_code = status
+    return HTTPError('%d Error' % status, response=response)
+
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    """
+    A home directory where the default profile is logged in.
+    """
+    monkeypatch.setenv('HOME', str(tmpdir))
+    config_dir = tmpdir.mkdir('.slipstream')
+    monkeypatch.setattr(conf, 'DEFAULT_CONFIG_FILE',
+                        str(config_dir.join('config')))
+    config_dir.join('cookies-%s.txt' % conf.DEFAULT_PROFILE).write('')
+    # Config is a singleton on Python 2
+    base.PersistentSingleton._instances.clear()
+    return tmpdir
+
+
+@pytest.fixture
+def api(home, monkeypatch):
+    """
+    The mocked `Api` the commands are given.
+    """
+    api = mock.create_autospec(Api, instance=True)
+    api.endpoint = conf.DEFAULT_ENDPOINT
+    monkeypatch.setattr(commands, 'make_api', lambda settings: api)
+    return api
+
+
+@pytest.fixture
+def run(api):
+    """
+    Run the `slipstream` command line with the mocked `api`, without the
+    local cache.
+    """
+    def run(*args, **kwargs):
+        return CliRunner().invoke(commands.cli, ['--no-cache'] + list(args),
+                                  **kwargs)
+    return run
@@ -0,0 +1,138 @@
+from __future__ import absolute_import, unicode_literals
+
+import time
+
+import mock
+import pytest
+from requests.exceptions import HTTPError
+
+from slipstream.api import Api, models
+from slipstream.cli.cache import Cache, CachedApi
+
+from conftest import http_error
+
+
+def module(path, version=1):
+    return models.Module(path.rsplit('/', 1)[-1], 'application', None, None,
+                         None, version, path)
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return Cache(str(tmpdir.join('cache.json')), 'https://nuv.la')
+
+
+@pytest.fixture
+def cached_api(cache):
+    api = mock.create_autospec(Api, instance=True)
+    api.get_element.side_effect = lambda path: module(path)
+    return CachedApi(api, cache)
+
+
+def test_get_set(cache):
+    cache.set('element:a', {'x': 1})
+    assert cache.get('element:a', 'element') == {'x': 1}
+    assert cache.get('element:b', 'element') is None
+
+
+def test_ttl(cache):
+    cache.ttls['element'] = 10
+    cache.set('element:a', 1)
+    cache.entries['element:a']['time'] = time.time() - 11
+    assert cache.get('element:a', 'element') is None
+    assert 'element:a' not in cache.entries
+
+
+def test_save_and_reload(cache):
+    cache.set('element:a', [1, 2])
+    cache.save()
+    assert Cache(cache.filename, cache.endpoint).get('element:a',
+                                                     'element') == [1, 2]
+    assert Cache(cache.filename, 'https://example.com').entries == {}
+
+
+def test_invalidate(cache):
+    for key in ('element:proj', 'element:proj/app', 'element:proj/app/3',
+                'element:project2', 'element:proj-old/app'):
+        cache.set(key, 1)
+    cache.invalidate('element:proj')
+    assert sorted(cache.entries) == ['element:proj-old/app',
+                                     'element:project2']
+
+
+def test_get_element_cached(cached_api):
+    assert cached_api.get_element('proj/app') == module('proj/app')
+    assert cached_api.get_element('/proj/app/') == module('proj/app')
+    assert cached_api._api.get_element.call_count == 1
+    cached_api.get_element('proj/app', cached=False)
+    assert cached_api._api.get_element.call_count == 2
+
+
+@pytest.mark.parametrize('method', ['publish', 'unpublish', 'delete_element'])
+def test_write_invalidates_after_the_call(cached_api, method):
+    cached_api.get_element('proj/app')
+    cached_api.get_element('proj/app/3')
+    cached_api.get_element('project2/app')
+    cached_api.cache.set('appstore', [])
+    cached_api.cache.set('appstore-index', {})
+
+    def call(path):
+        # A concurrent lookup still gets the element until it's modified
+        assert 'element:proj/app' in cached_api.cache.entries
+    getattr(cached_api._api, method).side_effect = call
+
+    getattr(cached_api, method)('proj/app/3')
+    getattr(cached_api._api, method).assert_called_once_with('proj/app/3')
+    assert sorted(cached_api.cache.entries) == ['element:project2/app']
+
+
+@pytest.mark.parametrize('method', ['publish', 'unpublish', 'delete_element'])
+def test_failed_write_keeps_the_cache(cached_api, method):
+    cached_api.get_element('proj/app')
+    getattr(cached_api._api, method).side_effect = http_error(403)
+    with pytest.raises(HTTPError):
+        getattr(cached_api, method)('proj/app/1')
+    assert 'element:proj/app' in cached_api.cache.entries
+
+
+APPS = [models.App('WordPress', 'application', 3, 'apps/WordPress/wordpress'),
+        models.App('Nginx', 'application', 1, 'apps/Nginx/nginx')]
+
+
+def test_find_application(cached_api):
+    cached_api._api.list_applications.side_effect = lambda: iter(APPS)
+    assert cached_api.find_application('WordPress') == APPS[0]
+    assert cached_api.find_application('Nginx') == APPS[1]
+    assert cached_api._api.list_applications.call_count == 1
+    assert cached_api.application_names() == ['Nginx', 'WordPress']
+
+
+def test_find_application_without_refresh(cached_api):
+    assert cached_api.find_application('WordPress', refresh=False) is None
+    assert not cached_api._api.list_applications.called
+
+
+def test_find_application_missing(cached_api):
+    cached_api._api.list_applications.side_effect = lambda: iter(APPS)
+    cached_api.cache.ttls['appstore'] = 10
+    assert cached_api.find_application('Unknown') is None
+    assert cached_api.find_application('Unknown') is None
+    assert cached_api.find_application('WordPress') == APPS[0]
+    assert cached_api._api.list_applications.call_count == 1
+
+    # Until the app store expires
+    for entry in cached_api.cache.entries.values():
+        entry['time'] -= 11
+    assert cached_api.find_application('Unknown') is None
+    assert cached_api._api.list_applications.call_count == 2
+
+
+def test_find_application_published_after_miss(cached_api):
+    cached_api._api.list_applications.side_effect = lambda: iter(APPS[1:])
+    assert cached_api.find_application('WordPress') is None
+    cached_api.publish('apps/WordPress/wordpress/3')
+    assert not any(k.startswith('appstore') for k in cached_api.cache.entries)
+
+    cached_api._api.list_applications.side_effect = lambda: iter(APPS)
+    assert cached_api.find_application('WordPress') == APPS[0]
+    assert cached_api._api.list_applications.call_count == 2
@@ -0,0 +1,880 @@
+from __future__ import absolute_import, unicode_literals
+
+import json
+import uuid
+
+import pytest
+
+from slipstream.api import models
+from slipstream.cli import commands, conf
+
+from conftest import http_error
+
+IDS = [uuid.UUID(int=n) for n in range(1, 5)]
+
+
+def deployment(id, module='examples/apps/wordpress', status='ready',
+               cloud='exoscale', scalable='false'):
+    return models.Deployment(id, module, status, '2017-01-25 12:00:00 UTC',
+                             '2017-01-25 12:00:00 UTC', [cloud], 'alice',
+                             None, None, scalable)
+
+
+def fail_on(*items):
+    """Return a side effect failing with a 500 error for `items`."""
+    def call(item, *args, **kwargs):
+        if item in items:
+            raise http_error(500)
+    return call
+
+
+def terminated(api):
+    return sorted(c[0][0] for c in api.terminate.call_args_list)
+
+
+def test_terminate_one(run, api):
+    result = run('terminate', str(IDS[0]))
+    assert result.exit_code == 0, result.output
+    api.terminate.assert_called_once_with(IDS[0])
+
+
+def test_terminate_many(run, api):
+    result = run('terminate', str(IDS[0]), str(IDS[1]), str(IDS[0]))
+    assert result.exit_code == 0, result.output
+    assert terminated(api) == IDS[:2]
+    assert result.output.count('terminated') == 2
+
+
+def test_terminate_from_stdin(run, api):
+    result = run('terminate', '-', str(IDS[2]),
+                 input='%s\n%s %s\n' % (IDS[0], IDS[1], IDS[0]))
+    assert result.exit_code == 0, result.output
+    assert terminated(api) == IDS[:3]
+
+
+def test_terminate_failures(run, api):
+    api.terminate.side_effect = fail_on(IDS[1])
+    result = run('terminate', str(IDS[0]), str(IDS[1]))
+    assert result.exit_code == 1
+    assert '1 of 2 deployments could not be terminated.' in result.output
+    assert terminated(api) == IDS[:2]
+
+
+def test_terminate_invalid_uuid(run, api):
+    result = run('terminate', '-', input='%s nope\n' % IDS[0])
+    assert result.exit_code == 2
+    assert "'nope' is not a valid UUID." in result.output
+    assert not api.terminate.called
+
+
+def test_terminate_nothing(run, api):
+    result = run('terminate')
+    assert result.exit_code == 2
+    assert 'No deployment given.' in result.output
+
+
+DEPLOYMENTS = [
+    deployment(IDS[0]),
+    deployment(IDS[1], module='examples/apps/nginx'),
+    deployment(IDS[2], status='aborted'),
+]
+
+
+def test_terminate_filters_confirmed(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('terminate', '--module', '*/wordpress', '--status', 'Ready',
+                 input='y\n')
+    assert result.exit_code == 0, result.output
+    assert 'Terminate 1 deployment(s)?' in result.output
+    assert terminated(api) == [IDS[0]]
+
+
+def test_terminate_filters_declined(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('terminate', '--module', 'examples/*', input='n\n')
+    assert result.exit_code == 1
+    assert 'Terminate 3 deployment(s)?' in result.output
+    assert 'Aborted!' in result.output
+    assert not api.terminate.called
+
+
+def test_terminate_filters_yes(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('terminate', '--status', 'ready', '--yes')
+    assert result.exit_code == 0, result.output
+    assert 'Terminate' not in result.output
+    assert terminated(api) == IDS[:2]
+
+
+def test_terminate_filters_batch_mode(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('-b', 'terminate', '--cloud', 'exoscale')
+    assert result.exit_code == 0, result.output
+    assert terminated(api) == IDS[:3]
+    assert api.list_deployments.call_args[1]['cloud'] == 'exoscale'
+
+
+def test_terminate_dry_run(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('terminate', '--status', 'aborted', str(IDS[3]),
+                 '--dry-run')
+    assert result.exit_code == 0, result.output
+    assert result.output.count('would be terminated') == 2
+    assert str(IDS[2]) in result.output and str(IDS[3]) in result.output
+    assert not api.terminate.called
+
+
+def test_terminate_filters_no_match(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('terminate', '--module', 'other/*')
+    assert result.exit_code == 0, result.output
+    assert 'No deployment found matching your criteria.' in result.output
+
+
+def module(path, type='application', version=1):
+    return models.Module(path.rsplit('/', 1)[-1], type, None, None, None,
+                         version, path)
+
+
+def write_manifest(home, entries):
+    manifest = home.join('deployments.json')
+    manifest.write(json.dumps(entries))
+    return str(manifest)
+
+
+def test_deploy_from_file(run, api, home):
+    api.get_element.side_effect = lambda path: module(path)
+    api.deploy.side_effect = lambda path, raw_params: \
+        IDS[0] if path.endswith('wordpress') else IDS[1]
+    manifest = write_manifest(home, [
+        {'path': 'examples/apps/wordpress', 'cloud': 'exoscale',
+         'param': {'web:multiplicity': 2}},
+        {'path': 'examples/apps/nginx', 'param': ['admin_email=a@b.c']},
+        {'path': 'examples/apps/wordpress', 'cloud': ['web:aws']},
+    ])
+    result = run('deploy', '--from-file', manifest)
+    assert result.exit_code == 0, result.output
+    assert sorted(result.output.split()) == \
+        sorted([str(IDS[0]), str(IDS[1]), str(IDS[0])])
+    # Each path is only resolved once
+    assert api.get_element.call_count == 2
+    calls = sorted((c[0][0], sorted(c[1]['raw_params'].items()))
+                   for c in api.deploy.call_args_list)
+    assert calls == [
+        ('examples/apps/nginx', [('parameter--admin_email', 'a@b.c')]),
+        ('examples/apps/wordpress', [
+            ('parameter--cloudservice', 'exoscale'),
+            ('parameter--node--web--multiplicity', '2')]),
+        ('examples/apps/wordpress', [
+            ('parameter--node--web--cloudservice', 'aws')]),
+    ]
+
+
+def test_deploy_from_file_app_store_name(run, api, home):
+    api.get_element.side_effect = http_error(404)
+    api.list_applications.return_value = [
+        models.App('WordPress', 'application', 3, 'apps/WordPress/wordpress')]
+    api.deploy.return_value = IDS[0]
+    result = run('deploy', '--from-file',
+                 write_manifest(home, [{'path': 'WordPress'}]))
+    assert result.exit_code == 0, result.output
+    api.deploy.assert_called_once_with('apps/WordPress/wordpress',
+                                       raw_params={})
+
+
+def test_deploy_from_file_failures(run, api, home):
+    api.get_element.side_effect = lambda path: module(path)
+    api.deploy.side_effect = fail_on('examples/apps/nginx')
+    result = run('deploy', '--from-file', write_manifest(home, [
+        {'path': 'examples/apps/wordpress'},
+        {'path': 'examples/apps/nginx'}]))
+    assert result.exit_code == 1
+    assert 'Entry #2 (examples/apps/nginx)' in result.output
+    assert '1 of 2 deployments failed.' in result.output
+
+
+@pytest.mark.parametrize('entries, message', [
+    ({'path': 'a'}, "Invalid manifest: The manifest must contain a list"),
+    ([{'path': 'examples/images'}], "Cannot run 'examples/images', a "
+                                    "'project'."),
+    ([{'path': 'examples/apps/wordpress', 'param': ['nope']}],
+     "Entry #1 has an invalid cloud or parameter."),
+])
+def test_deploy_from_file_invalid(run, api, home, entries, message):
+    api.get_element.side_effect = lambda path: module(
+        path, 'project' if path == 'examples/images' else 'application')
+    result = run('deploy', '--from-file', write_manifest(home, entries))
+    assert result.exit_code == 1
+    assert message in result.output
+    assert not api.deploy.called
+
+
+@pytest.mark.parametrize('args', [
+    ['examples/apps/wordpress'],
+    ['--cloud', 'exoscale'],
+    ['--open'],
+])
+def test_deploy_from_file_exclusive(run, api, home, args):
+    result = run('deploy', '--from-file',
+                 write_manifest(home, [{'path': 'a'}]), *args)
+    assert result.exit_code == 2
+    assert '--from-file cannot be used with PATH' in result.output
+    assert not api.deploy.called
+
+
+def test_deploy_path_optional(run, api):
+    result = run('deploy', '--help')
+    assert 'Usage: cli deploy [OPTIONS] [PATH]' in result.output
+    result = run('deploy')
+    assert result.exit_code == 2
+    assert 'Missing argument "PATH".' in result.output
+
+
+def test_deployments_jsonl(run, api):
+    api.list_deployments.return_value = iter(DEPLOYMENTS)
+    result = run('deployments', '--format', 'jsonl')
+    assert result.exit_code == 0, result.output
+    rows = [json.loads(line) for line in result.output.splitlines()]
+    assert [(r['id'], r['status']) for r in rows] == \
+        [(str(d.id), d.status) for d in DEPLOYMENTS]
+
+
+def vm(n, status='running'):
+    return models.VirtualMachine('i-%d' % n, 'exoscale', status, IDS[0],
+                                 'alice', 'web', str(n), '10.0.0.%d' % n,
+                                 1, 1024, 10, 'small', 'true')
+
+
+def list_vms(count):
+    """Return a side effect listing `count` virtual machines by pages."""
+    def call(deployment_id=None, cloud=None, offset=0, limit=20):
+        return [vm(n) for n in range(offset, min(offset + limit, count))]
+    return call
+
+
+def ids(result):
+    return [json.loads(line)['id'] for line in result.output.splitlines()]
+
+
+def pages(api):
+    return [(c[1]['offset'], c[1]['limit'])
+            for c in api.list_virtualmachines.call_args_list]
+
+
+@pytest.mark.parametrize('args, expected, requests', [
+    (['--limit', '3'], ['i-0', 'i-1', 'i-2'], [(0, 3)]),
+    (['--first', '5', '--limit', '2'], ['i-4', 'i-5'], [(4, 2)]),
+    (['--limit', '5', '--page-size', '2'], ['i-0', 'i-1', 'i-2', 'i-3', 'i-4'],
+     [(0, 2), (2, 2), (4, 2)]),
+    (['--first', '249'], ['i-248', 'i-249'], [(248, 100)]),
+    ([], ['i-%d' % n for n in range(250)], [(0, 100), (100, 100), (200, 100)]),
+])
+def test_virtualmachines_pages(run, api, args, expected, requests):
+    api.list_virtualmachines.side_effect = list_vms(250)
+    result = run('virtualmachines', '--format', 'jsonl', *args)
+    assert result.exit_code == 0, result.output
+    assert ids(result) == expected
+    assert pages(api) == requests
+
+
+def test_virtualmachines_filters(run, api):
+    def call(deployment_id=None, cloud=None, offset=0, limit=20):
+        return [vm(n, 'stopped' if n % 2 else 'running')
+                for n in range(offset, min(offset + limit, 250))]
+    api.list_virtualmachines.side_effect = call
+    result = run('virtualmachines', '--format', 'jsonl',
+                 '--status', 'Stopped', '--limit', '2',
+                 '--deployment-id', str(IDS[0]), '--cloud', 'exoscale')
+    assert result.exit_code == 0, result.output
+    assert ids(result) == ['i-1', 'i-3']
+    # The status is filtered by the client, so pages aren't reduced
+    assert pages(api) == [(0, 100)]
+    kwargs = api.list_virtualmachines.call_args[1]
+    assert (kwargs['deployment_id'], kwargs['cloud']) == (IDS[0], 'exoscale')
+
+
+PROJECTS = {
+    None: [module('examples', 'project'), module('other', 'project')],
+    'examples': [module('examples/apps', 'project'),
+                 module('examples/images', 'project')],
+    'other': [module('other/readme', 'component')],
+    'examples/apps': [module('examples/apps/wordpress'),
+                      module('examples/apps/nginx')],
+    'examples/images': [module('examples/images/ubuntu', 'component')],
+}
+
+
+def list_project_content(path=None):
+    return PROJECTS[path]
+
+
+def paths(result):
+    return sorted(json.loads(line)['path']
+                  for line in result.output.splitlines())
+
+
+@pytest.mark.parametrize('args, expected', [
+    ([], ['examples', 'other']),
+    (['--max-depth', '1'], ['examples', 'examples/apps', 'examples/images',
+                            'other', 'other/readme']),
+    (['--recurse', '--type', 'application'], ['examples/apps/nginx',
+                                              'examples/apps/wordpress']),
+    (['--recurse', 'examples/apps'], ['examples/apps/nginx',
+                                      'examples/apps/wordpress']),
+])
+def test_list_recurse(run, api, args, expected):
+    api.list_project_content.side_effect = list_project_content
+    result = run('list', '--format', 'jsonl', *args)
+    assert result.exit_code == 0, result.output
+    assert paths(result) == expected
+
+
+def test_list_recurse_missing(run, api):
+    api.list_project_content.side_effect = http_error(404)
+    result = run('list', '--recurse', 'nope')
+    assert result.exit_code == 1
+    assert "Module 'nope' doesn't exists." in result.output
+
+
+def get_deployment(*states):
+    """Return a side effect going through the `states` of each of the
+    deployments `IDS`, the last one being kept."""
+    remaining = dict((IDS[n], list(s)) for n, s in enumerate(states))
+
+    def call(deployment_id):
+        state = remaining[deployment_id]
+        value = state.pop(0) if len(state) > 1 else state[0]
+        if isinstance(value, Exception):
+            raise value
+        return deployment(deployment_id, status=value)
+    return call
+
+
+FAST = ('--interval', '0.001', '--max-interval', '0.001')
+
+
+def test_wait(run, api):
+    api.get_deployment.side_effect = get_deployment(
+        ['initializing', 'ready'], ['provisioning', 'executing', 'ready'])
+    result = run('wait', str(IDS[0]), '-', *FAST, input='%s\n' % IDS[1])
+    assert result.exit_code == 0, result.output
+    assert '%s examples/apps/wordpress: initializing -> ready' % IDS[0] \
+        in result.output
+    assert '%s examples/apps/wordpress: executing -> ready' % IDS[1] \
+        in result.output
+
+
+def test_wait_jsonl(run, api):
+    api.get_deployment.side_effect = get_deployment(['provisioning', 'ready'])
+    result = run('wait', str(IDS[0]), '--format', 'jsonl', *FAST)
+    assert result.exit_code == 0, result.output
+    assert [(e['previous'], e['status']) for e in
+            map(json.loads, result.output.splitlines())] == \
+        [(None, 'provisioning'), ('provisioning', 'ready')]
+
+
+def test_wait_state(run, api):
+    api.get_deployment.side_effect = get_deployment(['executing', 'done'])
+    result = run('wait', str(IDS[0]), '--state', 'Done', *FAST)
+    assert result.exit_code == 0, result.output
+
+
+def test_wait_failed(run, api):
+    api.get_deployment.side_effect = get_deployment(['ready'], ['aborted'])
+    result = run('wait', str(IDS[0]), str(IDS[1]), *FAST)
+    assert result.exit_code == 1
+    assert "Deployment %s won't reach the state 'ready'." % IDS[1] \
+        in result.output
+
+
+def test_wait_errors(run, api):
+    api.get_deployment.side_effect = get_deployment(
+        [http_error(503), 'ready'], [http_error(404)])
+    result = run('wait', str(IDS[0]), str(IDS[1]), *FAST)
+    assert result.exit_code == 1
+    assert 'Failed to get deployment %s' % IDS[0] in result.output
+    assert 'Gave up waiting for deployment %s' % IDS[1] in result.output
+    assert 'Gave up waiting for deployment %s' % IDS[0] \
+        not in result.output
+
+
+def test_wait_timeout(run, api):
+    api.get_deployment.side_effect = get_deployment(['provisioning'])
+    result = run('wait', str(IDS[0]), '--timeout', '0.01', *FAST)
+    assert result.exit_code == 124
+    assert 'Timeout waiting for deployment %s.' % IDS[0] in result.output
+
+
+def test_wait_nothing(run, api):
+    result = run('wait', '-', input='\n')
+    assert result.exit_code == 2
+    assert 'No deployment given.' in result.output
+
+
+def usage(cloud, vm_usage):
+    return models.Usage(cloud, 1, vm_usage, 0, 0, 0, 0, 20)
+
+
+@pytest.fixture
+def profiles(api, home, monkeypatch):
+    """
+    Add the 'other' profile to the config file and return the endpoints
+    of the Apis made.
+    """
+    home.join('.slipstream', 'config').write(
+        '[other]\nendpoint = https://other.example.com\n')
+    home.join('.slipstream', 'cookies-other.txt').write('')
+    endpoints = []
+
+    def make_api(settings):
+        endpoints.append(settings['endpoint'])
+        return api
+    monkeypatch.setattr(commands, 'make_api', make_api)
+    api.usage.side_effect = lambda: [usage('exoscale', 2)]
+    return endpoints
+
+
+def rows(result):
+    return [json.loads(line) for line in result.output.splitlines()]
+
+
+@pytest.mark.parametrize('args', [['--all-profiles'], ['--profiles', 'nuvla']])
+def test_usage_default_profile_without_section(run, api, args):
+    api.usage.return_value = [usage('exoscale', 2), usage('aws', 1)]
+    result = run('usage', '--format', 'jsonl', *args)
+    assert result.exit_code == 0, result.output
+    assert [(r['profile'], r['cloud'], r['vm_usage'])
+            for r in rows(result)] == [('nuvla', 'exoscale', 2),
+                                       ('nuvla', 'aws', 1)]
+
+
+def test_usage_all_profiles(run, profiles):
+    result = run('usage', '--format', 'jsonl', '--all-profiles')
+    assert result.exit_code == 0, result.output
+    assert [r['profile'] for r in rows(result)] == ['other']
+    assert profiles[-1] == 'https://other.example.com'
+
+
+def test_usage_profiles(run, profiles):
+    result = run('usage', '--format', 'jsonl', '--profiles', 'nuvla,other')
+    assert result.exit_code == 0, result.output
+    assert sorted(r['profile'] for r in rows(result)) == ['nuvla', 'other']
+    assert sorted(profiles[-2:]) == ['https://nuv.la',
+                                     'https://other.example.com']
+
+
+def test_usage_profile_failure(run, profiles, home):
+    home.join('.slipstream', 'cookies-other.txt').remove()
+    result = run('usage', '--format', 'jsonl', '--profiles', 'nuvla,other')
+    assert result.exit_code == 1
+    assert "Profile 'other': Not logged in." in result.output
+    assert '1 of 2 profiles failed.' in result.output
+    assert '"profile": "nuvla"' in result.output
+
+
+def test_usage_unknown_profile(run, profiles):
+    result = run('usage', '--profiles', 'nuvla,unknown')
+    assert result.exit_code == 2
+    assert "Profile 'unknown' does not exists." in result.output
+
+
+def test_virtualmachines_profiles(run, profiles, api):
+    api.list_virtualmachines.side_effect = list_vms(3)
+    result = run('virtualmachines', '--format', 'jsonl', '--limit', '2',
+                 '--profiles', 'other,nuvla')
+    assert result.exit_code == 0, result.output
+    assert sorted((r['profile'], r['id']) for r in rows(result)) == [
+        ('nuvla', 'i-0'), ('nuvla', 'i-1'), ('other', 'i-0'),
+        ('other', 'i-1')]
+
+
+@pytest.mark.parametrize('args', [
+    ['--format', 'csv', '--columns', 'status, id', 'deployments'],
+    ['--format', 'json', '--columns', 'status,id', 'deployments',
+     '--format', 'csv'],
+])
+def test_global_format_and_columns(run, api, args):
+    api.list_deployments.return_value = iter(DEPLOYMENTS)
+    result = run(*args)
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['status,id'] + [
+        '%s,%s' % (d.status, d.id) for d in DEPLOYMENTS]
+
+
+def test_unknown_column(run, api):
+    api.list_deployments.return_value = iter(DEPLOYMENTS)
+    result = run('--columns', 'id,flavour', 'deployments')
+    assert result.exit_code == 2
+    assert "Unknown column 'flavour'." in result.output
+
+
+def test_table(run, api):
+    api.list_deployments.return_value = iter(DEPLOYMENTS)
+    result = run('--columns', 'id,status', 'deployments')
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[1] == '| id                                   | status  |'
+    assert lines[3] == '| %s | ready   |' % IDS[0]
+    assert len(lines) == 3 + len(DEPLOYMENTS) + 1
+
+
+def test_terminate_circuit_breaker(run, api, home):
+    home.join('.slipstream', 'config').write(
+        '[%s]\nbreaker_threshold = 2\n' % conf.DEFAULT_PROFILE)
+    api.terminate.side_effect = http_error(503)
+    result = run('terminate', '--workers', '1', *map(str, IDS))
+    assert result.exit_code == 1
+    assert api.terminate.call_count == 2
+    assert result.output.count('Not sent, the last 2 requests failed.') == 2
+    assert '4 of 4 deployments could not be terminated.' in result.output
+
+
+def fail_with(**statuses):
+    """Return a side effect failing for each path in `statuses`, given with
+    '.' instead of '/', with an error of the given status."""
+    statuses = dict((k.replace('.', '/'), v) for k, v in statuses.items())
+
+    def call(path):
+        if path in statuses:
+            raise http_error(statuses[path])
+    return call
+
+
+def operations(result):
+    """Return the reported operations, leaving out the prompts and
+    errors mixed in the output."""
+    return sorted((row['path'], row['version'], row['result'])
+                  for row in map(json.loads, (
+                      line for line in result.output.splitlines()
+                      if line.startswith('{'))))
+
+
+@pytest.fixture
+def bulk(api):
+    api.list_project_content.side_effect = list_project_content
+    api.get_element.return_value = module('examples/apps/wordpress',
+                                          version=3)
+    return api
+
+
+def test_publish_glob(run, bulk):
+    result = run('--format', 'jsonl', 'publish', 'examples/apps/*')
+    assert result.exit_code == 0, result.output
+    assert operations(result) == [
+        ('examples/apps/nginx', 1, 'published'),
+        ('examples/apps/wordpress', 1, 'published'),
+    ]
+    # Publishing isn't destructive, no confirmation is asked
+    assert '?' not in result.output
+
+
+def test_publish_versions(run, bulk):
+    bulk.publish.side_effect = fail_with(**{'examples.apps.wordpress.1': 409,
+                                            'examples.apps.wordpress.2': 404})
+    result = run('--format', 'jsonl', 'publish', '--versions', '..3',
+                 'examples/apps/wordpress')
+    assert result.exit_code == 0, result.output
+    assert operations(result) == [
+        ('examples/apps/wordpress', 1, 'already published'),
+        ('examples/apps/wordpress', 2, 'skipped, no such version'),
+        ('examples/apps/wordpress', 3, 'published'),
+    ]
+
+
+def test_publish_glob_failures(run, bulk):
+    bulk.publish.side_effect = fail_with(**{'examples.apps.nginx.1': 500,
+                                            'examples.apps.wordpress.1': 403})
+    result = run('--format', 'jsonl', 'publish', 'examples/apps/*')
+    assert result.exit_code == 1
+    rows = [('examples/apps/nginx', 1, '500 Error'),
+            ('examples/apps/wordpress', 1,
+             'only a superuser is allowed to publish')]
+    assert operations(result) == rows
+    assert '2 of 2 operations failed.' in result.output
+
+
+def test_bulk_dry_run(run, bulk):
+    result = run('--format', 'jsonl', 'delete', '--dry-run', 'examples/*/*')
+    assert result.exit_code == 0, result.output
+    assert operations(result) == [
+        ('examples/apps/nginx', None, 'would be deleted'),
+        ('examples/apps/wordpress', None, 'would be deleted'),
+        ('examples/images/ubuntu', None, 'would be deleted'),
+    ]
+    assert not bulk.delete_element.called
+
+
+def test_bulk_no_match(run, bulk):
+    result = run('delete', 'examples/*/drupal')
+    assert result.exit_code == 0, result.output
+    assert 'No element found matching your criteria.' in result.output
+    assert not bulk.delete_element.called
+
+
+def test_delete_confirmed(run, bulk):
+    result = run('--format', 'jsonl', 'delete', 'examples/apps/*',
+                 input='y\n')
+    assert result.exit_code == 0, result.output
+    assert 'Delete 2 element(s)? [y/N]: y' in result.output
+    assert operations(result) == [
+        ('examples/apps/nginx', None, 'deleted'),
+        ('examples/apps/nginx', None, 'will be deleted'),
+        ('examples/apps/wordpress', None, 'deleted'),
+        ('examples/apps/wordpress', None, 'will be deleted'),
+    ]
+    assert sorted(c[0][0] for c in bulk.delete_element.call_args_list) == \
+        ['examples/apps/nginx', 'examples/apps/wordpress']
+
+
+def test_unpublish_confirmed(run, bulk):
+    result = run('--format', 'jsonl', 'unpublish', 'examples/apps/*',
+                 input='y\n')
+    assert result.exit_code == 0, result.output
+    assert 'Unpublish 2 element(s)? [y/N]: y' in result.output
+    assert sorted(c[0][0] for c in bulk.unpublish.call_args_list) == \
+        ['examples/apps/nginx/1', 'examples/apps/wordpress/1']
+
+
+@pytest.mark.parametrize('command, method', [
+    ('delete', 'delete_element'), ('unpublish', 'unpublish'),
+])
+def test_bulk_declined(run, bulk, command, method):
+    result = run(command, 'examples/apps/*', input='n\n')
+    assert result.exit_code == 1
+    assert 'Aborted!' in result.output
+    assert not getattr(bulk, method).called
+
+
+@pytest.mark.parametrize('args, done', [
+    (['delete', '--yes'], 'deleted'), (['delete', '-y'], 'deleted'),
+    (['-b', 'delete'], 'deleted'), (['unpublish', '--yes'], 'unpublished'),
+])
+def test_bulk_without_confirmation(run, bulk, args, done):
+    result = run('--format', 'jsonl', *(args + ['examples/apps/*']))
+    assert result.exit_code == 0, result.output
+    assert '?' not in result.output
+    assert [r[2] for r in operations(result)] == [done, done]
+
+
+def test_delete_versions_confirmed(run, bulk):
+    bulk.delete_element.side_effect = fail_with(
+        **{'examples.apps.wordpress.1': 404})
+    result = run('--format', 'jsonl', 'delete', '--versions', '..2',
+                 'examples/apps/wordpress', input='y\n')
+    assert result.exit_code == 0, result.output
+    assert 'Delete 2 element(s)?' in result.output
+    assert [r for r in operations(result) if r[2] != 'will be deleted'] == [
+        ('examples/apps/wordpress', 1, 'skipped, no such version'),
+        ('examples/apps/wordpress', 2, 'deleted'),
+    ]
+
+
+def test_delete_single(run, bulk):
+    result = run('delete', 'examples/apps/wordpress')
+    assert result.exit_code == 0, result.output
+    assert '?' not in result.output
+    bulk.delete_element.assert_called_once_with('examples/apps/wordpress')
+
+
+def test_query(run, api):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('query', 'deployments', 'status=ready', '--sort', 'module',
+                 '--format', 'jsonl')
+    assert result.exit_code == 0, result.output
+    assert [row['module'] for row in rows(result)] == [
+        'examples/apps/nginx', 'examples/apps/wordpress']
+    assert api.list_deployments.call_args[1]['inactive'] is True
+
+    # The index is fresh, the server isn't asked again
+    api.list_deployments.reset_mock()
+    result = run('query', 'deployments', '--group-by', 'status',
+                 '--format', 'jsonl')
+    assert result.exit_code == 0, result.output
+    assert sorted((r['status'], r['count']) for r in rows(result)) == \
+        [('aborted', 1), ('ready', 2)]
+    assert not api.list_deployments.called
+
+
+def test_query_offline_not_indexed(run, api):
+    result = run('query', 'virtualmachines', '--offline')
+    assert result.exit_code == 0, result.output
+    assert "The virtualmachines haven't been indexed yet." in result.output
+    assert not api.list_virtualmachines.called
+
+
+@pytest.mark.parametrize('args, code, message', [
+    (['status'], 2, 'Invalid value for FILTER'),
+    (['--refresh', '--offline'], 2,
+     '--refresh and --offline are exclusive.'),
+    (['--sort', 'nope'], 1, 'nope'),
+])
+def test_query_invalid(run, api, args, code, message):
+    api.list_deployments.return_value = DEPLOYMENTS
+    result = run('query', 'deployments', *args)
+    assert result.exit_code == code
+    assert message in result.output
+
+
+def test_usage_collect_and_history(run, api):
+    api.usage.side_effect = [[usage('exoscale', 2), usage('aws', 1)],
+                             http_error(500),
+                             [usage('exoscale', 4), usage('aws', 1)]]
+    result = run('usage', '--collect', '--count', '3', '--interval', '0.01')
+    assert result.exit_code == 0, result.output
+    assert 'Usage not sampled: 500 Error' in result.output
+
+    def history(*args):
+        result = run('usage', '--history', '--format', 'jsonl', *args)
+        assert result.exit_code == 0, result.output
+        samples = {}
+        for row in rows(result):
+            count, vm_usage = samples.get(row['cloud'], (0, 0))
+            samples[row['cloud']] = (count + row['samples'],
+                                     max(vm_usage, row['vm_usage']))
+        return samples
+
+    assert history('--every', '1d') == {'aws': (2, 1), 'exoscale': (2, 4)}
+    assert history('--cloud', 'aws', '--since', '1h') == {'aws': (2, 1)}
+
+
+@pytest.mark.parametrize('args, message', [
+    (['--collect', '--history'], '--collect and --history are exclusive.'),
+    (['--history', '--all-profiles'],
+     '--collect and --history only apply to the current profile.'),
+    (['--collect', '--interval', '0'], 'The interval must be positive.'),
+    (['--history', '--since', 'yesterday'], "Invalid value for '--since'"),
+])
+def test_usage_history_invalid(run, api, args, message):
+    result = run('usage', *args)
+    assert result.exit_code == 2
+    assert message in result.output
+    assert not api.usage.called
+
+
+def test_usage_history_empty(run, api):
+    result = run('usage', '--history')
+    assert result.exit_code == 0, result.output
+    assert 'No usage sample found.' in result.output
+
+
+class Nodes(object):
+    """The instances of the nodes of a scalable deployment, changed by
+    the mocked Api calls, with `states` of the deployment polled once
+    they changed."""
+
+    def __init__(self, api, states=('ready',), **sizes):
+        self.ids = dict((node, [str(n) for n in range(1, size + 1)])
+                        for node, size in sizes.items())
+        self.states = list(states)
+        self.changed = False
+        api.get_deployment.side_effect = self.get_deployment
+        api.get_deployment_parameter.side_effect = self.get_parameter
+        api.add_node_instances.side_effect = self.add
+        api.remove_node_instances.side_effect = self.remove
+
+    def get_deployment(self, deployment_id):
+        state = self.states[0]
+        if self.changed and len(self.states) > 1:
+            self.states.pop(0)
+        return deployment(deployment_id, status=state, scalable='true')
+
+    def get_parameter(self, deployment_id, name, ignore_abort=False):
+        node = name.split(':')[0]
+        if node not in self.ids:
+            raise http_error(404)
+        return ','.join(self.ids[node])
+
+    def add(self, deployment_id, node, quantity=None):
+        last = max([int(i) for i in self.ids[node]] or [0])
+        self.ids[node].extend(str(last + n) for n in range(1, quantity + 1))
+        self.changed = True
+
+    def remove(self, deployment_id, node, ids):
+        self.ids[node] = [i for i in self.ids[node] if i not in ids]
+        self.changed = True
+
+
+def test_scale(run, api):
+    nodes = Nodes(api, web=2, db=3)
+    result = run('scale', str(IDS[0]), 'web=7', 'db=-2', '--batch-size', '2',
+                 *FAST)
+    assert result.exit_code == 0, result.output
+    assert "Node 'web': 2 -> 7 instances." in result.output
+    assert "Node 'db': 3 -> 1 instances." in result.output
+    assert sorted(c[0][2] for c in api.add_node_instances.call_args_list) \
+        == [1, 2, 2]
+    # The last instances are removed first
+    api.remove_node_instances.assert_called_once_with(IDS[0], 'db',
+                                                      ['3', '2'])
+    assert nodes.ids == {'web': [str(n) for n in range(1, 8)], 'db': ['1']}
+
+
+def test_scale_progress(run, api):
+    Nodes(api, ['provisioning', 'executing', 'ready'], web=1)
+    result = run('scale', str(IDS[0]), 'web=+1', *FAST)
+    assert result.exit_code == 0, result.output
+    progress = [' '.join(line.split()[-3:])
+                for line in result.output.splitlines() if ': web ' in line]
+    assert progress == ['provisioning: web 2/2', 'executing: web 2/2',
+                        'ready: web 2/2']
+
+
+def test_scale_no_wait(run, api):
+    Nodes(api, web=1)
+    result = run('scale', str(IDS[0]), 'web=3', '--no-wait')
+    assert result.exit_code == 0, result.output
+    api.add_node_instances.assert_called_once_with(IDS[0], 'web', 2)
+    assert api.get_deployment.call_count == 1
+
+
+def test_scale_unchanged(run, api):
+    Nodes(api, web=2)
+    result = run('scale', str(IDS[0]), 'web=2')
+    assert result.exit_code == 0, result.output
+    assert not api.add_node_instances.called
+    assert not api.remove_node_instances.called
+
+
+def test_scale_failed(run, api):
+    Nodes(api, ['provisioning', 'aborted'], web=1)
+    result = run('scale', str(IDS[0]), 'web=2', *FAST)
+    assert result.exit_code == 1
+    assert 'Deployment %s failed while scaling.' % IDS[0] in result.output
+
+
+def test_scale_request_failures(run, api):
+    Nodes(api, web=1)
+    api.add_node_instances.side_effect = http_error(500)
+    result = run('scale', str(IDS[0]), 'web=3', '--batch-size', '1', *FAST)
+    assert result.exit_code == 1
+    assert result.output.count("Could not add 1 instances of 'web'") == 2
+    assert '2 of 2 requests failed.' in result.output
+
+
+@pytest.mark.parametrize('args, code, message', [
+    (['nope=2'], 1, "Node 'nope' not found in deployment %s." % IDS[0]),
+    (['web=-3'], 2, "Node 'web' only has 2 instances."),
+    (['web'], 2, 'web is not a valid!'),
+])
+def test_scale_invalid(run, api, args, code, message):
+    Nodes(api, web=2)
+    result = run('scale', str(IDS[0]), *args)
+    assert result.exit_code == code
+    assert message in result.output
+    assert 'Traceback' not in result.output
+    assert not api.add_node_instances.called
+    assert not api.remove_node_instances.called
+
+
+def test_scale_not_scalable(run, api):
+    api.get_deployment.return_value = deployment(IDS[0])
+    result = run('scale', str(IDS[0]), 'web=2')
+    assert result.exit_code == 1
+    assert "Deployment %s isn't scalable." % IDS[0] in result.output
+
+
+def test_scale_deployment_not_found(run, api):
+    api.get_deployment.side_effect = http_error(404)
+    result = run('scale', str(IDS[0]), 'web=2')
+    assert result.exit_code == 1
+    assert 'Deployment %s not found.' % IDS[0] in result.output
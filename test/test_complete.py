@@ -0,0 +1,189 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import uuid
+
+import click
+import pytest
+
+from slipstream.cli import complete, conf
+
+
+@click.group()
+@click.option('-P', '--profile')
+@click.option('-v', '--verbose', count=True)
+@click.option('--quiet', is_flag=True)
+def cli(**kwargs):
+    pass
+
+
+@cli.command()
+@click.option('--cloud')
+@click.option('--dry-run', is_flag=True)
+@click.argument('path')
+def deploy(**kwargs):
+    pass
+
+
+@cli.command()
+@click.argument('deployment_id', type=click.UUID)
+@click.argument('node')
+def scale(**kwargs):
+    pass
+
+
+@cli.command()
+@click.argument('deployment_ids', metavar='[UUID]...', nargs=-1)
+def terminate(**kwargs):
+    pass
+
+
+class Config(object):
+    aliases = {'launch': 'deploy', 'ls': 'list'}
+
+
+@pytest.fixture
+def index():
+    options, commands, aliases = complete.describe(cli, Config())
+    return {'options': options, 'commands': commands, 'aliases': aliases,
+            'paths': ['examples/', 'examples/apps/',
+                      'examples/apps/wordpress', 'examples/apps/nginx',
+                      'other/'],
+            'uuids': ['2bbe4f3a-7a4b-4b6c-9f0d-4a9c3e0fd2d1',
+                      '2c4e4f3a-7a4b-4b6c-9f0d-4a9c3e0fd2d1',
+                      '9a1f0000-7a4b-4b6c-9f0d-4a9c3e0fd2d1']}
+
+
+def test_describe(index):
+    assert sorted(index['options']) == ['--profile', '-P']
+    assert index['commands'] == {
+        'deploy': {'options': ['--cloud'], 'arguments': ['paths'],
+                   'variadic': False},
+        'scale': {'options': [], 'arguments': ['uuids', None],
+                  'variadic': False},
+        'terminate': {'options': [], 'arguments': ['uuids'],
+                      'variadic': True},
+    }
+    # Aliases of unknown commands are left out
+    assert index['aliases'] == {'launch': 'deploy'}
+
+
+@pytest.mark.parametrize('words, command, kind', [
+    ([], None, 'command'),
+    (['-P', 'nuvla'], None, 'command'),
+    (['unknown'], None, None),
+    (['deploy'], 'deploy', 'paths'),
+    (['launch', '--cloud', 'exoscale'], 'deploy', 'paths'),
+    (['deploy', '--cloud=exoscale', '--dry-run'], 'deploy', 'paths'),
+    (['deploy', 'examples/apps/wordpress'], 'deploy', None),
+    (['scale'], 'scale', 'uuids'),
+    (['scale', '2bbe4f3a'], 'scale', None),
+    (['terminate', '2bbe4f3a', '2c4e4f3a'], 'terminate', 'uuids'),
+])
+def test_split(index, words, command, kind):
+    found, found_kind = complete._split(words, index)
+    assert found == (index['commands'][command] if command else None)
+    assert found_kind == kind
+
+
+@pytest.mark.parametrize('kind, incomplete, expected', [
+    ('command', '', ['deploy', 'launch', 'scale', 'terminate']),
+    ('command', 'd', ['deploy']),
+    ('uuids', '2', ['2bbe4f3a-7a4b-4b6c-9f0d-4a9c3e0fd2d1',
+                    '2c4e4f3a-7a4b-4b6c-9f0d-4a9c3e0fd2d1']),
+    ('paths', '', ['examples/', 'other/']),
+    ('paths', 'examples/', ['examples/apps/']),
+    ('paths', 'examples/apps/', ['examples/apps/nginx',
+                                 'examples/apps/wordpress']),
+    ('paths', 'examples/apps/w', ['examples/apps/wordpress']),
+    (None, '', []),
+])
+def test_candidates(index, kind, incomplete, expected):
+    assert complete.candidates(index, kind, incomplete) == expected
+
+
+def test_save_and_load(tmpdir, index):
+    filename = str(tmpdir.join('completion'))
+    complete.save(filename, index)
+    assert complete.load(filename) == index
+    assert tmpdir.listdir() == [tmpdir.join('completion')]
+
+
+def test_load_invalid(tmpdir):
+    assert complete.load(str(tmpdir.join('missing'))) is None
+    tmpdir.join('invalid').write('not marshal')
+    assert complete.load(str(tmpdir.join('invalid'))) is None
+
+
+@pytest.mark.parametrize('words, expected', [
+    (['-P', 'test', 'deploy'], 'test'),
+    (['--profile=test'], 'test'),
+    (['deploy'], conf.DEFAULT_PROFILE),
+])
+def test_profile(monkeypatch, words, expected):
+    monkeypatch.delenv('SLIPSTREAM_PROFILE', raising=False)
+    assert complete._profile(words) == expected
+
+
+Module = collections.namedtuple('Module', ['path', 'type'])
+App = collections.namedtuple('App', ['name'])
+Deployment = collections.namedtuple('Deployment', ['id'])
+
+PROJECTS = {
+    None: [Module('examples', 'project')],
+    'examples': [Module('examples/apps', 'project'),
+                 Module('examples/readme', 'component')],
+    'examples/apps': [Module('examples/apps/wordpress', 'application')],
+}
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    spawned = []
+    monkeypatch.setattr(complete, '_spawn_detached',
+                        lambda args: spawned.append(args) or 1234)
+    return spawned
+
+
+def test_refresh_and_complete(api, spawned):
+    api.list_project_content.side_effect = lambda path=None: PROJECTS[path]
+    api.list_applications.return_value = [App('wordpress')]
+    api.list_deployments.side_effect = \
+        lambda offset=0, limit=20: [Deployment(uuid.UUID(int=1))] \
+        if offset == 0 else []
+    complete.refresh(conf.DEFAULT_PROFILE)
+
+    assert complete.complete('slipstream deploy examples/', 2) == \
+        ['examples/apps/', 'examples/readme']
+    assert complete.complete('slipstream deploy w', 2) == ['wordpress']
+    assert complete.complete('slipstream terminate 0', 2) == \
+        [str(uuid.UUID(int=1))]
+    # Options are left to click
+    assert complete.complete('slipstream deploy --', 2) is None
+    assert spawned == []
+
+
+def test_refresh_logged_out(home, api, spawned):
+    home.join('.slipstream', 'cookies-nuvla.txt').remove()
+    complete.refresh(conf.DEFAULT_PROFILE)
+    assert complete.complete('slipstream deploy ', 2) == []
+    assert not api.list_project_content.called
+
+
+def test_complete_without_index(home, spawned):
+    assert complete.complete('slipstream deploy ', 2) is None
+    assert spawned == [[complete.sys.executable, '-m',
+                        'slipstream.cli.complete', conf.DEFAULT_PROFILE]]
+    # A single refresh runs at a time
+    assert complete.complete('slipstream deploy ', 2) is None
+    assert len(spawned) == 1
+
+
+def test_complete_stale_index(api, spawned, monkeypatch):
+    api.list_project_content.return_value = []
+    api.list_applications.return_value = []
+    api.list_deployments.return_value = []
+    complete.refresh(conf.DEFAULT_PROFILE)
+    monkeypatch.setattr(complete.time, 'time', lambda: 1e10)
+    assert complete.complete('slipstream deploy ', 2) == []
+    assert len(spawned) == 1
@@ -0,0 +1,71 @@
+from __future__ import absolute_import, unicode_literals
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# The import of the commands, run on every invocation including --help,
+# --version and completion, mostly spent importing click
+IMPORT_BUDGET_MS = 150
+
+# Only imported by the commands talking to the server
+HEAVY_MODULES = ('requests', 'prettytable', 'defusedxml', 'slipstream.api',
+                 'multiprocessing.pool')
+
+
+def run_python(code, home, *options):
+    env = dict(os.environ, HOME=str(home))
+    process = subprocess.Popen([sys.executable] + list(options) +
+                               ['-c', code], env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    assert process.returncode == 0, err
+    return out.decode('utf8'), err.decode('utf8')
+
+
+def imported_heavy_modules(code, home):
+    out, _ = run_python(code + '\nimport sys\n'
+                        'print(",".join(m for m in %r if m in sys.modules))'
+                        % (HEAVY_MODULES,), home)
+    last_line = out.strip().split('\n')[-1]
+    return [m for m in last_line.split(',') if m and m in HEAVY_MODULES]
+
+
+def test_commands_import_no_heavy_module(tmpdir):
+    assert imported_heavy_modules('import slipstream.cli.commands',
+                                  tmpdir) == []
+
+
+def test_version_imports_no_heavy_module(tmpdir):
+    assert imported_heavy_modules(
+        'from slipstream.cli.commands import cli\n'
+        'try:\n'
+        '    cli.main(["--version"], prog_name="slipstream")\n'
+        'except SystemExit:\n'
+        '    pass', tmpdir) == []
+
+
+def test_completion_imports_neither_click_nor_heavy_modules(tmpdir):
+    out, _ = run_python(
+        'import sys\n'
+        'from slipstream.cli import complete\n'
+        'complete.complete("slipstream de", 1)\n'
+        'print(",".join(m for m in %r if m in sys.modules))'
+        % (HEAVY_MODULES + ('click',),), tmpdir)
+    assert out.strip() == ''
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason="-X importtime needs Python 3.7")
+def test_commands_import_time(tmpdir):
+    _, err = run_python('import slipstream.cli.commands', tmpdir,
+                        '-X', 'importtime')
+    # import time: self [us] | cumulative | imported package
+    cumulative = [int(line.split('|')[1])
+                  for line in err.splitlines()
+                  if line.startswith('import time:') and
+                  line.split('|')[-1].strip() == 'slipstream.cli.commands']
+    assert cumulative, err
+    assert cumulative[0] / 1000.0 <= IMPORT_BUDGET_MS
@@ -0,0 +1,157 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import time
+
+import pytest
+
+from slipstream.cli import index
+from slipstream.cli.index import Filter, Index
+
+Deployment = collections.namedtuple('Deployment',
+                                    list(index.TABLES['deployments']))
+VirtualMachine = collections.namedtuple('VirtualMachine',
+                                        list(index.TABLES['virtualmachines']))
+
+
+def now_minus(seconds):
+    return time.strftime('%Y-%m-%d %H:%M:%S.000 UTC',
+                         time.gmtime(time.time() - seconds))
+
+
+def deployment(id, module, status, age, clouds=('exoscale',)):
+    return Deployment(id, module, status, now_minus(age), now_minus(age),
+                      list(clouds), 'alice', None, None, 'false')
+
+
+def vm(id, cloud, status, deployment_id, cpu=1):
+    return VirtualMachine(id, cloud, status, deployment_id, 'alice', 'web',
+                          '1', '10.0.0.1', cpu, 1024, 10, 'small', 'true')
+
+
+DEPLOYMENTS = [
+    deployment('d1', 'examples/apps/wordpress', 'Ready', 3600),
+    deployment('d2', 'examples/apps/nginx', 'Ready', 5 * 86400,
+               clouds=['exoscale', 'aws']),
+    deployment('d3', 'examples/apps/wordpress', 'Aborted', 60),
+]
+
+VMS = [
+    vm('i-1', 'exoscale', 'running', 'd1', cpu=2),
+    vm('i-2', 'exoscale', 'running', 'd2'),
+    vm('i-3', 'aws', 'stopped', 'd2', cpu=4),
+]
+
+
+@pytest.fixture
+def idx(tmpdir):
+    idx = Index(str(tmpdir.join('index', 'default.db')), 'https://nuv.la')
+    idx.refresh('deployments', DEPLOYMENTS)
+    idx.refresh('virtualmachines', VMS)
+    yield idx
+    idx.close()
+
+
+def query(idx, table, filters=(), **kwargs):
+    return list(idx.query(table, [index.parse_filter(f) for f in filters],
+                          **kwargs))
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('status=running', Filter('status', '=', 'running')),
+    ('started_at < 3d', Filter('started_at', '<', '3d')),
+    ('cpu>=2', Filter('cpu', '>=', '2')),
+    ('status!=Ready', Filter('status', '!=', 'Ready')),
+    ('module~examples/*', Filter('module', '~', 'examples/*')),
+])
+def test_parse_filter(expression, expected):
+    assert index.parse_filter(expression) == expected
+
+
+@pytest.mark.parametrize('expression', ['status', '=running', 'a b=c'])
+def test_parse_filter_invalid(expression):
+    with pytest.raises(ValueError):
+        index.parse_filter(expression)
+
+
+def test_refresh_counts(idx):
+    assert idx.age('deployments') < 5
+    assert idx.refresh('deployments', DEPLOYMENTS) == (0, 0, 0)
+    changed = DEPLOYMENTS[0]._replace(status='Done')
+    new = deployment('d4', 'examples/apps/nginx', 'Ready', 10)
+    assert idx.refresh('deployments', [changed, DEPLOYMENTS[1], new]) == \
+        (1, 1, 1)
+    rows = query(idx, 'deployments', sort=['id'])
+    assert [(r.id, r.status) for r in rows] == \
+        [('d1', 'Done'), ('d2', 'Ready'), ('d4', 'Ready')]
+
+
+def test_refresh_unchanged_numbers(idx):
+    assert idx.refresh('virtualmachines', VMS) == (0, 0, 0)
+
+
+def test_query_filters(idx):
+    rows = query(idx, 'deployments', ['status=Ready'], sort=['-id'])
+    assert [r.id for r in rows] == ['d2', 'd1']
+    rows = query(idx, 'deployments', ['module~*/wordpress', 'status!=Ready'])
+    assert [r.id for r in rows] == ['d3']
+    assert rows[0].clouds == 'exoscale'
+
+
+def test_query_time_filters(idx):
+    rows = query(idx, 'deployments', ['started_at<3d'])
+    assert [r.id for r in rows] == ['d2']
+    rows = query(idx, 'deployments', ['started_at>=2h'], sort=['started_at'])
+    assert [r.id for r in rows] == ['d1', 'd3']
+
+
+def test_query_numbers(idx):
+    rows = query(idx, 'virtualmachines', ['cpu>=2'], sort=['cpu'])
+    assert [(r.id, r.cpu) for r in rows] == [('i-1', 2), ('i-3', 4)]
+
+
+def test_query_join(idx):
+    rows = query(idx, 'virtualmachines', ['deployment_status=Ready',
+                                          'status=running'],
+                 sort=['id'])
+    assert [r.id for r in rows] == ['i-1', 'i-2']
+    assert rows[0]._fields[-1] == 'deployment_status'
+    assert idx.tables('virtualmachines', ['deployment_module']) == \
+        ['deployments', 'virtualmachines']
+    assert idx.tables('virtualmachines', ['status']) == ['virtualmachines']
+
+
+def test_query_group(idx):
+    rows = query(idx, 'virtualmachines', group=['cloud', 'status'],
+                 sort=['-count'])
+    assert rows[0] == ('exoscale', 'running', 2)
+    assert rows[0]._fields == ('cloud', 'status', 'count')
+    assert sorted(rows[1:]) == [('aws', 'stopped', 1)]
+
+
+def test_query_columns_and_limit(idx):
+    rows = query(idx, 'deployments', sort=['id'], limit=2,
+                 columns=['id', 'module'])
+    assert rows == [('d1', 'examples/apps/wordpress'),
+                    ('d2', 'examples/apps/nginx')]
+
+
+def test_query_unknown_column(idx):
+    with pytest.raises(ValueError) as e:
+        query(idx, 'deployments', ['flavour=small'])
+    assert "Unknown column 'flavour'" in str(e.value)
+
+
+def test_endpoint_change_empties_index(idx):
+    idx.close()
+    other = Index(idx.filename, 'https://example.com')
+    try:
+        assert query(other, 'deployments') == []
+        assert other.age('deployments') is None
+    finally:
+        other.close()
+
+
+def test_clear(idx):
+    idx.clear()
+    assert query(idx, 'deployments') == []
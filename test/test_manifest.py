@@ -0,0 +1,84 @@
+from __future__ import absolute_import, unicode_literals
+
+import io
+
+import pytest
+
+from slipstream.cli.manifest import ManifestError, Row, guess_format, \
+    read_manifest
+
+
+def read(text, fmt):
+    return read_manifest(io.StringIO(text), fmt)
+
+
+def test_json():
+    rows = read('[{"path": "examples/apps/wordpress", "cloud": "exoscale", '
+                '"param": {"web:multiplicity": 2, "admin_email": "a@b.c"}},'
+                ' {"path": "examples/apps/nginx", '
+                '"cloud": ["exoscale", "web:aws"], "param": ["x=a b"]}]',
+                'json')
+    assert rows == [
+        Row(1, 'examples/apps/wordpress', ['exoscale'],
+            ['admin_email=a@b.c', 'web:multiplicity=2']),
+        Row(2, 'examples/apps/nginx', ['exoscale', 'web:aws'], ['x=a b']),
+    ]
+
+
+def test_yaml():
+    pytest.importorskip('yaml')
+    rows = read('- path: examples/apps/wordpress\n'
+                '  cloud: exoscale web:aws\n'
+                '  param:\n'
+                '    multiplicity: 3\n'
+                '- path: examples/images/ubuntu\n', 'yaml')
+    assert rows == [
+        Row(1, 'examples/apps/wordpress', ['exoscale', 'web:aws'],
+            ['multiplicity=3']),
+        Row(2, 'examples/images/ubuntu', [], []),
+    ]
+
+
+def test_csv():
+    rows = read('path,cloud,web:multiplicity,admin_email\n'
+                'examples/apps/wordpress,exoscale,2,\n'
+                'examples/apps/nginx,,,a@b.c\n', 'csv')
+    assert [(r.line, r.path, r.clouds, sorted(r.params)) for r in rows] == [
+        (1, 'examples/apps/wordpress', ['exoscale'], ['web:multiplicity=2']),
+        (2, 'examples/apps/nginx', [], ['admin_email=a@b.c']),
+    ]
+
+
+@pytest.mark.parametrize('text, fmt, message', [
+    ('{"path": "a"}', 'json', "must contain a list"),
+    ('["a"]', 'json', "Invalid deployment entry"),
+    ('[{"cloud": "exoscale"}]', 'json', "Entry #1 has no path."),
+    ('[{"path": "a", "param": "k=v"}]', 'json',
+     "The param of entry #1 must be a mapping or a list."),
+    ('[]', 'json', "doesn't describe any deployment"),
+    ('', 'yaml', "doesn't describe any deployment"),
+    ('path,cloud\n', 'csv', "doesn't describe any deployment"),
+])
+def test_errors(text, fmt, message):
+    if fmt == 'yaml':
+        pytest.importorskip('yaml')
+    with pytest.raises(ManifestError) as e:
+        read(text, fmt)
+    assert message in str(e.value)
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('deployments.yml', 'yaml'), ('deployments.YAML', 'yaml'),
+    ('deployments.csv', 'csv'), ('deployments.json', 'json'),
+    ('<stdin>', 'json'), (None, 'json'),
+])
+def test_guess_format(filename, expected):
+    assert guess_format(filename) == expected
+
+
+def test_format_from_file_name(tmpdir):
+    manifest = tmpdir.join('deployments.csv')
+    manifest.write('path,cloud\nexamples/apps/wordpress,exoscale\n')
+    with io.open(str(manifest), encoding='utf8') as fp:
+        assert read_manifest(fp) == [
+            Row(1, 'examples/apps/wordpress', ['exoscale'], [])]
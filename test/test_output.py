@@ -0,0 +1,173 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import io
+import json
+import uuid
+
+import pytest
+import six
+
+from slipstream.cli import output
+
+Deployment = collections.namedtuple('Deployment', ['id', 'module', 'clouds'])
+
+ID = uuid.UUID('2bbe4f3a-7a4b-4b6c-9f0d-4a9c3e0fd2d1')
+
+ROWS = [
+    Deployment(ID, 'examples/apps/wordpress', ['exoscale', 'aws']),
+    Deployment(None, 'caf\xe9', []),
+]
+
+
+class Stream(object):
+    """A text stream, like sys.stdout, whatever the Python version."""
+
+    def __init__(self):
+        self.chunks = []
+        self.flushes = 0
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf8')
+        self.chunks.append(data)
+
+    def flush(self):
+        self.flushes += 1
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+def write(rows, fmt, **kwargs):
+    stream = Stream()
+    count = output.write_rows(rows, fmt, stream, **kwargs)
+    return count, stream.getvalue()
+
+
+def test_write_rows_jsonl():
+    count, text = write(ROWS, 'jsonl')
+    assert count == 2
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert lines == [
+        {'id': str(ID), 'module': 'examples/apps/wordpress',
+         'clouds': ['exoscale', 'aws']},
+        {'id': None, 'module': 'caf\xe9', 'clouds': []},
+    ]
+
+
+def test_write_rows_json():
+    count, text = write(ROWS, 'json')
+    assert count == 2
+    assert [r['module'] for r in json.loads(text)] == \
+        ['examples/apps/wordpress', 'caf\xe9']
+
+
+def test_write_rows_json_empty():
+    assert write([], 'json') == (0, '[]\n')
+
+
+@pytest.mark.parametrize('fmt, delimiter', [('csv', ','), ('tsv', '\t')])
+def test_write_rows_csv(fmt, delimiter):
+    count, text = write(ROWS, fmt)
+    assert count == 2
+    assert text.splitlines() == [
+        delimiter.join(['id', 'module', 'clouds']),
+        delimiter.join([str(ID), 'examples/apps/wordpress',
+                        '"exoscale,aws"' if fmt == 'csv'
+                        else 'exoscale,aws']),
+        delimiter.join(['', 'caf\xe9', '']),
+    ]
+
+
+def test_write_rows_unsupported_format():
+    with pytest.raises(ValueError):
+        output.write_rows(ROWS, 'table', Stream())
+
+
+def test_write_rows_columns():
+    count, text = write(ROWS, 'csv', columns=['module'])
+    assert text.splitlines() == ['module', 'examples/apps/wordpress',
+                                 'caf\xe9']
+
+
+def test_write_rows_unknown_column():
+    with pytest.raises(output.UnknownColumnError) as e:
+        write(ROWS, 'csv', columns=['status'])
+    assert "Available columns are: id, module, clouds." in str(e.value)
+
+
+def test_write_rows_flush():
+    stream = Stream()
+    output.write_rows(iter(ROWS), 'jsonl', stream, flush=True)
+    assert len(stream.chunks) == 2
+
+
+def test_project():
+    rows = list(output.project(ROWS, ['clouds', 'id']))
+    assert rows[0]._fields == ('clouds', 'id')
+    assert rows[0] == (['exoscale', 'aws'], ID)
+    assert list(output.project(ROWS, None)) == ROWS
+
+
+def test_write_table():
+    stream = Stream()
+    assert output.write_table(ROWS, stream) == 2
+    assert stream.getvalue().splitlines() == [
+        '+--------------------------------------+'
+        '-------------------------+--------------+',
+        '| id                                   | module                  '
+        '| clouds       |',
+        '+--------------------------------------+'
+        '-------------------------+--------------+',
+        '| %s | examples/apps/wordpress | exoscale,aws |' % ID,
+        '|                                      | caf\xe9                    '
+        '|              |',
+        '+--------------------------------------+'
+        '-------------------------+--------------+',
+    ]
+
+
+def test_write_table_empty():
+    stream = Stream()
+    assert output.write_table([], stream) == 0
+    assert stream.getvalue() == ''
+
+
+def test_write_table_truncates_rows_after_sample():
+    Row = collections.namedtuple('Row', ['name'])
+    stream = Stream()
+    output.write_table([Row('abcd'), Row('abcdefghij')], stream, sample=1)
+    assert '| abcd |' in stream.getvalue()
+    assert '| a... |' in stream.getvalue()
+
+
+def test_write_table_width():
+    Row = collections.namedtuple('Row', ['a', 'b'])
+    stream = Stream()
+    output.write_table([Row('x' * 10, 'y' * 50)], stream, width=40)
+    lines = stream.getvalue().splitlines()
+    assert all(len(line) <= 40 for line in lines)
+    assert 'x' * 10 in lines[3]
+    assert lines[3].rstrip(' |').endswith(output.ELLIPSIS)
+
+
+@pytest.mark.parametrize('widths, available, expected', [
+    ([5, 10], 20, [5, 10]),
+    ([5, 30], 20, [5, 15]),
+    ([30, 30], 20, [10, 10]),
+    ([1, 30], 2, [3, 3]),
+])
+def test_fit_widths(widths, available, expected):
+    assert output.fit_widths(widths, available) == expected
+
+
+def test_cell_flattens_whitespace():
+    assert output._cell('a\nb\tc') == 'a b c'
+    assert output._cell(None) == ''
+    assert output._cell(('a', None, 2)) == 'a,,2'
+    assert isinstance(output._cell(3), six.text_type)
+
+
+def test_terminal_width_not_a_terminal():
+    assert output.terminal_width(io.StringIO()) is None
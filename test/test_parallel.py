@@ -0,0 +1,154 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import threading
+import time
+
+import pytest
+
+from slipstream.cli import parallel
+
+
+def square(n):
+    if n < 0:
+        raise ValueError(n)
+    return n * n
+
+
+def test_imap_results_and_errors():
+    outcomes = list(parallel.imap(square, [1, -2, 3], workers=2))
+    assert sorted(o.item for o in outcomes) == [-2, 1, 3]
+    by_item = dict((o.item, o) for o in outcomes)
+    assert by_item[1] == (1, 1, None)
+    assert by_item[3] == (3, 9, None)
+    assert by_item[-2].result is None
+    assert isinstance(by_item[-2].error, ValueError)
+
+
+def test_imap_empty():
+    assert list(parallel.imap(square, [])) == []
+
+
+def test_imap_workers_per_key():
+    lock = threading.Lock()
+    running = collections.Counter()
+    peaks = collections.Counter()
+
+    def call(item):
+        host = item[0]
+        with lock:
+            running[host] += 1
+            peaks[host] = max(peaks[host], running[host])
+        time.sleep(0.02)
+        with lock:
+            running[host] -= 1
+
+    items = [('a', i) for i in range(6)] + [('b', i) for i in range(6)]
+    outcomes = list(parallel.imap(call, items, workers=2,
+                                  key=lambda item: item[0]))
+    assert len(outcomes) == len(items)
+    assert all(o.error is None for o in outcomes)
+    assert peaks == collections.Counter(a=2, b=2)
+
+
+def test_imap_circuit_breaker():
+    calls = []
+
+    def fail(item):
+        calls.append(item)
+        raise IOError('down')
+
+    breaker = parallel.CircuitBreaker(threshold=2, cooldown=60)
+    outcomes = list(parallel.imap(fail, range(5), workers=1,
+                                  breaker=breaker))
+    assert len(calls) == 2
+    errors = [type(o.error) for o in sorted(outcomes, key=lambda o: o.item)]
+    assert errors == [IOError, IOError] + [parallel.CircuitOpenError] * 3
+
+
+def test_circuit_breaker_ignores_other_errors():
+    breaker = parallel.CircuitBreaker(
+        threshold=1, cooldown=60, is_failure=lambda e: isinstance(e, IOError))
+    call = breaker.wrap(square)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            call(-1)
+    assert call(2) == 4
+
+
+def test_circuit_breaker_probe_after_cooldown():
+    results = iter([IOError('down'), IOError('down'), 1, 2])
+
+    def flaky(item):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    breaker = parallel.CircuitBreaker(threshold=1, cooldown=0.05)
+    call = breaker.wrap(flaky)
+    with pytest.raises(IOError):
+        call(None)
+    with pytest.raises(parallel.CircuitOpenError):
+        call(None)
+    time.sleep(0.06)
+    # The failed probe opens the circuit again
+    with pytest.raises(IOError):
+        call(None)
+    with pytest.raises(parallel.CircuitOpenError):
+        call(None)
+    time.sleep(0.06)
+    assert call(None) == 1
+    assert call(None) == 2
+    assert breaker.failures == 0
+
+
+def test_circuit_breaker_success_resets_failures():
+    breaker = parallel.CircuitBreaker(threshold=2, cooldown=60)
+    call = breaker.wrap(square)
+    with pytest.raises(ValueError):
+        call(-1)
+    assert call(3) == 9
+    with pytest.raises(ValueError):
+        call(-1)
+    assert call(3) == 9
+
+
+def test_rate_limiter():
+    limiter = parallel.RateLimiter(50)
+    start = time.time()
+    for _ in range(5):
+        limiter.wait()
+    assert time.time() - start >= 4 / 50.0 - 0.01
+
+
+TREE = {
+    None: ['a/', 'b'],
+    'a/': ['a/c/', 'a/d'],
+    'a/c/': ['a/c/e'],
+}
+
+
+def branch(item):
+    return item if item.endswith('/') else None
+
+
+@pytest.mark.parametrize('max_depth, expected', [
+    (None, ['a/', 'a/c/', 'a/c/e', 'a/d', 'b']),
+    (0, ['a/', 'b']),
+    (1, ['a/', 'a/c/', 'a/d', 'b']),
+])
+def test_walk(max_depth, expected):
+    items = parallel.walk(TREE.__getitem__, None, branch, workers=2,
+                          max_depth=max_depth)
+    assert sorted(items) == expected
+
+
+def test_walk_error():
+    def list_children(node):
+        if node == 'a/':
+            raise IOError('down')
+        return TREE[node]
+
+    with pytest.raises(IOError):
+        list(parallel.walk(list_children, None, branch))
@@ -0,0 +1,90 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import io
+
+import pytest
+
+from slipstream.cli import timeseries
+from slipstream.cli.timeseries import Record, UsageLog
+
+Usage = collections.namedtuple('Usage', ('cloud',) + timeseries.FIELDS)
+
+# At the start of a 3 minutes period
+T0 = 1499999940
+
+
+def usage(cloud, vm_usage, quota=20):
+    return Usage(cloud, quota, 1, vm_usage, 0, 0, 0, 0)
+
+
+@pytest.fixture
+def log(tmpdir):
+    log = UsageLog(str(tmpdir.join('usage', 'default.log')))
+    for i in range(6):
+        log.append(T0 + 60 * i, [usage('exoscale', i), usage('aws', 10 - i)])
+    return log
+
+
+def test_read(log):
+    records = list(log.read())
+    assert len(records) == 12
+    assert records[0] == Record(T0, 'exoscale', 20, 1, 0, 0, 0, 0, 0)
+    assert records[-1] == Record(T0 + 300, 'aws', 20, 1, 5, 0, 0, 0, 0)
+
+
+def test_read_range(log):
+    records = list(log.read(start=T0 + 90, end=T0 + 240))
+    assert [(r.time, r.cloud) for r in records] == [
+        (T0 + 120, 'exoscale'), (T0 + 120, 'aws'),
+        (T0 + 180, 'exoscale'), (T0 + 180, 'aws')]
+    assert list(log.read(start=T0 + 1000)) == []
+
+
+def test_read_missing(tmpdir):
+    assert list(UsageLog(str(tmpdir.join('missing.log'))).read()) == []
+
+
+def test_read_not_a_log(tmpdir):
+    tmpdir.join('other.log').write('not a usage log')
+    with pytest.raises(ValueError):
+        list(UsageLog(str(tmpdir.join('other.log'))).read())
+
+
+def test_clouds_shared_between_logs(log):
+    UsageLog(log.filename).append(T0 + 360, [usage('azure', 7)])
+    assert log.clouds == ['exoscale', 'aws']
+    assert list(UsageLog(log.filename).read(start=T0 + 360))[0].cloud == \
+        'azure'
+
+
+def test_append_drops_partial_record(log):
+    with io.open(log.filename, 'ab') as fp:
+        fp.write(b'\0' * (timeseries.RECORD.size // 2))
+    log.append(T0 + 360, [usage('exoscale', 6)])
+    records = list(log.read(start=T0 + 300))
+    assert [(r.time, r.vm_usage) for r in records] == \
+        [(T0 + 300, 5), (T0 + 300, 5), (T0 + 360, 6)]
+
+
+def test_record_size():
+    assert timeseries.RECORD.size == 4 + 2 + 4 * len(timeseries.FIELDS)
+
+
+@pytest.mark.parametrize('aggregate, exoscale, aws', [
+    ('max', [2, 5], [10, 7]),
+    ('min', [0, 3], [8, 5]),
+    ('mean', [1.0, 4.0], [9.0, 6.0]),
+    ('last', [2, 5], [8, 5]),
+])
+def test_downsample(log, aggregate, exoscale, aws):
+    samples = list(timeseries.downsample(log.read(), 180, aggregate))
+    assert [(s.cloud, s.vm_usage, s.samples) for s in samples] == [
+        ('exoscale', exoscale[0], 3), ('aws', aws[0], 3),
+        ('exoscale', exoscale[1], 3), ('aws', aws[1], 3)]
+    assert [s.time for s in samples[::2]] == [
+        '2017-07-14 02:39:00', '2017-07-14 02:42:00']
+
+
+def test_downsample_empty():
+    assert list(timeseries.downsample([], 60)) == []
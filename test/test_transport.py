@@ -0,0 +1,59 @@
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+import requests
+
+from slipstream.cli import conf, transport
+
+
+def test_adapter_defaults():
+    adapter = transport.adapter({})
+    assert adapter.timeout == (conf.DEFAULT_CONNECT_TIMEOUT,
+                               conf.DEFAULT_READ_TIMEOUT)
+    assert adapter.max_retries.total == conf.DEFAULT_RETRIES
+    assert adapter.max_retries.status_forcelist == transport.RETRY_STATUSES
+    assert adapter._pool_maxsize == conf.DEFAULT_POOL_SIZE
+
+
+def test_adapter_settings():
+    adapter = transport.adapter({'pool_size': '4', 'connect_timeout': '2.5',
+                                 'read_timeout': '30', 'retries': False,
+                                 'retry_backoff': '1'})
+    assert adapter.timeout == (2.5, 30)
+    assert adapter.max_retries.total == 0
+    assert adapter._pool_maxsize == 4
+
+
+@pytest.mark.parametrize('settings', [
+    {'pool_size': '0'}, {'read_timeout': 'soon'}, {'retries': '-1'},
+])
+def test_adapter_invalid_settings(settings):
+    with pytest.raises(ValueError):
+        transport.adapter(settings)
+
+
+def test_retry_backoff():
+    retry = transport.retry(10, 1)
+    assert retry.get_backoff_time() == 0
+    for _ in range(4):
+        retry = retry.increment(method='GET', url='/')
+    # 8s of exponential backoff, half of it being random
+    assert 4 <= retry.get_backoff_time() <= 8
+    for _ in range(5):
+        retry = retry.increment(method='GET', url='/')
+    assert retry.get_backoff_time() <= conf.MAX_RETRY_WAIT
+
+
+def test_retry_after_is_bounded():
+    retry = transport.retry(3, 1)
+    assert retry.parse_retry_after('5') == 5
+    assert retry.parse_retry_after('3600') == conf.MAX_RETRY_WAIT
+
+
+def test_tune():
+    session = requests.Session()
+    transport.tune(session, {'retries': '1'})
+    assert isinstance(session.get_adapter('https://nuv.la'),
+                      transport.Adapter)
+    assert isinstance(session.get_adapter('http://localhost'),
+                      transport.Adapter)
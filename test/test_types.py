@@ -0,0 +1,131 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+
+import pytest
+
+from slipstream.cli import commands
+from slipstream.cli.types import Duration, NodeCount, NodeKeyValue, \
+    VersionRange
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('3', [(3, 3)]),
+    ('2..5', [(2, 5)]),
+    ('4..', [(4, None)]),
+    ('..2', [(None, 2)]),
+    ('1, 3..4,7..', [(1, 1), (3, 4), (7, None)]),
+])
+def test_version_range_parse(value, expected):
+    assert VersionRange.parse(value) == expected
+
+
+@pytest.mark.parametrize('value', ['', 'a', '0', '5..2', '1..x', '1,,2'])
+def test_version_range_parse_invalid(value):
+    with pytest.raises(ValueError):
+        VersionRange.parse(value)
+
+
+def test_version_range_expand():
+    ranges = VersionRange.parse('..2,4..5,5,9..')
+    assert VersionRange.expand(ranges, 10) == [1, 2, 4, 5, 9, 10]
+    assert VersionRange.expand(ranges, 4) == [1, 2, 4]
+    assert VersionRange.expand(VersionRange.parse('7..'), 5) == []
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('90', 90), ('30s', 30), ('5m', 300), ('1.5h', 5400), ('3d', 259200),
+    ('2w', 1209600),
+])
+def test_duration_parse(value, expected):
+    assert Duration.parse(value) == expected
+
+
+@pytest.mark.parametrize('value', ['', 'm', '5y', '-3d'])
+def test_duration_parse_invalid(value):
+    with pytest.raises(ValueError):
+        Duration.parse(value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('web=3', ('web', 3, False)),
+    ('web=+2', ('web', 2, True)),
+    ('web=-1', ('web', -1, True)),
+])
+def test_node_count_parse(value, expected):
+    assert NodeCount.parse(value) == expected
+
+
+@pytest.mark.parametrize('value', ['web', '=3', 'web=', 'web=x'])
+def test_node_count_parse_invalid(value):
+    with pytest.raises(ValueError):
+        NodeCount.parse(value)
+
+
+@pytest.mark.parametrize('value, is_cloud, expected', [
+    ('key=value', False, ('parameter--key', 'value')),
+    ('web:key=a=b', False, ('parameter--node--web--key', 'a=b')),
+    ('exoscale', True, ('parameter--cloudservice', 'exoscale')),
+    ('web:exoscale', True,
+     ('parameter--node--web--cloudservice', 'exoscale')),
+])
+def test_node_key_value_to_raw_param(value, is_cloud, expected):
+    assert NodeKeyValue.to_raw_param(value, is_cloud) == expected
+
+
+@pytest.mark.parametrize('value, is_cloud', [
+    ('value', False), ('web:value', False), ('key=exoscale', True),
+])
+def test_node_key_value_to_raw_param_invalid(value, is_cloud):
+    with pytest.raises(ValueError):
+        NodeKeyValue.to_raw_param(value, is_cloud)
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('examples/apps/wordpress', False),
+    ('examples/*/wordpress', True),
+    ('examples/app?', True),
+    ('examples/[ab]pps', True),
+])
+def test_is_glob(path, expected):
+    assert commands.is_glob(path) is expected
+
+
+Module = collections.namedtuple('Module', ['path', 'type'])
+
+TREE = {
+    None: [Module('examples', 'project'), Module('other', 'project')],
+    'examples': [Module('examples/apps', 'project'),
+                 Module('examples/images', 'project')],
+    'other': [Module('other/apps', 'project')],
+    'examples/apps': [Module('examples/apps/wordpress', 'deployment'),
+                      Module('examples/apps/nginx', 'image')],
+    'examples/images': [Module('examples/images/ubuntu', 'image')],
+    'other/apps': [Module('other/apps/wordpress', 'deployment')],
+}
+
+
+class TreeApi(object):
+
+    def __init__(self):
+        self.listed = []
+
+    def list_project_content(self, path=None):
+        self.listed.append(path)
+        return TREE[path]
+
+
+@pytest.mark.parametrize('pattern, expected, listed', [
+    ('examples/apps/w*', ['examples/apps/wordpress'], ['examples/apps']),
+    ('examples/*/*', ['examples/apps/nginx', 'examples/apps/wordpress',
+                      'examples/images/ubuntu'],
+     ['examples', 'examples/apps', 'examples/images']),
+    ('*/apps/wordpress', ['examples/apps/wordpress', 'other/apps/wordpress'],
+     [None, 'examples', 'examples/apps', 'other', 'other/apps']),
+    ('*', ['examples', 'other'], [None]),
+])
+def test_find_modules(pattern, expected, listed):
+    api = TreeApi()
+    modules = commands.find_modules(api, pattern, 2)
+    assert sorted(m.path for m in modules) == expected
+    assert sorted(api.listed, key=lambda p: p or '') == listed
@@ -0,0 +1,136 @@
+from __future__ import absolute_import, unicode_literals
+
+import collections
+
+import pytest
+
+from slipstream.cli import watch
+
+from conftest import http_error
+
+Deployment = collections.namedtuple('Deployment', ['id', 'module', 'status',
+                                                   'abort'])
+
+
+class Stop(Exception):
+    pass
+
+
+def sleeper(count):
+    """Return a sleep function recording its delays, stopping after
+    `count` calls."""
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        if len(delays) >= count:
+            raise Stop()
+    sleep.delays = delays
+    return sleep
+
+
+def poller(*states):
+    """Return a get_deployment function going through the `states` of
+    each deployment, the last one being kept."""
+    remaining = dict((i, list(s)) for i, s in enumerate(states))
+
+    def get_deployment(deployment_id):
+        state = remaining[deployment_id]
+        value = state.pop(0) if len(state) > 1 else state[0]
+        if isinstance(value, Exception):
+            raise value
+        return Deployment(deployment_id, 'app', value,
+                          'failed' if value == 'aborting' else None)
+    return get_deployment
+
+
+def test_backoff():
+    backoff = watch.Backoff(1, 5)
+    assert [backoff.next() for _ in range(5)] == [1, 2, 4, 5, 5]
+    assert backoff.reset() == 1
+    assert backoff.next() == 1
+
+
+def test_watch():
+    polls = iter([
+        collections.OrderedDict([(1, Deployment(1, 'a', 'running', None)),
+                                 (2, Deployment(2, 'b', 'ready', None))]),
+        collections.OrderedDict([(1, Deployment(1, 'a', 'running', None)),
+                                 (2, Deployment(2, 'b', 'ready', None))]),
+        collections.OrderedDict([(1, Deployment(1, 'a', 'ready', None))]),
+    ])
+    sleep = sleeper(3)
+    events = []
+    with pytest.raises(Stop):
+        for event in watch.watch(lambda: next(polls), watch.Backoff(1, 10),
+                                 sleep):
+            events.append(event)
+    assert [(e.deployment_id, e.module, e.previous, e.status)
+            for e in events] == [
+        (1, 'a', None, 'running'), (2, 'b', None, 'ready'),
+        (1, 'a', 'running', 'ready'), (2, 'b', 'ready', 'inactive')]
+    assert sleep.delays == [1, 1, 1]
+
+
+def test_wait():
+    events = []
+    result = watch.wait(
+        poller(['initializing', 'provisioning', 'ready'],
+               ['initializing', 'done'],
+               ['provisioning', 'aborting']),
+        [0, 1, 2], 'ready', None, watch.Backoff(1, 10), workers=2,
+        on_event=events.append, sleep=sleeper(10))
+    assert result.reached == [0]
+    assert sorted(result.failed) == [1, 2]
+    assert result.pending == [] and not result.errors
+    by_deployment = collections.defaultdict(list)
+    for e in events:
+        by_deployment[e.deployment_id].append((e.previous, e.status))
+    assert by_deployment == {
+        0: [(None, 'initializing'), ('initializing', 'provisioning'),
+            ('provisioning', 'ready')],
+        1: [(None, 'initializing'), ('initializing', 'done')],
+        2: [(None, 'provisioning'), ('provisioning', 'aborting')],
+    }
+
+
+def test_wait_errors():
+    errors = []
+    result = watch.wait(
+        poller([http_error(500), 'ready'],
+               [http_error(404)],
+               [http_error(503)]),
+        [0, 1, 2], 'ready', None, watch.Backoff(1, 10), max_errors=3,
+        on_error=lambda i, e: errors.append(i), sleep=sleeper(10))
+    assert result.reached == [0]
+    assert sorted(result.errors) == [1, 2]
+    assert result.errors[1].response.status_code == 404
+    assert sorted(errors) == [0, 1, 2, 2, 2]
+
+
+def test_wait_timeout():
+    sleep = sleeper(100)
+    result = watch.wait(poller(['provisioning']), [0], 'ready', 0,
+                        watch.Backoff(1, 10), sleep=sleep)
+    assert result.pending == [0]
+    assert sleep.delays == []
+
+
+def test_wait_size():
+    polls = iter([('provisioning', None, {'web': 1}),
+                  ('provisioning', None, {'web': 1}),
+                  ('ready', None, {'web': 3})])
+    progress = []
+    sleep = sleeper(10)
+    assert watch.wait_size(lambda: next(polls), {'web': 3}, None,
+                           watch.Backoff(1, 10),
+                           lambda *args: progress.append(args),
+                           sleep) == 'reached'
+    assert progress == [('provisioning', {'web': 1}), ('ready', {'web': 3})]
+    assert sleep.delays == [1, 1]
+
+
+def test_wait_size_failed():
+    assert watch.wait_size(lambda: ('ready', 'Failed', {'web': 1}),
+                           {'web': 3}, None, watch.Backoff(1, 10),
+                           sleep=sleeper(10)) == 'failed'